@@ -0,0 +1,72 @@
+"""Размер на вградените данни и брой изчертани точки с и без прореждане (LTTB).
+
+Строи --products серии по --days дневни цени (случайно лутане със скокове) и
+сравнява json.dumps на сериите без обработка с prepare_traces – вградено
+(data_format=None, пълните серии са в скрипта за zoom) и с изнесени данни
+(--format, пълните серии са в шардове). Отчита времето на подготовката,
+байтовете в HTML-а, байтовете в шардовете, изчертаваните при отваряне точки и
+типа на сериите (scatter/scattergl).
+
+    python benchmarks/bench_chart_decimation.py
+    python benchmarks/bench_chart_decimation.py --products 200 --days 2000 --format json.gz
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from chart_data import CHART_DATA_FORMATS, data_dir_for, prepare_traces  # noqa: E402
+
+
+def make_traces(products: int, days: int, seed: int = 42) -> list:
+    rng = np.random.default_rng(seed)
+    dates = [(date(2015, 1, 1) + timedelta(days=i)).isoformat() for i in range(days)]
+    traces = []
+    for i in range(products):
+        steps = rng.normal(0, 0.02, days) * (rng.random(days) < 0.1)
+        prices = np.round(np.maximum(0.1, rng.uniform(1, 20) + np.cumsum(steps)), 2)
+        traces.append({"name": f"ПРОДУКТ {i:04d}", "mode": "lines+markers", "x": dates, "y": prices.tolist()})
+    return traces
+
+
+def _dir_size(path: Path) -> int:
+    return sum(item.stat().st_size for item in path.glob("*")) if path.exists() else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--days", type=int, default=3650)
+    parser.add_argument("--format", choices=CHART_DATA_FORMATS, default="json", help="формат на изнесените данни")
+    args = parser.parse_args()
+
+    print(f"{args.products} серии × {args.days} дни")
+    print(f"{'вариант':<10} {'време, с':>9} {'HTML, KB':>10} {'шардове, KB':>12} {'точки':>9}  тип")
+    for label, data_format in (("без", "raw"), ("вградено", None), (args.format, args.format)):
+        traces = make_traces(args.products, args.days)
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "chart.html"
+            started = time.perf_counter()
+            loader = "" if data_format == "raw" else prepare_traces(traces, [None] * len(traces), output_file, data_format)
+            html_bytes = len(json.dumps(traces, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            elapsed = time.perf_counter() - started
+            html_bytes += len(loader.encode("utf-8"))
+            shard_bytes = _dir_size(data_dir_for(output_file))
+        points = sum(len(trace.get("x") or []) for trace in traces)
+        print(
+            f"{label:<10} {elapsed:>9.2f} {html_bytes / 1024:>10.0f} {shard_bytes / 1024:>12.0f} {points:>9}  "
+            f"{traces[0].get('type', 'scatter')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Таблица с --rows реда: конкатенация с += срещу html_template (join и поточно).
+
+Строи редовете на годишното сравнение (YEARS_ROW) за синтетични продукти и
+ги сглобява в YEARS_PAGE по три начина:
+
+* concat – `table_rows += f'''...'''` в цикъл и f-низ за страницата (както
+  беше generate_years_html);
+* join – YEARS_PAGE.render() с YEARS_ROW.render_rows();
+* stream – YEARS_PAGE.write() направо във файл.
+
+За всеки вариант се отчитат време (най-доброто от --repeat), върхова памет на
+Python обектите (tracemalloc, в отделен проход) и размер на файла. Накрая
+пуска и generate_years_html за същите редове.
+
+    python benchmarks/bench_html_templates.py
+    python benchmarks/bench_html_templates.py --rows 100000 --repeat 1
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from receipt_analysis import ReceiptAnalyzer  # noqa: E402
+from report_templates import YEARS_PAGE, YEARS_ROW  # noqa: E402
+
+PAGE_VALUES = {
+    "chart_json": "[]", "total": 0, "increased": 0, "decreased": 0, "avg_change": 0.0, "avg_color": "#2ecc71",
+    "avg_sign": "", "top_up_product": "", "top_up_change": 0.0, "top_up_label": "", "top_dn_product": "",
+    "top_dn_change": 0.0, "top_dn_label": "",
+}
+
+
+def make_rows(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        avg_2025 = rng.uniform(0.5, 30)
+        avg_2026 = avg_2025 * rng.uniform(0.7, 1.4)
+        rows.append({
+            "product": f"ПРОДУКТ {i:06d} {rng.choice(['500Г', '1Л', '1КГ', ''])}".strip(),
+            "basis": rng.choice(["€/кг", "€/л", "€/бр"]),
+            "avg_2025": avg_2025,
+            "avg_2026": avg_2026,
+            "change_pct": (avg_2026 - avg_2025) / avg_2025 * 100,
+            "measurements_2025": rng.randint(1, 12),
+            "measurements_2026": rng.randint(1, 12),
+        })
+    return rows
+
+
+def row_values(rows: list):
+    for idx, row in enumerate(rows, 1):
+        yield {
+            "idx": idx, "row_bg": "#f9f9f9", "opacity": "", "product": row["product"], "conf_badge": "",
+            "basis": row["basis"], "avg_2025": row["avg_2025"], "avg_2026": row["avg_2026"],
+            "diff_text": f"{row['change_pct']:+.1f}%", "diff_color": "#888",
+            "measurements_2025": row["measurements_2025"], "measurements_2026": row["measurements_2026"],
+        }
+
+
+def write_concat(rows: list, output_file: Path) -> None:
+    table_rows = ""
+    for values in row_values(rows):
+        table_rows += f'''
+            <tr style="background:{values["row_bg"]};{values["opacity"]}">
+              <td style="text-align:center">{values["idx"]}</td>
+              <td>{values["product"]}{values["conf_badge"]}</td>
+              <td style="text-align:center;color:#666">{values["basis"]}</td>
+              <td style="text-align:right">{values["avg_2025"]:.2f} €</td>
+              <td style="text-align:right">{values["avg_2026"]:.2f} €</td>
+              <td style="text-align:center;font-weight:bold;color:{values["diff_color"]}">{values["diff_text"]}</td>
+              <td style="text-align:center;color:#999">{values["measurements_2025"]}</td>
+              <td style="text-align:center;color:#999">{values["measurements_2026"]}</td>
+            </tr>'''
+    html = YEARS_PAGE.render(table_rows=table_rows, **PAGE_VALUES)
+    output_file.write_text(html, encoding="utf-8")
+
+
+def write_join(rows: list, output_file: Path) -> None:
+    html = YEARS_PAGE.render(table_rows=YEARS_ROW.render_rows(row_values(rows)), **PAGE_VALUES)
+    output_file.write_text(html, encoding="utf-8")
+
+
+def write_stream(rows: list, output_file: Path) -> None:
+    YEARS_PAGE.write(output_file, table_rows=YEARS_ROW.render_rows(row_values(rows)), **PAGE_VALUES)
+
+
+VARIANTS = {"concat": write_concat, "join": write_join, "stream": write_stream}
+
+
+def measure(func, rows: list, repeat: int) -> tuple:
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = Path(tmp) / "table.html"
+        best = min(_timed(func, rows, output_file) for _ in range(repeat))
+        tracemalloc.start()
+        func(rows, output_file)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return best, peak, output_file.stat().st_size
+
+
+def _timed(func, rows: list, output_file: Path) -> float:
+    started = time.perf_counter()
+    func(rows, output_file)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{args.rows} реда")
+    print(f"{'вариант':<8} {'време, с':>9} {'памет, MB':>10} {'файл, MB':>9}")
+    for name, func in VARIANTS.items():
+        seconds, peak, size = measure(func, rows, args.repeat)
+        print(f"{name:<8} {seconds:>9.3f} {peak / 2 ** 20:>10.1f} {size / 2 ** 20:>9.1f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = ReceiptAnalyzer(log=lambda message: None, db_path=":memory:")
+        started = time.perf_counter()
+        analyzer.generate_years_html(rows, str(Path(tmp) / "years.html"))
+        print(f"\ngenerate_years_html: {time.perf_counter() - started:.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Сравнение на старата (текстова) и новата (prices, WITHOUT ROWID) схема на цените.
+
+Копира базата (по подразбиране lidl_local_prices.db, или синтетична база със
+старата схема при --synthetic N) във временна папка, измерва размера и
+времето на няколко типични заявки, отваря копието с ReceiptAnalyzer (което
+изпълнява миграциите) и повтаря измерванията. Заявките са едни и същи и в
+двата случая – след миграцията те минават през изгледа price_history.
+
+    python benchmarks/bench_price_schema.py
+    python benchmarks/bench_price_schema.py --synthetic 200000
+"""
+
+import argparse
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from receipt_analysis import ReceiptAnalyzer  # noqa: E402
+
+LEGACY_SCHEMA = """
+CREATE TABLE price_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_name TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    price REAL NOT NULL,
+    unit TEXT NOT NULL,
+    source TEXT DEFAULT 'receipt',
+    receipt_file TEXT,
+    sample_count INTEGER DEFAULT 1,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(product_name, date, unit)
+);
+CREATE INDEX idx_price_history_product_date ON price_history(normalized_name, date);
+CREATE INDEX idx_price_history_product_name ON price_history(product_name, date);
+"""
+
+QUERIES = {
+    "история по продукт (всички)": None,
+    "пълно обобщение": "SELECT product_name, date, price, unit FROM price_history ORDER BY product_name, date",
+    "средно по месеци": "SELECT substr(date, 1, 7), AVG(price) FROM price_history GROUP BY 1",
+    "последна цена по продукт": (
+        "SELECT product_name, MAX(date), price FROM price_history GROUP BY product_name"
+    ),
+}
+
+
+def make_synthetic(path: Path, rows: int) -> None:
+    rng = random.Random(42)
+    products = [f"ПРОДУКТ {i:05d} {rng.choice(['250Г', '1Л', '500Г', ''])}".strip() for i in range(rows // 40 + 1)]
+    start = date(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    data = set()
+    while len(data) < rows:
+        data.add((rng.choice(products), (start + timedelta(days=rng.randrange(900))).isoformat()))
+    conn.executemany(
+        "INSERT INTO price_history (product_name, normalized_name, date, price, unit, receipt_file, sample_count) "
+        "VALUES (?, ?, ?, ?, '€/кг', 'C:/Users/user/Documents/lidl_receipts_20260812_131048.txt', 1)",
+        [(name, name, day, round(rng.uniform(0.5, 30), 2)) for name, day in data],
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(db_path: Path, repeat: int) -> dict:
+    conn = sqlite3.connect(db_path)
+    names = [row[0] for row in conn.execute("SELECT DISTINCT product_name FROM price_history")]
+    results = {"размер (KiB)": db_path.stat().st_size / 1024}
+    for label, sql in QUERIES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            if sql is None:
+                for name in names:
+                    conn.execute(
+                        "SELECT date, price, unit FROM price_history WHERE product_name = ? ORDER BY date",
+                        (name,),
+                    ).fetchall()
+            else:
+                conn.execute(sql).fetchall()
+            best = min(best, time.perf_counter() - started)
+        results[f"{label} (ms)"] = best * 1000
+    conn.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=str(ROOT / "lidl_local_prices.db"))
+    parser.add_argument("--synthetic", type=int, default=0, help="брой редове в синтетична база")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "prices.db"
+        if args.synthetic:
+            make_synthetic(db_path, args.synthetic)
+        else:
+            shutil.copy(args.db, db_path)
+        with sqlite3.connect(db_path) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != 0:
+                sys.exit("Базата вече е мигрирана – подайте база със старата схема")
+            conn.execute("VACUUM")
+
+        before = measure(db_path, args.repeat)
+        started = time.perf_counter()
+        ReceiptAnalyzer(log=lambda message: None, db_path=str(db_path)).close()
+        migration_ms = (time.perf_counter() - started) * 1000
+        # Checkpoint, за да е WAL файлът празен и размерът – реален
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        after = measure(db_path, args.repeat)
+
+    print(f"{'':32} {'преди':>12} {'след':>12}")
+    for key in before:
+        print(f"{key:32} {before[key]:12.1f} {after[key]:12.1f}")
+    print(f"{'миграция (ms)':32} {'':12} {migration_ms:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
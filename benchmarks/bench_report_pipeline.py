@@ -0,0 +1,61 @@
+"""Последователно срещу паралелно генериране на отчетите (report_pipeline).
+
+Строи синтетични данни с --products продукта × --dates дати (част от тях
+„плодове/зеленчуци“, за да има сезонен отчет) и пуска generate_reports
+веднъж с max_workers=1 и веднъж паралелно. Отпечатва времето на всеки етап,
+сумата им и общото време; при паралелното изпълнение общото време трябва да
+е близо до най-бавния етап.
+
+    python benchmarks/bench_report_pipeline.py
+    python benchmarks/bench_report_pipeline.py --products 300 --dates 150
+"""
+
+import argparse
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from receipt_analysis import ReceiptAnalyzer  # noqa: E402
+
+FRUIT_VEG = ["ДОМАТИ", "КРАСТАВИЦИ", "ЯБЪЛКИ", "БАНАНИ", "ПИПЕРКИ", "КАРТОФИ"]
+
+
+def make_products(products: int, dates: int, seed: int = 42) -> dict:
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    days = [(start + timedelta(days=2 * i)).isoformat() for i in range(dates)]
+    data = {}
+    for i in range(products):
+        name = f"{FRUIT_VEG[i % len(FRUIT_VEG)]} {i:04d}" if i % 5 == 0 else f"ПРОДУКТ {i:04d} 500Г"
+        price = rng.uniform(0.5, 20.0)
+        data[name] = {day: round(price * rng.uniform(0.9, 1.1), 2) for day in days if rng.random() < 0.4}
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=600)
+    parser.add_argument("--dates", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4, help="нишки/процеси при паралелното изпълнение")
+    args = parser.parse_args()
+
+    products_data = make_products(args.products, args.dates)
+    for label, workers in (("последователно", 1), ("паралелно", args.workers)):
+        with tempfile.TemporaryDirectory() as tmp:
+            with ReceiptAnalyzer(log=lambda message: None, db_path=str(Path(tmp) / "bench.db")) as analyzer:
+                reports = analyzer.generate_reports(products_data, str(Path(tmp) / "bench.txt"), max_workers=workers)
+        timings = reports["timings"]
+        slowest = max(timings, key=timings.get)
+        print(f"{label}: общо {reports['elapsed']:.2f} с, сума на етапите {sum(timings.values()):.2f} с, "
+              f"най-бавен {slowest} {timings[slowest]:.2f} с")
+        for name, seconds in timings.items():
+            print(f"  {name:<11} {seconds:>7.2f} с")
+
+
+if __name__ == "__main__":
+    main()
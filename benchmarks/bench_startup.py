@@ -0,0 +1,90 @@
+"""Време за студен старт на интерфейса и на модулите за анализ.
+
+За всеки модул пуска нов интерпретатор с `python -X importtime -c "import ..."`
+и отпечатва общото време за импорт, най-бавните вложени импорти и дали са
+заредени тежки зависимости (HEAVY_MODULES), които трябва да се зареждат чак
+при първа употреба. Накрая мери времето до показан прозорец: от старта на
+процеса до първото изчертаване на LidlGUI (изисква дисплей и tkcalendar).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --top 20 --modules receipt_analysis
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Не трябва да се зареждат при отваряне на прозореца или импорт на анализа
+HEAVY_MODULES = ("matplotlib", "plotly", "openpyxl", "playwright", "pyarrow")
+DEFAULT_MODULES = ("lidl_scraper_gui", "receipt_analysis", "lidl_scraper")
+# Цел: прозорецът да се появи до толкова секунди след старта на процеса
+TIME_TO_WINDOW_TARGET = 1.0
+
+WINDOW_SCRIPT = """
+import time, tkinter as tk
+import lidl_scraper_gui
+root = tk.Tk()
+lidl_scraper_gui.LidlGUI(root)
+root.update()
+print(time.time())
+root.destroy()
+"""
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def import_times(module: str) -> Tuple[List[Tuple[str, int, int]], str]:
+    """([(модул, собствено µs, общо µs)], грешка) от -X importtime."""
+    result = _run(["-X", "importtime", "-c", f"import {module}"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    error = result.stderr.strip().splitlines()[-1] if result.returncode else ""
+    return rows, error
+
+
+def time_to_window() -> str:
+    started = time.time()
+    result = _run(["-c", WINDOW_SCRIPT])
+    if result.returncode:
+        return f"не е измерено ({result.stderr.strip().splitlines()[-1]})"
+    elapsed = float(result.stdout.strip().splitlines()[-1]) - started
+    verdict = "OK" if elapsed <= TIME_TO_WINDOW_TARGET else "над целта"
+    return f"{elapsed:.2f} с (цел {TIME_TO_WINDOW_TARGET:.1f} с) – {verdict}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=10, help="брой най-бавни импорти за показване")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        rows, error = import_times(module)
+        own = next((row for row in rows if row[0].strip() == module), None)
+        print(f"\n{module}: " + (f"{own[2] / 1000:.1f} ms" if own else "неуспешен импорт"))
+        if error:
+            print(f"  грешка: {error}")
+        heavy = sorted({row[0].strip().split(".")[0] for row in rows} & set(HEAVY_MODULES))
+        print(f"  тежки зависимости: {', '.join(heavy) if heavy else 'няма'}")
+        nested = [row for row in rows if row[0].strip() != module]
+        for name, self_us, cumulative_us in sorted(nested, key=lambda row: -row[2])[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f} ms {self_us / 1000:>7.1f} ms  {name}")
+
+    print(f"\nВреме до прозорец: {time_to_window()}")
+
+
+if __name__ == "__main__":
+    main()
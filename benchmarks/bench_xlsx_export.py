@@ -0,0 +1,145 @@
+"""Сравнение на стария XLSX износ (стил на всяка клетка) с поточния price_xlsx.
+
+Строи синтетична PriceMatrix с --products продукта × --dates дати (по
+подразбиране 1000 × 1000) с цени в дял --density от клетките и записва:
+
+* legacy – обикновена работна книга на openpyxl, Font/Alignment/Border/
+  number_format на всяка клетка (както беше generate_xlsx);
+* wide / long – write_price_xlsx с именувани стилове.
+
+За всеки вариант се отчитат време, върхова памет на процеса (ru_maxrss,
+където модулът resource е наличен) и размер на файла. Вариантите се пускат в
+отделни процеси, за да не си влияят.
+
+    python benchmarks/bench_xlsx_export.py
+    python benchmarks/bench_xlsx_export.py --products 200 --dates 300 --skip-legacy
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from price_matrix import PriceMatrix  # noqa: E402
+from price_xlsx import write_price_xlsx  # noqa: E402
+
+VARIANTS = ("legacy", "wide", "long")
+
+
+def make_matrix(products: int, dates: int, density: float, seed: int = 42) -> PriceMatrix:
+    rng = np.random.default_rng(seed)
+    mask = rng.random((products, dates)) < density
+    row_ids, cols = np.nonzero(mask)
+    days = 19723 + cols * 2
+    values = np.round(rng.uniform(0.5, 30.0, len(row_ids)), 2)
+    names = [f"ПРОДУКТ {i:05d}" for i in range(products)]
+    return PriceMatrix.from_coo(names, ["€/бр"] * products, row_ids, days, values)
+
+
+def write_legacy(matrix: PriceMatrix, output_file: Path) -> None:
+    import openpyxl
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(bold=True, size=12, color="FFFFFF")
+    thin_border = Border(
+        left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"),
+    )
+    dates = matrix.date_strings()
+    for column, title in enumerate(["Артикул", "Единица"] + dates, start=1):
+        cell = ws.cell(row=1, column=column, value=title)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center", vertical="center")
+        cell.border = thin_border
+    for row, name in enumerate(matrix.names):
+        ws.cell(row=row + 2, column=1, value=name).alignment = Alignment(vertical="center")
+        ws.cell(row=row + 2, column=2, value=matrix.units[row]).alignment = Alignment(
+            horizontal="center", vertical="center"
+        )
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        for column, price in zip(matrix.cols[start:end].tolist(), matrix.values[start:end].tolist()):
+            cell = ws.cell(row=row + 2, column=column + 3, value=price)
+            cell.number_format = "[$€-407] #,##0.00"
+            cell.alignment = Alignment(horizontal="right", vertical="center")
+        for column in range(1, len(dates) + 3):
+            ws.cell(row=row + 2, column=column).border = thin_border
+    for column in range(3, len(dates) + 3):
+        ws.column_dimensions[get_column_letter(column)].width = 15
+    ws.freeze_panes = "C2"
+    wb.save(output_file)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(variant: str, args) -> dict:
+    matrix = make_matrix(args.products, args.dates, args.density)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = Path(tmp) / f"{variant}.xlsx"
+        started = time.perf_counter()
+        if variant == "legacy":
+            write_legacy(matrix, output_file)
+        else:
+            write_price_xlsx(matrix, output_file, layout=variant)
+        elapsed = time.perf_counter() - started
+        return {
+            "variant": variant,
+            "cells": matrix.nnz,
+            "seconds": elapsed,
+            "peak_mb": _peak_rss_mb(),
+            "size_mb": output_file.stat().st_size / 2 ** 20,
+        }
+
+
+def _format_mb(value) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--dates", type=int, default=1000)
+    parser.add_argument("--density", type=float, default=0.3, help="дял на клетките с цена")
+    parser.add_argument("--skip-legacy", action="store_true", help="без стария износ (бавен при 1000 × 1000)")
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args)))
+        return
+
+    print(f"{args.products} продукта × {args.dates} дати, плътност {args.density:.0%}")
+    print(f"{'вариант':<8} {'цени':>9} {'време, с':>10} {'памет, MB':>10} {'файл, MB':>9}")
+    for variant in VARIANTS:
+        if variant == "legacy" and args.skip_legacy:
+            continue
+        command = [
+            sys.executable, __file__, "--variant", variant, "--products", str(args.products),
+            "--dates", str(args.dates), "--density", str(args.density),
+        ]
+        result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+        print(
+            f"{result['variant']:<8} {result['cells']:>9} {result['seconds']:>10.2f} "
+            f"{_format_mb(result['peak_mb']):>10} {result['size_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Изнасяне на данните на графиките от HTML отчетите в отделни файлове.
+
+При голям каталог вграденият json.dumps(traces) прави отчета огромен и
+браузърът парсва всички серии, дори скритите. В този режим HTML-ът пази
+само „обвивките“ на сериите (име, стил, видимост) и данните на видимите
+при отваряне; x/y на останалите се записват компактно в шардове по група
+продукти (категория от каталога, по до SHARD_MAX_TRACES серии) в папка
+<отчет>_data до HTML-а. CHART_LOADER_JS зарежда шард, едва когато негова
+серия стане видима – от легендата, търсенето или „Покажи всички“.
+
+Формати на шардовете (CHART_DATA_FORMATS):
+
+* js – JSONP скрипт (lidlChartShard({...})); работи и при отваряне от диска
+  (file://), където fetch е забранен;
+* json / json.gz – за публикувани отчети (GitHub Pages); .gz се разархивира
+  в браузъра с DecompressionStream.
+
+Датите са номера на дни от 1970-01-01, кодирани като разлики спрямо
+предишната точка; цените са закръглени до PRICE_DIGITS знака.
+
+Преди сериализация prepare_traces прорежда сериите с повече от
+DECIMATE_POINTS точки с Largest-Triangle-Three-Buckets (LTTB) – запазва
+формата и пиковете с малка част от точките – а над WEBGL_POINTS точки общо
+графиката се чертае с WebGL (scattergl). Пълните серии остават достъпни:
+вградени или в шардове full-N, и се зареждат при приближаване (zoom) по
+оста x; „Възстанови изглед“/двоен клик връща прорядените.
+"""
+
+import gzip
+import json
+import re
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from price_db import UNIX_EPOCH_ORDINAL
+
+CHART_DATA_FORMATS = ("js", "json", "json.gz")
+SHARD_MAX_TRACES = 100
+# Колко серии са видими (и вградени) при отваряне на отчет с изнесени данни
+DEFAULT_VISIBLE_TRACES = 12
+PRICE_DIGITS = 4
+# Над толкова точки серията се прорежда (LTTB) до толкова точки
+DECIMATE_POINTS = 500
+# Над толкова точки общо (след прореждането) сериите стават scattergl
+WEBGL_POINTS = 20_000
+
+_COMPACT = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def data_dir_for(output_file) -> Path:
+    """Папката с шардовете на отчета: <име на отчета>_data до него."""
+    output_file = Path(output_file)
+    return output_file.with_name(output_file.stem + "_data")
+
+
+def _to_day(value) -> int:
+    # Plotly сериализира датите като ISO низове ('2025-01-01' или '2025-01-01T00:00:00')
+    return date.fromisoformat(str(value)[:10]).toordinal() - UNIX_EPOCH_ORDINAL
+
+
+def encode_series(x: Sequence, y: Sequence) -> dict:
+    """Компактни x/y: начален ден, разлики в дни и закръглени цени."""
+    days = [_to_day(value) for value in x]
+    return {
+        "d": [days[0]] + [b - a for a, b in zip(days, days[1:])] if days else [],
+        "y": [round(float(price), PRICE_DIGITS) for price in y],
+    }
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Индексите на threshold точки, избрани с Largest-Triangle-Three-Buckets.
+
+    Първата и последната точка остават; от всяка от останалите кофи се взима
+    точката, която образува най-голям триъгълник с избраната в предишната
+    кофа и средната точка на следващата.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    bounds = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(np.int64) + 1
+    bounds[-1] = n - 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        next_end = bounds[bucket + 2] if bucket + 2 < len(bounds) else n
+        avg_x, avg_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def decimate_traces(traces: List[dict], max_points: int = DECIMATE_POINTS) -> Dict[int, dict]:
+    """Прорежда на място сериите с повече от max_points точки; връща {индекс: пълната серия (encode_series)}."""
+    full = {}
+    for index, trace in enumerate(traces):
+        x, y = trace.get("x") or [], trace.get("y") or []
+        if len(x) <= max_points:
+            continue
+        full[index] = encode_series(x, y)
+        days = np.cumsum(full[index]["d"]).astype(np.float64)
+        keep = lttb_indices(days, np.asarray(y, dtype=np.float64), max_points).tolist()
+        trace["x"] = [x[i] for i in keep]
+        trace["y"] = [y[i] for i in keep]
+    return full
+
+
+def use_webgl(traces: List[dict], max_points: int = WEBGL_POINTS) -> bool:
+    """Превключва сериите на scattergl, ако общо имат повече от max_points точки."""
+    if sum(len(trace.get("x") or []) for trace in traces) <= max_points:
+        return False
+    for trace in traces:
+        trace["type"] = "scattergl"
+    return True
+
+
+def prepare_traces(
+    traces: List[dict], groups: Sequence[Optional[str]], output_file, data_format: Optional[str] = None,
+) -> str:
+    """Етапът преди сериализация: LTTB, WebGL и (с data_format) изнасяне на данните.
+
+    Променя traces на място и връща <script> за зареждане на изнесените или
+    пълните серии ('' ако няма какво да се зарежда).
+    """
+    full = decimate_traces(traces)
+    use_webgl(traces)
+    manifest = externalize_traces(traces, groups, output_file, data_format) if data_format else None
+    if full:
+        manifest = manifest or {"format": None, "files": [], "shardOf": [None] * len(traces)}
+        manifest["full"] = _full_series(full, output_file, data_format)
+    return loader_script(manifest) if manifest else ""
+
+
+def _full_series(full: Dict[int, dict], output_file, data_format: Optional[str]) -> dict:
+    traces = sorted(full)
+    if not data_format:
+        return {"traces": traces, "series": [full[index] for index in traces]}
+    data_dir = data_dir_for(output_file)
+    files = []
+    for part, start in enumerate(range(0, len(traces), SHARD_MAX_TRACES)):
+        chunk = traces[start:start + SHARD_MAX_TRACES]
+        key = f"full-{part}"
+        files.append(f"{data_dir.name}/{key}.{data_format}")
+        _write_shard(
+            data_dir / f"{key}.{data_format}",
+            {"key": key, "traces": chunk, "series": [full[index] for index in chunk]},
+            data_format,
+        )
+    return {"traces": traces, "files": files}
+
+
+def _slug(group: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_-]+", "_", group or "other").strip("_") or "other"
+
+
+def externalize_traces(traces: List[dict], groups: Sequence[Optional[str]], output_file, data_format: str = "js") -> dict:
+    """Изнася x/y на скритите серии в шардове до output_file и връща манифеста за CHART_LOADER_JS.
+
+    traces се променят на място: сериите с visible, различно от True, остават
+    без x/y. groups[i] е групата (категорията) на серия i.
+    """
+    if data_format not in CHART_DATA_FORMATS:
+        raise ValueError(f"Непознат формат на данните: {data_format}")
+    data_dir = data_dir_for(output_file)
+    if data_dir.exists():
+        shutil.rmtree(data_dir)
+
+    by_group: Dict[str, List[int]] = {}
+    for index, trace in enumerate(traces):
+        if trace.get("visible", True) is not True:
+            by_group.setdefault(_slug(groups[index]), []).append(index)
+
+    shard_of = [None] * len(traces)
+    files = []
+    for group, indices in sorted(by_group.items()):
+        for part, start in enumerate(range(0, len(indices), SHARD_MAX_TRACES)):
+            chunk = indices[start:start + SHARD_MAX_TRACES]
+            key = f"{group}-{part}"
+            payload = {"key": key, "traces": chunk, "series": []}
+            for index in chunk:
+                trace = traces[index]
+                payload["series"].append(encode_series(trace.pop("x", []), trace.pop("y", [])))
+                shard_of[index] = len(files)
+            files.append(f"{data_dir.name}/{key}.{data_format}")
+            _write_shard(data_dir / f"{key}.{data_format}", payload, data_format)
+
+    return {"format": data_format, "files": files, "shardOf": shard_of}
+
+
+def _write_shard(path: Path, payload: dict, data_format: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    body = json.dumps(payload, **_COMPACT)
+    if data_format == "js":
+        path.write_text(f"lidlChartShard({body});", encoding="utf-8")
+    elif data_format == "json.gz":
+        path.write_bytes(gzip.compress(body.encode("utf-8")))
+    else:
+        path.write_text(body, encoding="utf-8")
+
+
+def loader_script(manifest: dict, div_id: str = "chart") -> str:
+    """<script> с CHART_LOADER_JS, закачен към графиката div_id (след Plotly.newPlot)."""
+    return (
+        f"\n  <script>{CHART_LOADER_JS}\n"
+        f"    lidlLazyChart('{div_id}', {json.dumps(manifest, **_COMPACT)});\n  </script>"
+    )
+
+
+CHART_LOADER_JS = """
+    var lidlChartShardWaiters = {};
+    function lidlChartShard(payload) {
+      var waiter = lidlChartShardWaiters[payload.key];
+      if (waiter) { delete lidlChartShardWaiters[payload.key]; waiter(payload); }
+    }
+    function lidlLazyChart(divId, manifest) {
+      var gd = document.getElementById(divId);
+      var pending = {};
+      function decode(series) {
+        var day = 0, x = new Array(series.d.length);
+        for (var i = 0; i < series.d.length; i++) {
+          day += series.d[i];
+          x[i] = new Date(day * 86400000).toISOString().slice(0, 10);
+        }
+        return x;
+      }
+      function fetchShard(file) {
+        if (manifest.format === 'js') {
+          return new Promise(function(resolve, reject) {
+            var key = file.split('/').pop().replace(/\\.js$/, '');
+            lidlChartShardWaiters[key] = resolve;
+            var script = document.createElement('script');
+            script.src = file;
+            script.onerror = reject;
+            document.head.appendChild(script);
+          });
+        }
+        return fetch(file).then(function(response) {
+          if (manifest.format === 'json.gz') {
+            return new Response(response.body.pipeThrough(new DecompressionStream('gzip'))).json();
+          }
+          return response.json();
+        });
+      }
+      function loadShard(shard) {
+        if (!pending[shard]) {
+          pending[shard] = fetchShard(manifest.files[shard]).then(function(payload) {
+            var xs = payload.series.map(decode);
+            var ys = payload.series.map(function(series) { return series.y; });
+            return Plotly.restyle(gd, {x: xs, y: ys}, payload.traces);
+          });
+        }
+        return pending[shard];
+      }
+      function loadVisible() {
+        var shards = {};
+        gd.data.forEach(function(trace, index) {
+          var shard = manifest.shardOf[index];
+          if (shard !== null && trace.visible === true && !pending[shard]) { shards[shard] = true; }
+        });
+        Object.keys(shards).forEach(function(shard) { loadShard(shard); });
+      }
+      gd.on('plotly_restyle', loadVisible);
+      loadVisible();
+
+      // Пълните серии на прорядените при приближаване по x; прорядените – при връщане на изгледа
+      var full = manifest.full, decimated = {}, fullSeries = null, showingFull = false;
+      if (!full) { return; }
+      function loadFull() {
+        if (!fullSeries) {
+          var parts = full.series ? [Promise.resolve(full)] : full.files.map(fetchShard);
+          fullSeries = Promise.all(parts).then(function(payloads) {
+            var series = {};
+            payloads.forEach(function(payload) {
+              payload.traces.forEach(function(trace, k) {
+                series[trace] = {x: decode(payload.series[k]), y: payload.series[k].y};
+              });
+            });
+            return series;
+          });
+        }
+        return fullSeries;
+      }
+      function setResolution(wantFull) {
+        if (wantFull === showingFull) { return; }
+        showingFull = wantFull;
+        (wantFull ? loadFull() : Promise.resolve(null)).then(function(series) {
+          var traces = [], xs = [], ys = [];
+          full.traces.forEach(function(trace) {
+            if (wantFull) {
+              if (!decimated[trace]) { decimated[trace] = {x: gd.data[trace].x, y: gd.data[trace].y}; }
+              traces.push(trace); xs.push(series[trace].x); ys.push(series[trace].y);
+            } else if (decimated[trace] && decimated[trace].x) {
+              traces.push(trace); xs.push(decimated[trace].x); ys.push(decimated[trace].y);
+            }
+          });
+          if (traces.length) { Plotly.restyle(gd, {x: xs, y: ys}, traces); }
+        });
+      }
+      gd.on('plotly_relayout', function(event) {
+        if (event['xaxis.autorange']) { setResolution(false); }
+        else if (event['xaxis.range[0]'] !== undefined || event['xaxis.range'] !== undefined) { setResolution(true); }
+      });
+    }"""
@@ -0,0 +1,349 @@
+"""Версии на схемата на локалната база данни.
+
+Текущата версия се пази в PRAGMA user_version. Всяка миграция е функция
+migration(conn, catalog), която преминава от предишната версия към своята;
+apply_migrations изпълнява само липсващите миграции по ред, в транзакцията на
+извикващия, така че при грешка базата остава на старата си версия.
+"""
+
+from typing import Callable, List, Tuple
+
+from price_segments import create_segment_tables, refresh_price_segments
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _migrate_normalized_prices(conn, catalog) -> None:
+    """v1: price_history -> компактна таблица prices с целочислени ключове.
+
+    Имената на продуктите се заменят с products.id, датите – с номер на ден,
+    а единиците, източниците и файловете – с id от речникови таблици. prices е
+    WITHOUT ROWID и е подредена физически по (product_id, day, unit_id), така
+    че историята на един продукт се чете последователно без отделен индекс.
+    Старото име price_history остава като изглед със същите колони.
+    """
+    conn.execute("CREATE TABLE units (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE TABLE sources (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    conn.execute("CREATE TABLE receipt_files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE)")
+    conn.execute(
+        """
+        CREATE TABLE prices (
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            day INTEGER NOT NULL,
+            unit_id INTEGER NOT NULL REFERENCES units(id),
+            price REAL NOT NULL,
+            sample_count INTEGER NOT NULL DEFAULT 1,
+            source_id INTEGER REFERENCES sources(id),
+            file_id INTEGER REFERENCES receipt_files(id),
+            PRIMARY KEY (product_id, day, unit_id)
+        ) WITHOUT ROWID
+        """
+    )
+
+    # Продукт в каталога за всяко име от старата таблица
+    catalog.get_many(
+        (row[0] for row in conn.execute("SELECT DISTINCT product_name FROM price_history").fetchall()),
+        conn=conn,
+    )
+    conn.execute("INSERT OR IGNORE INTO units (name) SELECT DISTINCT unit FROM price_history")
+    conn.execute(
+        "INSERT OR IGNORE INTO sources (name) SELECT DISTINCT source FROM price_history WHERE source IS NOT NULL"
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO receipt_files (path) "
+        "SELECT DISTINCT receipt_file FROM price_history WHERE receipt_file IS NOT NULL"
+    )
+    conn.execute(
+        """
+        INSERT INTO prices (product_id, day, unit_id, price, sample_count, source_id, file_id)
+        SELECT p.id, CAST(julianday(ph.date) - 2440587.5 AS INTEGER), u.id, ph.price,
+               COALESCE(ph.sample_count, 1), s.id, f.id
+        FROM price_history ph
+        JOIN products p ON p.raw_name = ph.product_name
+        JOIN units u ON u.name = ph.unit
+        LEFT JOIN sources s ON s.name = ph.source
+        LEFT JOIN receipt_files f ON f.path = ph.receipt_file
+        WHERE julianday(ph.date) IS NOT NULL
+        """
+    )
+    conn.execute("DROP TABLE price_history")
+    conn.execute(
+        """
+        CREATE VIEW price_history AS
+        SELECT p.raw_name AS product_name,
+               p.canonical_name AS normalized_name,
+               date(pr.day * 86400, 'unixepoch') AS date,
+               pr.price AS price,
+               u.name AS unit,
+               s.name AS source,
+               f.path AS receipt_file,
+               pr.sample_count AS sample_count
+        FROM prices pr
+        JOIN products p ON p.id = pr.product_id
+        JOIN units u ON u.id = pr.unit_id
+        LEFT JOIN sources s ON s.id = pr.source_id
+        LEFT JOIN receipt_files f ON f.id = pr.file_id
+        """
+    )
+
+    # line_items.price_history_id сочеше rowid на старата таблица; връзката към
+    # prices вече е (продукт, дата на бележката, единица)
+    conn.execute(
+        """
+        CREATE TABLE line_items_v1 (
+            receipt_id INTEGER NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+            line_no INTEGER NOT NULL,
+            product_name TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            quantity REAL,
+            unit_price REAL,
+            amount REAL NOT NULL,
+            discount REAL NOT NULL DEFAULT 0,
+            price REAL NOT NULL,
+            PRIMARY KEY (receipt_id, line_no)
+        )
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO line_items_v1
+        SELECT receipt_id, line_no, product_name, unit, quantity, unit_price, amount, discount, price
+        FROM line_items
+        """
+    )
+    conn.execute("DROP TABLE line_items")
+    conn.execute("ALTER TABLE line_items_v1 RENAME TO line_items")
+    conn.execute("CREATE INDEX idx_line_items_product ON line_items(product_name, receipt_id)")
+
+
+# Агрегирани таблици: (таблица, период като цяло число от номера на деня,
+# SQLite модификатори за началото и дължината на периода). Периодът е YYYYMM или YYYY.
+PERIOD_TABLES = (
+    (
+        "monthly_prices",
+        "CAST(strftime('%Y%m', {day} * 86400, 'unixepoch') AS INTEGER)",
+        "start of month",
+        "+1 month",
+    ),
+    (
+        "yearly_prices",
+        "CAST(strftime('%Y', {day} * 86400, 'unixepoch') AS INTEGER)",
+        "start of year",
+        "+1 year",
+    ),
+)
+
+
+def _period_bounds(day: str, start_modifier: str, length_modifier: str) -> Tuple[str, str]:
+    """SQL изрази за първия и последния ден (номера) от периода, съдържащ day."""
+    start = f"date({day} * 86400, 'unixepoch', '{start_modifier}')"
+    return (
+        f"CAST(julianday({start}) - 2440587.5 AS INTEGER)",
+        f"CAST(julianday({start}, '{length_modifier}', '-1 day') - 2440587.5 AS INTEGER)",
+    )
+
+
+def _migrate_period_aggregates(conn, catalog) -> None:
+    """v2: месечни и годишни агрегати по продукт и единица, поддържани с тригери.
+
+    За всеки период се пазят брой дни с цена, сума, сума на квадратите, мин. и
+    макс., така че средна цена, разсейване и сравнения между периоди са
+    O(продукти), независимо от броя записани дни. Тригерите върху prices
+    обновяват агрегатите в същата транзакция като записа на цената; мин./макс.
+    се преизчисляват от prices (по първичния ключ) само ако старата цена е била
+    мин./макс. на периода.
+    """
+    for table, period_sql, start_modifier, length_modifier in PERIOD_TABLES:
+        conn.execute(
+            f"""
+            CREATE TABLE {table} (
+                product_id INTEGER NOT NULL REFERENCES products(id),
+                unit_id INTEGER NOT NULL REFERENCES units(id),
+                period INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                total REAL NOT NULL,
+                total_sq REAL NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL,
+                PRIMARY KEY (product_id, unit_id, period)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute(f"CREATE INDEX idx_{table}_period ON {table}(period)")
+        conn.execute(
+            f"""
+            INSERT INTO {table} (product_id, unit_id, period, n, total, total_sq, min_price, max_price)
+            SELECT product_id, unit_id, {period_sql.format(day='day')},
+                   COUNT(*), SUM(price), SUM(price * price), MIN(price), MAX(price)
+            FROM prices
+            GROUP BY 1, 2, 3
+            """
+        )
+
+        def period_of(row: str) -> str:
+            return period_sql.format(day=f"{row}.day")
+
+        def range_stat(func: str, row: str) -> str:
+            first_day, last_day = _period_bounds(f"{row}.day", start_modifier, length_modifier)
+            return (
+                f"(SELECT {func}(price) FROM prices WHERE product_id = {row}.product_id "
+                f"AND unit_id = {row}.unit_id AND day BETWEEN {first_day} AND {last_day})"
+            )
+
+        conn.execute(
+            f"""
+            CREATE TRIGGER {table}_insert AFTER INSERT ON prices BEGIN
+                INSERT INTO {table} (product_id, unit_id, period, n, total, total_sq, min_price, max_price)
+                VALUES (new.product_id, new.unit_id, {period_of('new')},
+                        1, new.price, new.price * new.price, new.price, new.price)
+                ON CONFLICT (product_id, unit_id, period) DO UPDATE SET
+                    n = n + 1,
+                    total = total + excluded.total,
+                    total_sq = total_sq + excluded.total_sq,
+                    min_price = MIN(min_price, excluded.min_price),
+                    max_price = MAX(max_price, excluded.max_price);
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER {table}_update AFTER UPDATE OF price ON prices BEGIN
+                UPDATE {table} SET
+                    total = total - old.price + new.price,
+                    total_sq = total_sq - old.price * old.price + new.price * new.price,
+                    min_price = CASE WHEN old.price > min_price THEN MIN(min_price, new.price)
+                                     ELSE {range_stat('MIN', 'new')} END,
+                    max_price = CASE WHEN old.price < max_price THEN MAX(max_price, new.price)
+                                     ELSE {range_stat('MAX', 'new')} END
+                WHERE product_id = new.product_id AND unit_id = new.unit_id AND period = {period_of('new')};
+            END
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TRIGGER {table}_delete AFTER DELETE ON prices BEGIN
+                UPDATE {table} SET
+                    n = n - 1,
+                    total = total - old.price,
+                    total_sq = total_sq - old.price * old.price,
+                    min_price = COALESCE({range_stat('MIN', 'old')}, min_price),
+                    max_price = COALESCE({range_stat('MAX', 'old')}, max_price)
+                WHERE product_id = old.product_id AND unit_id = old.unit_id AND period = {period_of('old')};
+                DELETE FROM {table}
+                WHERE product_id = old.product_id AND unit_id = old.unit_id AND period = {period_of('old')}
+                      AND n <= 0;
+            END
+            """
+        )
+
+
+def _migrate_merge_ledger(conn, catalog) -> None:
+    """v3: идентификатор на базата и регистър на сливанията от други бази.
+
+    merge_sources пази за всяка слята база (по нейния database_id) отпечатъка
+    на данните ѝ при последното сливане, а merge_contributions – редовете, с
+    които е допринесла към prices. Така повторно сливане на същата база се
+    пропуска, а сливане на по-нова нейна версия заменя стария ѝ принос, вместо
+    да го добави втори път.
+    """
+    conn.execute(
+        "INSERT OR IGNORE INTO catalog_meta (key, value) VALUES ('database_id', lower(hex(randomblob(16))))"
+    )
+    conn.execute(
+        """
+        CREATE TABLE merge_sources (
+            id INTEGER PRIMARY KEY,
+            database_id TEXT NOT NULL UNIQUE,
+            path TEXT,
+            fingerprint TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            merged_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE merge_contributions (
+            source_id INTEGER NOT NULL REFERENCES merge_sources(id),
+            product_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            unit_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            sample_count INTEGER NOT NULL,
+            PRIMARY KEY (source_id, product_id, day, unit_id)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migrate_price_segments(conn, catalog) -> None:
+    """v4: отрязъци с постоянна цена (price_segments) и индекс на промените (price_changes)."""
+    create_segment_tables(conn)
+    conn.execute(
+        "INSERT INTO price_segments_stale (product_id, unit_id) SELECT DISTINCT product_id, unit_id FROM prices"
+    )
+    refresh_price_segments(conn)
+
+
+def _migrate_file_receipts(conn, catalog) -> None:
+    """v5: регистърът на файловете пази само отпечатъка им, без кеша на парсинга.
+
+    Колоната ingested_files.parsed (JSON с всички бележки на файла) дублираше
+    receipts и line_items. Непроменен файл се възстановява от тях чрез
+    ingested_receipts – бележките на файла в реда им в него. Старите записи в
+    регистъра нямат такава връзка, затова се изтриват: всеки файл се парсва
+    още веднъж, без да променя вече записаните бележки и цени.
+    """
+    conn.execute("DROP TABLE ingested_files")
+    conn.execute(
+        """
+        CREATE TABLE ingested_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_hash TEXT NOT NULL,
+            receipt_count INTEGER NOT NULL DEFAULT 0,
+            ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE ingested_receipts (
+            path TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            receipt_id INTEGER NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+            PRIMARY KEY (path, position)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# (версия, описание, миграция) – версиите са последователни и започват от 1
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "компактна таблица prices с целочислени ключове", _migrate_normalized_prices),
+    (2, "месечни и годишни агрегати на цените", _migrate_period_aggregates),
+    (3, "регистър на сливанията с други бази", _migrate_merge_ledger),
+    (4, "отрязъци с постоянна цена и индекс на промените", _migrate_price_segments),
+    (5, "регистър на файловете без кеша на парсинга", _migrate_file_receipts),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def apply_migrations(conn, catalog) -> List[Tuple[int, str]]:
+    """Изпълнява липсващите миграции и връща [(версия, описание)] на изпълнените."""
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Базата е от по-нова версия на програмата (схема {version}, поддържана {SCHEMA_VERSION})"
+        )
+    applied = []
+    for target, description, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        migration(conn, catalog)
+        conn.execute(f"PRAGMA user_version = {target}")
+        applied.append((target, description))
+    return applied
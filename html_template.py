@@ -0,0 +1,78 @@
+"""Малък шаблонен слой за HTML отчетите.
+
+Template приема текст със синтаксиса на str.format – {поле}, {поле:.2f},
+{{ и }} за литерални скоби – и го компилира веднъж до списък от статични
+части и полета. След това рендирането само ги свързва:
+
+* render() – низ чрез ''.join;
+* write() – частите се пишат направо във файла, без целия HTML в паметта;
+* render_rows() – ред по ред за итерируемо от речници (мързеливо).
+
+Стойност на поле може да е итерируемо от низове (напр. render_rows(...)) –
+то се слепва/изписва парче по парче. Така таблица с хиляди реда се изгражда
+за линейно време вместо с `html += ...` в цикъл. Стойностите не се
+екранират – подават се вече готови за HTML.
+"""
+
+import re
+import string
+from typing import Iterable, Iterator, List, Mapping, Optional, Tuple
+
+WRITE_BUFFER_CHARS = 1 << 16
+_SAFE_SPEC = re.compile(r"[\w.,%<>=^+\- #]*")
+
+
+class Template:
+    """Компилиран шаблон; полетата са прости имена (без индекси и атрибути)."""
+
+    __slots__ = ("_parts", "fields")
+
+    def __init__(self, source: str):
+        parts: List[Tuple[str, Optional[str], str]] = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if field is None:
+                parts.append((literal, None, ""))
+                continue
+            if not field.isidentifier() or conversion or not _SAFE_SPEC.fullmatch(spec or ""):
+                raise ValueError(f"Неподдържано поле в шаблона: {{{field}}}")
+            parts.append((literal, field, spec or ""))
+        self._parts = parts
+        self.fields = tuple(dict.fromkeys(field for _, field, _ in parts if field))
+
+    def chunks(self, values: Mapping) -> Iterator[str]:
+        """Частите на резултата една по една; поточните стойности се изписват парче по парче."""
+        for literal, field, spec in self._parts:
+            if literal:
+                yield literal
+            if field is None:
+                continue
+            value = values[field]
+            if not spec and _is_stream(value):
+                yield from value
+            else:
+                yield format(value, spec)
+
+    def render(self, **values) -> str:
+        return "".join(self.chunks(values))
+
+    def render_rows(self, rows: Iterable[Mapping]) -> Iterator[str]:
+        """Рендира шаблона за всеки ред (речник) – мързеливо, подходящо за стойност на поле."""
+        for row in rows:
+            yield "".join(self.chunks(row))
+
+    def write(self, output_file, **values) -> None:
+        """Записва резултата в output_file (UTF-8), без да го събира в паметта."""
+        with open(output_file, "w", encoding="utf-8") as handle:
+            # Малките парчета (редове) се събират до WRITE_BUFFER_CHARS преди запис
+            batch, size = [], 0
+            for chunk in self.chunks(values):
+                batch.append(chunk)
+                size += len(chunk)
+                if size >= WRITE_BUFFER_CHARS:
+                    handle.write("".join(batch))
+                    batch, size = [], 0
+            handle.write("".join(batch))
+
+
+def _is_stream(value) -> bool:
+    return hasattr(value, "__iter__") and not isinstance(value, str)
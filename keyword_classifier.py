@@ -0,0 +1,94 @@
+"""Класификация на имена на продукти по ключови думи с автомат на Ахо–Корасик.
+
+Всички таблици с ключови думи се компилират веднъж в един автомат, така че
+едно име се сканира еднократно (линейно по дължината си), вместо да се
+проверява подниз по подниз срещу стотици ключови думи.
+"""
+
+import hashlib
+from collections import deque
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+INCLUDE = "include"
+EXCLUDE = "exclude"
+
+
+class KeywordAutomaton:
+    """Автомат на Ахо–Корасик: намира всички ключови думи, съдържащи се в текст."""
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[FrozenSet[Hashable]] = [frozenset()]
+
+        for word, label in keywords:
+            state = 0
+            for char in word:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(frozenset())
+                state = next_state
+            self._out[state] = self._out[state] | {label}
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] | self._out[self._fail[next_state]]
+
+    def labels(self, text: str) -> FrozenSet[Hashable]:
+        """Връща етикетите на всички ключови думи, срещани в text (като поднизове)."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return frozenset(found)
+
+
+class CategoryClassifier:
+    """Определя категорията на продукт по таблици с ключови думи.
+
+    tables е подредена последователност от (category, include_keywords,
+    exclude_keywords). Продуктът попада в категория, ако съдържа поне една
+    include дума и нито една exclude дума от същата категория; при няколко
+    съвпадения печели първата категория по реда в tables.
+    """
+
+    def __init__(self, tables: Sequence[Tuple[str, Sequence[str], Sequence[str]]]):
+        self.categories = [category for category, _, _ in tables]
+        keywords = []
+        for category, include, exclude in tables:
+            keywords.extend((word.upper(), (category, INCLUDE)) for word in include)
+            keywords.extend((word.upper(), (category, EXCLUDE)) for word in exclude)
+        self._automaton = KeywordAutomaton(keywords)
+        self.version = hashlib.sha1(repr(list(tables)).encode("utf-8")).hexdigest()[:12]
+
+    def categories_of(self, product_name: str) -> List[str]:
+        """Всички категории, на които отговаря името, по реда на приоритета."""
+        labels = self._automaton.labels(product_name.upper())
+        return [
+            category for category in self.categories
+            if (category, INCLUDE) in labels and (category, EXCLUDE) not in labels
+        ]
+
+    def classify(self, product_name: str) -> Optional[str]:
+        matched = self.categories_of(product_name)
+        return matched[0] if matched else None
+
+    def matches(self, category: str, product_name: str) -> bool:
+        return category in self.categories_of(product_name)
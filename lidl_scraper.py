@@ -18,7 +18,6 @@ from pathlib import Path
 from typing import Callable, List, Optional
 from urllib.parse import urljoin
 
-from playwright.async_api import TimeoutError as PlaywrightTimeout
 
 LOGIN_URL = (
     "https://accounts.lidl.com/Account/Login?ReturnUrl=%2Fconnect%2Fauthorize%2Fcallback%3F"
@@ -45,6 +44,13 @@ MAX_CONCURRENT_TABS = 5
 PAGE_LOAD_TIMEOUT = 30000
 
 
+def _playwright_timeout() -> type:
+    """TimeoutError на Playwright; зарежда се при първа нужда, а не при импорт на модула."""
+    from playwright.async_api import TimeoutError as PlaywrightTimeout
+
+    return PlaywrightTimeout
+
+
 async def _first_matching(page, selectors: List[str]):
     """Връща първия списък от елементи, matched от някой от selectors-ите."""
     for selector in selectors:
@@ -129,7 +135,7 @@ class LidlReceiptDownloader:
         """Чака покупките да се появят на страницата (има скрол-зареждане)."""
         try:
             await page.wait_for_selector(PURCHASE_SELECTORS[0], state="attached", timeout=timeout)
-        except PlaywrightTimeout:
+        except _playwright_timeout():
             pass
         await asyncio.sleep(0.3)
 
@@ -198,7 +204,7 @@ class LidlReceiptDownloader:
             await tab.goto(url, wait_until="domcontentloaded", timeout=PAGE_LOAD_TIMEOUT)
             try:
                 await tab.wait_for_selector("main", state="attached", timeout=5000)
-            except PlaywrightTimeout:
+            except _playwright_timeout():
                 pass
             await asyncio.sleep(0.4)
 
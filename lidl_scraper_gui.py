@@ -4,8 +4,8 @@
 Влизането е ръчно (в отворения от Playwright браузър) — пароли не се съхраняват.
 """
 
-import asyncio
 import os
+import queue
 import re
 import threading
 import time
@@ -16,8 +16,8 @@ from tkinter import filedialog, messagebox, scrolledtext, ttk
 from tkcalendar import DateEntry
 
 from config import load_config, save_config
-from lidl_scraper import LidlReceiptDownloader
-from receipt_analysis import ReceiptAnalyzer
+
+UI_QUEUE_POLL_MS = 100
 
 
 class LidlGUI:
@@ -30,6 +30,8 @@ class LidlGUI:
         self.download_thread = None
         self.current_page = 0
         self.use_period_var = tk.BooleanVar(value=False)
+        # Логове и статус от работни нишки; изпълняват се от Tk нишката в _drain_ui_queue
+        self._ui_queue = queue.Queue()
 
         self.config = load_config()
         self.output_dir = self.config["output_dir"]
@@ -42,6 +44,13 @@ class LidlGUI:
         self.setup_ui()
         self.load_saved_analysis_file()
         self.root.after(500, self._poll_progress)
+        self.root.after(UI_QUEUE_POLL_MS, self._drain_ui_queue)
+
+    def _analyzer(self):
+        """ReceiptAnalyzer за локалната база; модулът (numpy, SQLite схема) се зарежда при първия анализ."""
+        from receipt_analysis import ReceiptAnalyzer
+
+        return ReceiptAnalyzer(log=self.log_message, db_path=self.db_path)
 
     # ── UI ────────────────────────────────────────────────────────────────────
     def setup_ui(self):
@@ -132,16 +141,36 @@ class LidlGUI:
             row=0, column=2, padx=5
         )
 
-        ttk.Button(
+        self.analyze_button = ttk.Button(
             frame, text="Анализ → XLSX + сезонен отчет",
             command=self.analyze_receipts,
-        ).grid(row=1, column=0, columnspan=3, pady=8)
+        )
+        self.analyze_button.grid(row=1, column=0, columnspan=3, pady=8)
 
         ttk.Button(
             frame, text="Локална база данни → HTML",
             command=self.generate_local_db_report,
         ).grid(row=2, column=0, columnspan=3, pady=(0, 8))
 
+        ttk.Button(
+            frame, text="Локална база данни → Parquet",
+            command=self.export_local_db,
+        ).grid(row=3, column=0, columnspan=3, pady=(0, 8))
+
+        search_frame = ttk.Frame(frame)
+        search_frame.grid(row=4, column=0, columnspan=3, sticky=tk.EW)
+        search_frame.columnconfigure(0, weight=1)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.search_var)
+        search_entry.grid(row=0, column=0, sticky=tk.EW, padx=5)
+        search_entry.bind("<Return>", lambda event: self.search_local_db())
+        ttk.Button(search_frame, text="Търси в базата", command=self.search_local_db).grid(
+            row=0, column=1, padx=5
+        )
+        ttk.Button(search_frame, text="Промени от миналия месец", command=self.show_price_changes).grid(
+            row=0, column=2, padx=5
+        )
+
     def _build_status_frame(self):
         frame = ttk.Frame(self.root, padding="10")
         frame.grid(row=6, column=0, sticky=tk.EW, padx=10)
@@ -230,19 +259,29 @@ class LidlGUI:
             self.log_text.insert(tk.END, message + "\n")
             self.log_text.see(tk.END)
 
-        if threading.current_thread() != threading.main_thread():
-            self.root.after(0, _log)
-        else:
-            _log()
+        self._on_ui_thread(_log)
 
     def update_status(self, message, color="black"):
         def _update():
             self.status_label.config(text=message, foreground=color)
 
+        self._on_ui_thread(_update)
+
+    def _on_ui_thread(self, func):
+        # root.after от работна нишка чака Tk нишката – ако тя е заета (напр. чака
+        # резултат от същата нишка), се стига до deadlock. Затова – през опашка.
         if threading.current_thread() != threading.main_thread():
-            self.root.after(0, _update)
+            self._ui_queue.put(func)
         else:
-            _update()
+            func()
+
+    def _drain_ui_queue(self):
+        try:
+            while True:
+                self._ui_queue.get_nowait()()
+        except queue.Empty:
+            pass
+        self.root.after(UI_QUEUE_POLL_MS, self._drain_ui_queue)
 
     def _poll_progress(self):
         """Периодично обновява брояча на бележки, таймера и прогреса по страници."""
@@ -291,6 +330,9 @@ class LidlGUI:
         self.page_progress["value"] = 0
         self.update_status("Изчакване за влизане...", "orange")
 
+        # Playwright се зарежда при първото изтегляне, а не при отваряне на прозореца
+        from lidl_scraper import LidlReceiptDownloader
+
         self.downloader = LidlReceiptDownloader(
             self.output_dir, start_date=start_date, end_date=end_date, log=self.log_message
         )
@@ -298,6 +340,8 @@ class LidlGUI:
         self.download_thread.start()
 
     def run_download(self):
+        import asyncio
+
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
@@ -365,15 +409,70 @@ class LidlGUI:
     # ── Анализ ────────────────────────────────────────────────────────────────
     def generate_local_db_report(self):
         try:
-            analyzer = ReceiptAnalyzer(log=self.log_message, db_path=self.db_path)
             report_path = f"{Path(self.output_dir).resolve() / 'local_price_history.html'}"
-            analyzer.generate_local_db_report(str(report_path))
+            with self._analyzer() as analyzer:
+                # Целият каталог: скритите серии се зареждат от <отчет>_data при показване
+                analyzer.generate_local_db_report(str(report_path), data_format="js")
             self.log_message(f"Локална база данни → HTML: {report_path}")
             messagebox.showinfo("Успех", f"Локалният отчет е създаден:\n\n{report_path}")
         except Exception as e:
             self.log_message(f"Грешка при създаване на локален отчет: {e}")
             messagebox.showerror("Грешка", f"Неуспешно създаване на локален отчет:\n\n{e}")
 
+    def export_local_db(self):
+        # pyarrow се проверява (и зарежда) чак при износа, не при отваряне на прозореца
+        from price_export import pyarrow_available
+
+        export_dir = Path(self.output_dir).resolve() / "lidl_export"
+        fmt = "parquet" if pyarrow_available() else "csv"
+        try:
+            with self._analyzer() as analyzer:
+                paths = analyzer.export_database(str(export_dir), fmt)
+        except Exception as e:
+            self.log_message(f"Грешка при износ на локалната база: {e}")
+            messagebox.showerror("Грешка", f"Неуспешен износ на локалната база:\n\n{e}")
+            return
+        if fmt == "csv":
+            messagebox.showwarning(
+                "Внимание",
+                f"pyarrow не е инсталиран, затова базата е изнесена в CSV вместо Parquet.\n\n"
+                f"Изнесени {len(paths)} CSV файла в:\n\n{export_dir}",
+            )
+        else:
+            messagebox.showinfo("Успех", f"Изнесени {len(paths)} Parquet файла в:\n\n{export_dir}")
+
+    def search_local_db(self):
+        query = self.search_var.get().strip()
+        if not query:
+            return
+        try:
+            with self._analyzer() as analyzer:
+                results = analyzer.search_products(query)
+        except Exception as e:
+            self.log_message(f"Грешка при търсене: {e}")
+            return
+        self.log_message(f"Търсене „{query}“: {len(results)} продукта")
+        for row in results:
+            price = f"{row['last_price']:.2f} {row['unit']}" if row["last_price"] is not None else "—"
+            self.log_message(
+                f"  {row['product_name']}: {price} ({row['last_date']}, {row['observations']} наблюдения)"
+            )
+
+    def show_price_changes(self):
+        try:
+            with self._analyzer() as analyzer:
+                changes = analyzer.get_price_changes()
+        except Exception as e:
+            self.log_message(f"Грешка при четене на промените в цените: {e}")
+            return
+        self.log_message(f"Промени в цените от началото на миналия месец: {len(changes)}")
+        for change in changes:
+            pct = f" ({change['change_pct']:+.1f}%)" if change["change_pct"] is not None else ""
+            self.log_message(
+                f"  {change['date']} {change['product_name']}: "
+                f"{change['old_price']:.2f} → {change['new_price']:.2f} {change['unit']}{pct}"
+            )
+
     def analyze_receipts(self):
         if not self.analysis_files:
             self.choose_analysis_files()
@@ -388,99 +487,81 @@ class LidlGUI:
             return
 
         self.analysis_files = existing
-        analyzer = ReceiptAnalyzer(log=self.log_message, db_path=self.db_path)
-
         self.log_message(f"Стартиране на анализ на {len(self.analysis_files)} файла:")
         for file_path in self.analysis_files:
             self.log_message(f"  - {os.path.basename(file_path)}")
         self.update_status("Анализ...", "blue")
+        self.analyze_button.config(state=tk.DISABLED)
+
+        # Анализът чака работни нишки и процеси – извън Tk нишката, както изтеглянето
+        threading.Thread(target=self.run_analysis, args=(list(self.analysis_files),), daemon=True).start()
 
+    def run_analysis(self, analysis_files):
+        analyzer = None
         try:
-            products_data = analyzer.parse_files(self.analysis_files)
+            analyzer = self._analyzer()
+            products_data = analyzer.parse_files(analysis_files)
             if not products_data:
-                messagebox.showwarning("Внимание", "Не са намерени артикули за анализ!")
+                self._on_ui_thread(lambda: messagebox.showwarning("Внимание", "Не са намерени артикули за анализ!"))
                 self.update_status("Няма данни", "orange")
                 return
 
-            filtered = {
-                product: dates_prices
-                for product, dates_prices in products_data.items()
-                if len(dates_prices) > 1
-            }
+            # Матрицата продукт × дата се строи веднъж и се споделя от всички отчети
+            matrix = analyzer.build_price_matrix(products_data)
+            filtered = matrix.select(matrix.counts > 1)
             if not filtered:
-                messagebox.showwarning("Внимание", "Не са намерени артикули, които се срещат повече от веднъж!")
+                self._on_ui_thread(lambda: messagebox.showwarning(
+                    "Внимание", "Не са намерени артикули, които се срещат повече от веднъж!"
+                ))
                 self.update_status("Няма данни", "orange")
                 return
 
             self.log_message(f"Намерени {len(filtered)} артикула с повече от 1 покупка "
                              f"(общо {len(products_data)} уникални)")
 
-            base_file = self.analysis_files[0]
-            output_file = analyzer.generate_xlsx(filtered, base_file)
-            chart_file = analyzer.generate_chart(output_file)
-            
+            base_file = analysis_files[0]
             base_output_dir = Path(self.output_dir).resolve()
+            # Отчетите без общи входове се генерират едновременно (XLSX и PNG в отделни процеси)
+            reports = analyzer.generate_reports(matrix, base_file, str(base_output_dir))
+            output_file, chart_file = reports["xlsx"], reports["chart"]
+            seasonal_file, years_file, index_file = reports["seasonal"], reports["years"], reports["index"]
+
             self.log_message("")
             self.log_message("📁 ФАЙЛОВЕ:")
             if output_file:
                 self.log_message(f"  XLSX: {base_output_dir / Path(output_file).name}")
             if chart_file:
                 self.log_message(f"  Графика: {base_output_dir / Path(chart_file).name}")
-
-            fv_data = {
-                name: dates_prices
-                for name, dates_prices in products_data.items()
-                if analyzer.is_fruit_or_vegetable(name)
-            }
-            seasonal_file = None
-            if fv_data:
-                self.log_message(f"Генериране на сезонен анализ за {len(fv_data)} плода/зеленчука...")
-                seasonal_file = str(base_output_dir / f"{Path(base_file).stem}_seasonal_analysis.html")
-                analyzer.generate_seasonal_html(fv_data, seasonal_file)
+            if seasonal_file:
                 self.log_message(f"  Сезонен анализ: {seasonal_file}")
-            else:
-                self.log_message("Не са намерени плодове/зеленчуци за сезонен анализ")
-
-            years_rows = analyzer.compare_years(products_data)
-            years_file = None
-            if years_rows:
-                self.log_message(f"Генериране на сравнение 2025/2026 за {len(years_rows)} съпоставими артикула...")
-                years_file = str(base_output_dir / f"{Path(base_file).stem}_years_comparison.html")
-                analyzer.generate_years_html(years_rows, years_file)
+            if years_file:
                 self.log_message(f"  📊 Годишен отчет (2025/2026): {years_file}")
-            else:
-                self.log_message("Няма артикули с данни и за 2025, и за 2026")
-
-            # Генериране на лендинг страница
-            self.log_message("Генериране на лендинг страница...")
-            index_file = str(base_output_dir / f"{Path(base_file).stem}_index.html")
-            files_info = {
-                "xlsx": output_file,
-                "chart": chart_file,
-                "seasonal": seasonal_file,
-                "years": years_file,
-            }
-            analyzer.generate_index_html(index_file, files_info)
-            self.log_message(f"  🏠 Начална страница: {index_file}")
+            if index_file:
+                self.log_message(f"  🏠 Начална страница: {index_file}")
 
             self.update_status("Анализ завършен", "green")
-            messagebox.showinfo(
+            self._on_ui_thread(lambda: messagebox.showinfo(
                 "Успех",
                 f"Анализът завърши успешно!\n\n"
                 f"Артикули с повече от 1 покупка: {len(filtered)}\n"
                 f"Общо уникални артикули: {len(products_data)}\n"
-                f"Плодове/зеленчуци за сезонен анализ: {len(fv_data)}\n"
-                f"Съпоставими артикули 2025/2026: {len(years_rows)}\n\n"
-                f"XLSX: {os.path.basename(output_file)}\n"
+                f"Плодове/зеленчуци за сезонен анализ: {reports['fruit_veg']}\n"
+                f"Съпоставими артикули 2025/2026: {reports['years_rows']}\n\n"
+                f"XLSX: {os.path.basename(output_file) if output_file else 'N/A'}\n"
                 f"Графика: {os.path.basename(chart_file) if chart_file else 'N/A'}\n"
                 f"Сезонен отчет: {os.path.basename(seasonal_file) if seasonal_file else 'N/A'}\n"
                 f"Сравнение 2025/2026: {os.path.basename(years_file) if years_file else 'N/A'}\n"
-                f"Лендинг страница: {os.path.basename(index_file)}",
-            )
+                f"Лендинг страница: {os.path.basename(index_file) if index_file else 'N/A'}",
+            ))
         except Exception as e:
             self.log_message(f"Грешка при анализ: {e}")
             self.update_status("Грешка при анализ", "red")
-            messagebox.showerror("Грешка", f"Грешка при анализ:\n\n{e}")
+            error_text = f"Грешка при анализ:\n\n{e}"
+            self._on_ui_thread(lambda: messagebox.showerror("Грешка", error_text))
+        finally:
+            if analyzer is not None:
+                analyzer.close()
+            self._on_ui_thread(lambda: self.analyze_button.config(state=tk.NORMAL))
 
 
 def main():
@@ -528,7 +528,7 @@ class LidlGUI:
 
             base_file = self.analysis_files[0]
             output_file = analyzer.generate_xlsx(filtered, base_file)
-            chart_file = analyzer.generate_chart(output_file)
+            chart_file = analyzer.generate_chart(filtered, base_file)
             
             base_output_dir = Path(self.output_dir).resolve()
             self.log_message("")
@@ -0,0 +1,264 @@
+"""Достъп до локалната SQLite база от няколко нишки.
+
+Файловата база работи в WAL режим: всички записи минават през една нишка
+(писател) с опашка от задачи, а всяка четяща нишка има собствена връзка само
+за четене. Така отчет може да чете, докато тече внос, без „database is
+locked“ и без да се чакат взаимно. Базата в паметта (":memory:") няма как да
+се споделя между връзки, затова там има една връзка: записите се
+сериализират с ключалка в нишката на извикващия, а четенията от други нишки
+минават през _LockedConnection под същата ключалка.
+"""
+
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, Iterable, NamedTuple
+
+import numpy as np
+
+BUSY_TIMEOUT_SECONDS = 5.0
+# Отрицателна стойност за cache_size е в KiB
+CACHE_SIZE_KIB = 16 * 1024
+MMAP_SIZE = 64 * 1024 * 1024
+# Максимален брой параметри в една SQL заявка с IN (...)
+SQL_BATCH_SIZE = 500
+# Датите се пазят като номер на ден от 1970-01-01 (в SQL: date(day * 86400, 'unixepoch'))
+UNIX_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Брой редове, които се четат наведнъж при колонно четене
+COLUMN_CHUNK_ROWS = 65536
+
+_STOP = object()
+
+
+def configure_connection(conn: sqlite3.Connection, read_only: bool = False) -> sqlite3.Connection:
+    """Задава pragma-ите, общи за писателя и читателите."""
+    conn.row_factory = sqlite3.Row
+    # NORMAL е безопасно в WAL режим: при срив се губи най-много последната транзакция
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def to_day(date_str: str) -> int:
+    """ISO дата (YYYY-MM-DD) -> номер на ден от 1970-01-01."""
+    return date.fromisoformat(date_str[:10]).toordinal() - UNIX_EPOCH_ORDINAL
+
+
+def from_day(day: int) -> str:
+    return date.fromordinal(day + UNIX_EPOCH_ORDINAL).isoformat()
+
+
+def dictionary_ids(conn: sqlite3.Connection, table: str, column: str, values: Iterable) -> Dict:
+    """Връща {value: id} от речникова таблица (units, sources, ...), като добавя липсващите стойности."""
+    values = [value for value in dict.fromkeys(values) if value is not None]
+    conn.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(value,) for value in values])
+    ids = {}
+    for start in range(0, len(values), SQL_BATCH_SIZE):
+        batch = values[start:start + SQL_BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT {column}, id FROM {table} WHERE {column} IN ({','.join('?' * len(batch))})",
+            batch,
+        ).fetchall()
+        ids.update((row[0], row[1]) for row in rows)
+    return ids
+
+
+class PriceColumns(NamedTuple):
+    """Всички цени като непрекъснати масиви, подредени по (product_id, day, unit_id)."""
+
+    product_ids: np.ndarray
+    days: np.ndarray
+    unit_ids: np.ndarray
+    prices: np.ndarray
+    product_names: Dict[int, str]
+    unit_names: Dict[int, str]
+
+
+def read_price_columns(conn: sqlite3.Connection, chunk_rows: int = COLUMN_CHUNK_ROWS) -> PriceColumns:
+    """Чете таблицата prices по реда на първичния ключ (без сортиране) на части в масиви."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute("SELECT product_id, day, unit_id, price FROM prices ORDER BY product_id, day, unit_id")
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        chunks.append(np.array(rows, dtype=np.float64))
+    data = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.float64)
+    return PriceColumns(
+        product_ids=data[:, 0].astype(np.int64),
+        days=data[:, 1].astype(np.int32),
+        unit_ids=data[:, 2].astype(np.int32),
+        prices=np.ascontiguousarray(data[:, 3]),
+        product_names=dict(cursor.execute("SELECT id, raw_name FROM products").fetchall()),
+        unit_names=dict(cursor.execute("SELECT id, name FROM units").fetchall()),
+    )
+
+
+class PriceDatabase:
+    """Една нишка-писател + по една връзка за четене на нишка.
+
+    write(fn, *args) изпълнява fn(conn, *args) в транзакция на писателя и
+    връща резултата (или вдига изключението му). Извикване на write от
+    самата fn се изпълнява директно в същата транзакция. reader() връща
+    връзката за четене на текущата нишка; в нишката на писателя (по време на
+    write) това е връзката на писателя, за да се виждат незаписаните промени.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        self.in_memory = self.db_path == ":memory:"
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+
+        if self.in_memory:
+            self._writer_conn = configure_connection(sqlite3.connect(":memory:", check_same_thread=False))
+            self._shared_reader = _LockedConnection(self._writer_conn, self._write_lock)
+            return
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._writer_conn = configure_connection(
+            sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False)
+        )
+        self._writer_conn.execute("PRAGMA journal_mode = WAL")
+        self._thread = threading.Thread(target=self._writer_loop, name="price-db-writer", daemon=True)
+        self._thread.start()
+
+    def reader(self) -> sqlite3.Connection:
+        if getattr(self._local, "writing", False):
+            return self._writer_conn
+        if self.in_memory:
+            return self._shared_reader
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = configure_connection(
+                sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=False),
+                read_only=True,
+            )
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def write(self, fn: Callable, *args):
+        if getattr(self._local, "writing", False):
+            return fn(self._writer_conn, *args)
+        if self._thread is None:
+            with self._write_lock:
+                return self._run(fn, args)
+        return self.submit(fn, *args).result()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Поставя записа в опашката на писателя, без да чака резултата."""
+        future: Future = Future()
+        if self._thread is None:
+            try:
+                future.set_result(self.write(fn, *args))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+        if not self._thread.is_alive():
+            raise RuntimeError("Базата данни е затворена")
+        self._queue.put((fn, args, future))
+        return future
+
+    def close(self) -> None:
+        """Изчаква чакащите записи и затваря всички връзки."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._writer_conn.close()
+
+    def _run(self, fn: Callable, args: tuple):
+        self._local.writing = True
+        try:
+            with self._writer_conn:
+                return fn(self._writer_conn, *args)
+        finally:
+            self._local.writing = False
+
+    def _writer_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            fn, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._run(fn, args))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+
+class _LockedConnection:
+    """Споделената връзка на базата в паметта: всяка операция за четене е под lock."""
+
+    def __init__(self, conn: sqlite3.Connection, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def cursor(self) -> "_LockedCursor":
+        with self._lock:
+            return _LockedCursor(self._conn.cursor(), self._lock)
+
+    def execute(self, sql: str, parameters=()) -> "_LockedCursor":
+        return self.cursor().execute(sql, parameters)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _LockedCursor:
+    """Курсор на _LockedConnection; execute, fetch* и итерацията вземат lock-а поотделно."""
+
+    def __init__(self, cursor: sqlite3.Cursor, lock):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_lock", lock)
+
+    def execute(self, sql: str, parameters=()) -> "_LockedCursor":
+        with self._lock:
+            self._cursor.execute(sql, parameters)
+        return self
+
+    def fetchone(self):
+        with self._lock:
+            return self._cursor.fetchone()
+
+    def fetchmany(self, size: int = 1) -> list:
+        with self._lock:
+            return self._cursor.fetchmany(size)
+
+    def fetchall(self) -> list:
+        with self._lock:
+            return self._cursor.fetchall()
+
+    def __iter__(self) -> "_LockedCursor":
+        return self
+
+    def __next__(self):
+        with self._lock:
+            return next(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value) -> None:
+        # напр. cursor.row_factory = None
+        setattr(self._cursor, name, value)
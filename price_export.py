@@ -0,0 +1,242 @@
+"""Износ на локалната база към колонни формати за външен анализ.
+
+Цените, каталогът и бележките се четат на пакети от по EXPORT_BATCH_ROWS
+реда и се записват поточно:
+
+* parquet – по една папка на таблица, разделена по година
+  (prices/year=2025/part-0.parquet, Hive стил);
+* arrow – Arrow IPC файл на таблица (prices.arrow);
+* csv – CSV файл на таблица; използва се и когато pyarrow не е инсталиран.
+
+Датите са date32 (дни от 1970-01-01) в Arrow/Parquet и ISO низове в CSV.
+"""
+
+import csv
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from price_db import from_day
+
+EXPORT_BATCH_ROWS = 50_000
+EXPORT_FORMATS = ("parquet", "arrow", "csv")
+# Име на дял за редове без стойност в колоната за разделяне (както в Hive/Spark)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+class ExportTable(NamedTuple):
+    name: str
+    sql: str
+    # (колона, вид): вид е "int", "float", "str" или "date" (номер на ден)
+    columns: Sequence[Tuple[str, str]]
+    # Колона с годината за разделяне на Parquet (не се записва във файловете)
+    partition: Optional[str] = None
+
+
+_YEAR_OF_DAY = "CAST(strftime('%Y', {day} * 86400, 'unixepoch') AS INTEGER)"
+_DAY_OF_DATE = "CAST(julianday({date}) - 2440587.5 AS INTEGER)"
+
+EXPORT_TABLES = (
+    ExportTable(
+        "prices",
+        f"""
+        SELECT pr.product_id, p.raw_name, p.canonical_name, p.category, pr.day, pr.price, u.name,
+               pr.sample_count, s.name, f.path, {_YEAR_OF_DAY.format(day='pr.day')}
+        FROM prices pr
+        JOIN products p ON p.id = pr.product_id
+        JOIN units u ON u.id = pr.unit_id
+        LEFT JOIN sources s ON s.id = pr.source_id
+        LEFT JOIN receipt_files f ON f.id = pr.file_id
+        ORDER BY pr.product_id, pr.day, pr.unit_id
+        """,
+        (
+            ("product_id", "int"), ("product_name", "str"), ("canonical_name", "str"), ("category", "str"),
+            ("date", "date"), ("price", "float"), ("unit", "str"), ("sample_count", "int"),
+            ("source", "str"), ("receipt_file", "str"), ("year", "int"),
+        ),
+        partition="year",
+    ),
+    ExportTable(
+        "products",
+        "SELECT id, raw_name, canonical_name, weight_kg, unit_basis, category, cluster_id FROM products ORDER BY id",
+        (
+            ("product_id", "int"), ("raw_name", "str"), ("canonical_name", "str"), ("weight_kg", "float"),
+            ("unit_basis", "str"), ("category", "str"), ("cluster_id", "int"),
+        ),
+    ),
+    ExportTable(
+        "receipts",
+        f"""
+        SELECT id, receipt_hash, receipt_file, {_DAY_OF_DATE.format(date='date')}, timestamp, store, total,
+               currency, item_count, CAST(substr(date, 1, 4) AS INTEGER)
+        FROM receipts
+        ORDER BY id
+        """,
+        (
+            ("receipt_id", "int"), ("receipt_hash", "str"), ("receipt_file", "str"), ("date", "date"),
+            ("timestamp", "str"), ("store", "str"), ("total", "float"), ("currency", "str"),
+            ("item_count", "int"), ("year", "int"),
+        ),
+        partition="year",
+    ),
+    ExportTable(
+        "line_items",
+        f"""
+        SELECT li.receipt_id, li.line_no, {_DAY_OF_DATE.format(date='r.date')}, li.product_name, li.unit,
+               li.quantity, li.unit_price, li.amount, li.discount, li.price, CAST(substr(r.date, 1, 4) AS INTEGER)
+        FROM line_items li
+        JOIN receipts r ON r.id = li.receipt_id
+        ORDER BY li.receipt_id, li.line_no
+        """,
+        (
+            ("receipt_id", "int"), ("line_no", "int"), ("date", "date"), ("product_name", "str"),
+            ("unit", "str"), ("quantity", "float"), ("unit_price", "float"), ("amount", "float"),
+            ("discount", "float"), ("price", "float"), ("year", "int"),
+        ),
+        partition="year",
+    ),
+)
+
+
+def _load_pyarrow():
+    """Връща (pyarrow, compute, ipc, parquet) или None, ако pyarrow не е инсталиран."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow, pyarrow.compute, pyarrow.ipc, pyarrow.parquet
+
+
+def pyarrow_available() -> bool:
+    return _load_pyarrow() is not None
+
+
+def _existing_tables(conn) -> set:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+
+
+def _iter_batches(conn, table: ExportTable, batch_rows: int):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(table.sql)
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            return
+        yield rows
+
+
+def _arrow_schema(pa, columns: Sequence[Tuple[str, str]]):
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "date": pa.date32()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _record_batch(pa, schema, rows: list):
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def _export_parquet(conn, table: ExportTable, output_dir: Path, batch_rows: int, arrow) -> List[str]:
+    pa, pc, _, pq = arrow
+    schema = _arrow_schema(pa, table.columns)
+    table_dir = output_dir / table.name
+    writers: Dict[str, object] = {}
+    paths = []
+    try:
+        for rows in _iter_batches(conn, table, batch_rows):
+            batch = _record_batch(pa, schema, rows)
+            if table.partition is None:
+                parts = {"": batch}
+            else:
+                index = schema.get_field_index(table.partition)
+                keys = batch.column(index)
+                data = batch.remove_column(index)
+                parts = {
+                    f"{table.partition}={NULL_PARTITION if key is None else key}": data.filter(
+                        pc.is_null(keys) if key is None else pc.equal(keys, key)
+                    )
+                    for key in keys.unique().to_pylist()
+                }
+            for part_name, part in parts.items():
+                writer = writers.get(part_name)
+                if writer is None:
+                    part_dir = table_dir / part_name if part_name else table_dir
+                    part_dir.mkdir(parents=True, exist_ok=True)
+                    path = part_dir / "part-0.parquet"
+                    writer = writers[part_name] = pq.ParquetWriter(str(path), part.schema)
+                    paths.append(str(path))
+                writer.write_batch(part)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return paths
+
+
+def _export_arrow(conn, table: ExportTable, output_dir: Path, batch_rows: int, arrow) -> List[str]:
+    pa, _, ipc, _ = arrow
+    schema = _arrow_schema(pa, table.columns)
+    path = output_dir / f"{table.name}.arrow"
+    with pa.OSFile(str(path), "wb") as sink, ipc.new_file(sink, schema) as writer:
+        for rows in _iter_batches(conn, table, batch_rows):
+            writer.write_batch(_record_batch(pa, schema, rows))
+    return [str(path)]
+
+
+def _export_csv(conn, table: ExportTable, output_dir: Path, batch_rows: int) -> List[str]:
+    path = output_dir / f"{table.name}.csv"
+    date_columns = [index for index, (_, kind) in enumerate(table.columns) if kind == "date"]
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow([name for name, _ in table.columns])
+        for rows in _iter_batches(conn, table, batch_rows):
+            if date_columns:
+                rows = [list(row) for row in rows]
+                for row in rows:
+                    for index in date_columns:
+                        if row[index] is not None:
+                            row[index] = from_day(row[index])
+            writer.writerows(rows)
+    return [str(path)]
+
+
+def export_database(
+    conn,
+    output_dir,
+    fmt: str = "parquet",
+    tables: Optional[Sequence[str]] = None,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> Tuple[str, List[str]]:
+    """Изнася таблиците в output_dir и връща (използван формат, записани файлове).
+
+    Ако fmt е "parquet" или "arrow", но pyarrow не е инсталиран, се използва CSV.
+    Таблици, които ги няма в базата, се пропускат.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неподдържан формат: {fmt} (възможни: {', '.join(EXPORT_FORMATS)})")
+    arrow = _load_pyarrow() if fmt != "csv" else None
+    if arrow is None:
+        fmt = "csv"
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    existing = _existing_tables(conn)
+    required = {"prices": ("prices", "products", "units"), "line_items": ("line_items", "receipts")}
+
+    paths = []
+    for table in EXPORT_TABLES:
+        if tables is not None and table.name not in tables:
+            continue
+        if not all(name in existing for name in required.get(table.name, (table.name,))):
+            continue
+        if fmt == "parquet":
+            paths.extend(_export_parquet(conn, table, output_dir, batch_rows, arrow))
+        elif fmt == "arrow":
+            paths.extend(_export_arrow(conn, table, output_dir, batch_rows, arrow))
+        else:
+            paths.extend(_export_csv(conn, table, output_dir, batch_rows))
+    return fmt, paths
@@ -0,0 +1,217 @@
+"""Разредена матрица продукт × дата – общото ядро на отчетите.
+
+Данните {product: {date: price}} се превръщат веднъж в CSR масиви: редовете
+са продуктите (подредени по име), колоните – уникалните дати (номер на ден от
+1970-01-01, възходящо), а във всеки ред ненулевите клетки са подредени по
+дата. Средни цени по години и сезони, първа/последна цена, мин./макс. и
+най-големите промени се смятат с векторни операции върху масивите, без цикли
+по продукти и дати в Python.
+"""
+
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from price_db import UNIX_EPOCH_ORDINAL, from_day, to_day
+
+
+class PriceChanges(NamedTuple):
+    """Промяна от първата до последната цена по ред (само редове с поне 2 цени и първа цена > 0)."""
+
+    rows: np.ndarray
+    change_pct: np.ndarray
+    min_price: np.ndarray
+    max_price: np.ndarray
+    min_day: np.ndarray
+    max_day: np.ndarray
+
+
+class PriceMatrix:
+    """CSR матрица продукт × дата с индекс на продуктите.
+
+    names[i] и units[i] описват ред i, index е {име: ред}; days са датите на
+    колоните; indptr, cols и values са CSR масивите (ред i е
+    values[indptr[i]:indptr[i + 1]] в колони cols[...]).
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        units: List[Optional[str]],
+        days: np.ndarray,
+        indptr: np.ndarray,
+        cols: np.ndarray,
+        values: np.ndarray,
+    ):
+        self.names = names
+        self.units = units
+        self.index: Dict[str, int] = {name: row for row, name in enumerate(names)}
+        self.days = days
+        self.indptr = indptr
+        self.cols = cols
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, products_data: dict, units: Optional[dict] = None) -> "PriceMatrix":
+        """Строи матрицата от {product: {date: price}}; невалидните дати се пропускат."""
+        units = units or {}
+        names = sorted(products_data)
+        day_of: Dict[str, Optional[int]] = {}
+        row_ids, days, values = [], [], []
+        for row, name in enumerate(names):
+            for date_str, price in products_data[name].items():
+                day = day_of.get(date_str, -1)
+                if day == -1:
+                    try:
+                        day = day_of[date_str] = to_day(date_str)
+                    except (TypeError, ValueError):
+                        day = day_of[date_str] = None
+                if day is None:
+                    continue
+                row_ids.append(row)
+                days.append(day)
+                values.append(price)
+        return cls.from_coo(
+            names,
+            [units.get(name) for name in names],
+            np.array(row_ids, dtype=np.int64),
+            np.array(days, dtype=np.int64),
+            np.array(values, dtype=np.float64),
+        )
+
+    @classmethod
+    def from_coo(
+        cls, names: List[str], units: List[Optional[str]], row_ids: np.ndarray, days: np.ndarray, values: np.ndarray,
+    ) -> "PriceMatrix":
+        """Строи матрицата от COO тройки (ред, ден, цена); двойки (ред, ден) трябва да са уникални."""
+        column_days, cols = np.unique(days, return_inverse=True)
+        order = np.lexsort((cols, row_ids))
+        counts = np.bincount(row_ids, minlength=len(names))
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(
+            names, units, column_days.astype(np.int64), indptr,
+            cols[order].astype(np.int64), np.ascontiguousarray(values[order], dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.values)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Брой цени по ред."""
+        return np.diff(self.indptr)
+
+    @property
+    def row_ids(self) -> np.ndarray:
+        """Редът на всяка клетка (COO форма на CSR)."""
+        return np.repeat(np.arange(len(self.names)), self.counts)
+
+    def date_strings(self) -> List[str]:
+        return [from_day(int(day)) for day in self.days]
+
+    def column_years(self) -> np.ndarray:
+        return self.days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+    def column_months(self) -> np.ndarray:
+        return self.days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+
+    def row(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(дни, цени) на един ред, подредени по дата."""
+        start, end = self.indptr[index], self.indptr[index + 1]
+        return self.days[self.cols[start:end]], self.values[start:end]
+
+    def row_items(self, index: int) -> List[Tuple[str, float]]:
+        """[(ISO дата, цена)] на един ред, подредени по дата."""
+        days, prices = self.row(index)
+        return [(from_day(int(day)), float(price)) for day, price in zip(days, prices)]
+
+    def select(self, rows: Iterable) -> "PriceMatrix":
+        """Подматрица с дадените редове (булева маска или индекси); колоните се запазват."""
+        rows = np.asarray(rows)
+        rows = np.flatnonzero(rows) if rows.dtype == bool else rows.astype(np.int64)
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # Индексите на клетките на избраните редове, без цикъл по редове
+        take = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return PriceMatrix(
+            [self.names[row] for row in rows], [self.units[row] for row in rows],
+            self.days, indptr, self.cols[take], self.values[take],
+        )
+
+    def totals_by(self, column_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Брой и сума на цените по ред и ключ на колоната (напр. година).
+
+        Връща (ключове, counts[ред, ключ], sums[ред, ключ]).
+        """
+        keys, key_of_column = np.unique(column_keys, return_inverse=True)
+        return (keys,) + self._totals(key_of_column, len(keys))
+
+    def yearly_totals(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.totals_by(self.column_years())
+
+    def seasonal_totals(self, months: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(counts, sums) с колона 0 извън сезона и колона 1 през месеците months."""
+        in_season = np.isin(self.column_months(), list(months)).astype(np.int64)
+        return self._totals(in_season, 2)
+
+    def _totals(self, key_of_column: np.ndarray, n_keys: int) -> Tuple[np.ndarray, np.ndarray]:
+        flat = self.row_ids * n_keys + key_of_column[self.cols]
+        size = len(self.names) * n_keys
+        counts = np.bincount(flat, minlength=size).reshape(len(self.names), n_keys)
+        sums = np.bincount(flat, weights=self.values, minlength=size).reshape(len(self.names), n_keys)
+        return counts, sums
+
+    def changes(self) -> PriceChanges:
+        """Промяна първа → последна цена, мин./макс. и датите им за редовете с поне 2 цени."""
+        counts = self.counts
+        rows = np.flatnonzero(counts >= 2)
+        first = self.values[self.indptr[rows]]
+        rows, first = rows[first > 0], first[first > 0]
+        last = self.values[self.indptr[rows + 1] - 1]
+
+        row_ids = self.row_ids
+        # Стабилното подреждане оставя най-ранната дата при равни цени
+        by_min = np.lexsort((self.values, row_ids))
+        by_max = np.lexsort((-self.values, row_ids))
+        starts = self.indptr[rows]
+        min_cell, max_cell = by_min[starts], by_max[starts]
+        return PriceChanges(
+            rows=rows,
+            change_pct=(last - first) / first * 100,
+            min_price=self.values[min_cell],
+            max_price=self.values[max_cell],
+            min_day=self.days[self.cols[min_cell]],
+            max_day=self.days[self.cols[max_cell]],
+        )
+
+    def top_movers(self, limit: int = 10) -> Tuple[list, list]:
+        """(най-големите промени по абсолютна стойност, най-големите поевтинявания) като речници."""
+        changes = self.changes()
+        by_size = np.argsort(-np.abs(changes.change_pct), kind="stable")[:limit]
+        falling = np.flatnonzero(changes.change_pct < 0)
+        by_drop = falling[np.argsort(changes.change_pct[falling], kind="stable")][:limit]
+        return [self._change_row(changes, i) for i in by_size], [self._change_row(changes, i) for i in by_drop]
+
+    def _change_row(self, changes: PriceChanges, i: int) -> dict:
+        row = changes.rows[i]
+        return {
+            "name": self.names[row],
+            "unit": self.units[row],
+            "change_percent": float(changes.change_pct[i]),
+            "min_price": float(changes.min_price[i]),
+            "max_price": float(changes.max_price[i]),
+            "min_price_date": _format_day(changes.min_day[i]),
+            "max_price_date": _format_day(changes.max_day[i]),
+        }
+
+
+def _format_day(day) -> str:
+    return date.fromordinal(int(day) + UNIX_EPOCH_ORDINAL).strftime("%d.%m.%Y")
@@ -0,0 +1,306 @@
+"""Сливане на локални бази от няколко компютъра/домакинства в една.
+
+Изходните бази се закачат с ATTACH (до MERGE_ATTACH_BATCH наведнъж) към
+писателя на целевата база и се сливат с няколко SQL заявки върху множества –
+без цикъл по редовете в Python:
+
+* продуктите липсващи в целевия каталог се добавят през ProductCatalog, за
+  да се нормализират и класифицират както при внос;
+* цените за същия продукт/дата/единица се обединяват в средно, претеглено
+  със sample_count;
+* бележките и артикулите се добавят по receipt_hash (вече наличните се
+  пропускат).
+
+От всяка изходна база се взимат само собствените ѝ наблюдения (prices без
+приноса на бази, слети в нея), така че сливане „през посредник“ не удвоява
+данни. Всяка база се разпознава по database_id; ако отпечатъкът на данните ѝ
+е същият като при предишното сливане, тя се пропуска, а ако е нов, старият ѝ
+принос (merge_contributions) се заменя с новия.
+
+Изходните бази не се променят: база от по-стара версия се копира
+(copy_database), мигрира се копието и се слива то.
+
+    python price_merge.py lidl_local_prices.db other1.db other2.db
+"""
+
+import argparse
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from db_migrations import SCHEMA_VERSION
+from price_segments import refresh_price_segments
+
+# SQLite позволява най-много 10 закачени бази по подразбиране
+MERGE_ATTACH_BATCH = 8
+
+
+class MergeResult(NamedTuple):
+    path: str
+    database_id: Optional[str]
+    # "merged", "unchanged", "self" или "outdated"
+    status: str
+    rows: int = 0
+    receipts: int = 0
+
+
+def _fingerprint(conn: sqlite3.Connection, alias: str) -> str:
+    """Отпечатък на данните на закачена база (обобщения, изчислени от SQLite)."""
+    parts = [
+        conn.execute(
+            f"SELECT COUNT(*), TOTAL(sample_count), TOTAL(price * sample_count), TOTAL(day * sample_count) "
+            f"FROM {alias}.prices"
+        ).fetchone(),
+        conn.execute(
+            f"SELECT COUNT(*), TOTAL(sample_count), TOTAL(price * sample_count) FROM {alias}.merge_contributions"
+        ).fetchone(),
+        conn.execute(f"SELECT COUNT(*), MAX(id) FROM {alias}.receipts").fetchone(),
+    ]
+    return hashlib.sha1(repr([tuple(row) for row in parts]).encode("utf-8")).hexdigest()
+
+
+def _database_id(conn: sqlite3.Connection, alias: str) -> Optional[str]:
+    row = conn.execute(f"SELECT value FROM {alias}.catalog_meta WHERE key = 'database_id'").fetchone()
+    return row[0] if row else None
+
+
+def _merge_prices(conn: sqlite3.Connection, alias: str, source_id: int) -> int:
+    """Заменя приноса на базата alias в prices с текущите ѝ собствени наблюдения."""
+    conn.execute(f"INSERT OR IGNORE INTO main.units (name) SELECT name FROM {alias}.units")
+    conn.execute(f"INSERT OR IGNORE INTO main.sources (name) SELECT name FROM {alias}.sources")
+    conn.execute(f"INSERT OR IGNORE INTO main.receipt_files (path) SELECT path FROM {alias}.receipt_files")
+
+    # Собствените наблюдения на изходната база с id-тата на целевата
+    conn.execute("DROP TABLE IF EXISTS temp.merge_incoming")
+    conn.execute(
+        f"""
+        CREATE TEMP TABLE merge_incoming AS
+        SELECT p.id AS product_id, sp.day AS day, u.id AS unit_id,
+               (sp.price * sp.sample_count - COALESCE(c.total, 0)) / (sp.sample_count - COALESCE(c.n, 0)) AS price,
+               sp.sample_count - COALESCE(c.n, 0) AS sample_count,
+               s.id AS source_id, f.id AS file_id
+        FROM {alias}.prices sp
+        JOIN {alias}.products spp ON spp.id = sp.product_id
+        JOIN main.products p ON p.raw_name = spp.raw_name
+        JOIN {alias}.units su ON su.id = sp.unit_id
+        JOIN main.units u ON u.name = su.name
+        LEFT JOIN {alias}.sources ss ON ss.id = sp.source_id
+        LEFT JOIN main.sources s ON s.name = ss.name
+        LEFT JOIN {alias}.receipt_files sf ON sf.id = sp.file_id
+        LEFT JOIN main.receipt_files f ON f.path = sf.path
+        LEFT JOIN (
+            SELECT product_id, day, unit_id, SUM(price * sample_count) AS total, SUM(sample_count) AS n
+            FROM {alias}.merge_contributions
+            GROUP BY product_id, day, unit_id
+        ) c ON c.product_id = sp.product_id AND c.day = sp.day AND c.unit_id = sp.unit_id
+        WHERE sp.sample_count - COALESCE(c.n, 0) > 0
+        """
+    )
+    conn.execute("CREATE UNIQUE INDEX temp.idx_merge_incoming ON merge_incoming(product_id, day, unit_id)")
+
+    # Крайна сума и брой за всеки засегнат ключ: цел - стар принос + нов принос
+    conn.execute("DROP TABLE IF EXISTS temp.merge_result")
+    conn.execute(
+        """
+        CREATE TEMP TABLE merge_result AS
+        WITH keys AS (
+            SELECT product_id, day, unit_id FROM merge_incoming
+            UNION
+            SELECT product_id, day, unit_id FROM main.merge_contributions WHERE source_id = :source
+        )
+        SELECT k.product_id, k.day, k.unit_id,
+               COALESCE(t.sample_count, 0) - COALESCE(o.sample_count, 0) + COALESCE(i.sample_count, 0) AS n,
+               COALESCE(t.price * t.sample_count, 0) - COALESCE(o.price * o.sample_count, 0)
+                   + COALESCE(i.price * i.sample_count, 0) AS total,
+               i.source_id, i.file_id
+        FROM keys k
+        LEFT JOIN main.prices t ON t.product_id = k.product_id AND t.day = k.day AND t.unit_id = k.unit_id
+        LEFT JOIN main.merge_contributions o
+            ON o.source_id = :source AND o.product_id = k.product_id AND o.day = k.day AND o.unit_id = k.unit_id
+        LEFT JOIN merge_incoming i ON i.product_id = k.product_id AND i.day = k.day AND i.unit_id = k.unit_id
+        """,
+        {"source": source_id},
+    )
+    # ON CONFLICT DO UPDATE (а не REPLACE), за да се задействат тригерите на агрегатите
+    conn.execute(
+        """
+        INSERT INTO main.prices (product_id, day, unit_id, price, sample_count, source_id, file_id)
+        SELECT product_id, day, unit_id, total / n, n, source_id, file_id
+        FROM merge_result
+        WHERE n > 0
+        ON CONFLICT(product_id, day, unit_id) DO UPDATE SET
+            price = excluded.price,
+            sample_count = excluded.sample_count
+        """
+    )
+    conn.execute(
+        """
+        DELETE FROM main.prices
+        WHERE (product_id, day, unit_id) IN (SELECT product_id, day, unit_id FROM merge_result WHERE n <= 0)
+        """
+    )
+
+    conn.execute("DELETE FROM main.merge_contributions WHERE source_id = ?", (source_id,))
+    conn.execute(
+        """
+        INSERT INTO main.merge_contributions (source_id, product_id, day, unit_id, price, sample_count)
+        SELECT ?, product_id, day, unit_id, price, sample_count FROM merge_incoming
+        """,
+        (source_id,),
+    )
+    rows = conn.execute("SELECT COUNT(*) FROM merge_incoming").fetchone()[0]
+    conn.execute("DROP TABLE temp.merge_result")
+    conn.execute("DROP TABLE temp.merge_incoming")
+    return rows
+
+
+def _merge_receipts(conn: sqlite3.Connection, alias: str) -> int:
+    before = conn.total_changes
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO main.receipts
+            (receipt_hash, receipt_file, date, timestamp, store, total, currency, item_count)
+        SELECT receipt_hash, receipt_file, date, timestamp, store, total, currency, item_count
+        FROM {alias}.receipts
+        """
+    )
+    added = conn.total_changes - before
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO main.line_items
+            (receipt_id, line_no, product_name, unit, quantity, unit_price, amount, discount, price)
+        SELECT r.id, li.line_no, li.product_name, li.unit, li.quantity, li.unit_price, li.amount, li.discount,
+               li.price
+        FROM {alias}.line_items li
+        JOIN {alias}.receipts sr ON sr.id = li.receipt_id
+        JOIN main.receipts r ON r.receipt_hash = sr.receipt_hash
+        """
+    )
+    return added
+
+
+def _merge_attached(conn: sqlite3.Connection, alias: str, path: str, catalog) -> MergeResult:
+    if conn.execute(f"PRAGMA {alias}.user_version").fetchone()[0] != SCHEMA_VERSION:
+        return MergeResult(path, None, "outdated")
+    database_id = _database_id(conn, alias)
+    if database_id == _database_id(conn, "main"):
+        return MergeResult(path, database_id, "self")
+
+    fingerprint = _fingerprint(conn, alias)
+    known = conn.execute(
+        "SELECT id, fingerprint FROM main.merge_sources WHERE database_id = ?", (database_id,)
+    ).fetchone()
+    if known is not None and known[1] == fingerprint:
+        return MergeResult(path, database_id, "unchanged")
+    if known is None:
+        source_id = conn.execute(
+            "INSERT INTO main.merge_sources (database_id, path, fingerprint) VALUES (?, ?, ?)",
+            (database_id, path, fingerprint),
+        ).lastrowid
+    else:
+        source_id = known[0]
+
+    # Каталогът расте с имената (не с редовете цени), затова тук е допустим Python
+    catalog.get_many(
+        [
+            row[0] for row in conn.execute(
+                f"SELECT raw_name FROM {alias}.products WHERE raw_name NOT IN (SELECT raw_name FROM main.products)"
+            )
+        ],
+        conn=conn,
+    )
+    rows = _merge_prices(conn, alias, source_id)
+    receipts = _merge_receipts(conn, alias)
+    conn.execute(
+        "UPDATE main.merge_sources SET path = ?, fingerprint = ?, row_count = ?, merged_at = CURRENT_TIMESTAMP "
+        "WHERE id = ?",
+        (path, fingerprint, rows, source_id),
+    )
+    return MergeResult(path, database_id, "merged", rows, receipts)
+
+
+def copy_database(path: str, target: str) -> None:
+    """Копира базата path в target чрез backup API (заедно с WAL), само с четене от path."""
+    source = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        copy = sqlite3.connect(target)
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+    finally:
+        source.close()
+
+
+def legacy_database_id(path: str) -> str:
+    """database_id за база отпреди регистъра на сливанията, изведен от пътя ѝ.
+
+    Мигрира се само копие на такава база, затова случайният идентификатор от
+    миграцията не се запазва в нея; с постоянен id повторното сливане на същия
+    файл се разпознава и не удвоява данните.
+    """
+    return hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:32]
+
+
+def merge_batch(
+    conn: sqlite3.Connection, paths: Sequence[str], catalog, names: Optional[Sequence[str]] = None
+) -> List[MergeResult]:
+    """Слива до MERGE_ATTACH_BATCH бази в една транзакция на писателя (conn).
+
+    ATTACH/DETACH не може да се изпълнят в транзакция, затова функцията сама
+    отваря и потвърждава транзакцията между тях. names (по подразбиране
+    paths) са пътищата в резултатите и в merge_sources – напр. оригиналите
+    на мигрирани копия.
+    """
+    aliases = []
+    try:
+        for index, path in enumerate(paths):
+            alias = f"merge_src{index}"
+            conn.execute("ATTACH DATABASE ? AS " + alias, (str(path),))
+            aliases.append(alias)
+        conn.execute("BEGIN")
+        try:
+            results = [
+                _merge_attached(conn, alias, str(name), catalog) for alias, name in zip(aliases, names or paths)
+            ]
+            refresh_price_segments(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return results
+    finally:
+        for alias in aliases:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+
+def merge_databases(
+    db, catalog, paths: Sequence[str], names: Optional[Sequence[str]] = None
+) -> List[MergeResult]:
+    """Слива изходните бази (вече мигрирани до SCHEMA_VERSION) в db (PriceDatabase)."""
+    names = list(names or paths)
+    results = []
+    for start in range(0, len(paths), MERGE_ATTACH_BATCH):
+        end = start + MERGE_ATTACH_BATCH
+        results.extend(db.write(merge_batch, list(paths[start:end]), catalog, names[start:end]))
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None, log: Callable[[str], None] = print) -> List[MergeResult]:
+    parser = argparse.ArgumentParser(description="Сливане на локални бази с цени в една")
+    parser.add_argument("target", help="целева база (напр. lidl_local_prices.db)")
+    parser.add_argument("sources", nargs="+", help="бази, които да се слеят в целевата")
+    args = parser.parse_args(argv)
+
+    from receipt_analysis import ReceiptAnalyzer
+
+    missing = [path for path in args.sources if not Path(path).is_file()]
+    if missing:
+        parser.error(f"Липсващи бази: {', '.join(missing)}")
+    with ReceiptAnalyzer(log=log, db_path=args.target) as analyzer:
+        return analyzer.merge_databases(args.sources)
+
+
+if __name__ == "__main__":
+    main()
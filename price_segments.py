@@ -0,0 +1,118 @@
+"""Компактно представяне на ценовите истории като отрязъци с постоянна цена.
+
+Повечето цени не се променят седмици наред, а prices пази ред за всеки ден с
+покупка. price_segments пази по един ред за всеки период с една и съща цена
+(първи и последен ден, средна цена, брой дни с наблюдение), а price_changes –
+по едно събитие за всяка промяна (ден, стара и нова цена). Цените се смятат
+за еднакви, ако съвпадат до PRICE_DECIMALS знака.
+
+Тригери върху prices записват засегнатите (продукт, единица) в
+price_segments_stale; refresh_price_segments преизчислява отрязъците само за
+тях и се извиква в края на всеки запис на цени (внос, сливане, миграция).
+"""
+
+import sqlite3
+
+# Цени, които се различават само след втория знак (напр. изчислени €/кг), са една и съща цена
+PRICE_DECIMALS = 2
+
+
+def create_segment_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE price_segments (
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            unit_id INTEGER NOT NULL REFERENCES units(id),
+            start_day INTEGER NOT NULL,
+            end_day INTEGER NOT NULL,
+            price REAL NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (product_id, unit_id, start_day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE price_changes (
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            unit_id INTEGER NOT NULL REFERENCES units(id),
+            day INTEGER NOT NULL,
+            old_price REAL NOT NULL,
+            new_price REAL NOT NULL,
+            PRIMARY KEY (product_id, unit_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("CREATE INDEX idx_price_changes_day ON price_changes(day)")
+    conn.execute(
+        """
+        CREATE TABLE price_segments_stale (
+            product_id INTEGER NOT NULL,
+            unit_id INTEGER NOT NULL,
+            PRIMARY KEY (product_id, unit_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # ON CONFLICT DO NOTHING, а не INSERT OR IGNORE: в тригер OR IGNORE се заменя от
+    # поведението на външната заявка (UPSERT в prices)
+    for event, row in (("INSERT", "new"), ("UPDATE OF price", "new"), ("DELETE", "old")):
+        name = event.split()[0].lower()
+        conn.execute(
+            f"""
+            CREATE TRIGGER price_segments_stale_{name} AFTER {event} ON prices BEGIN
+                INSERT INTO price_segments_stale (product_id, unit_id)
+                VALUES ({row}.product_id, {row}.unit_id)
+                ON CONFLICT DO NOTHING;
+            END
+            """
+        )
+
+
+def refresh_price_segments(conn: sqlite3.Connection) -> int:
+    """Преизчислява отрязъците и промените на засегнатите продукти; връща броя им."""
+    stale = conn.execute("SELECT COUNT(*) FROM price_segments_stale").fetchone()[0]
+    if not stale:
+        return 0
+    for table in ("price_segments", "price_changes"):
+        conn.execute(
+            f"DELETE FROM {table} WHERE (product_id, unit_id) IN "
+            "(SELECT product_id, unit_id FROM price_segments_stale)"
+        )
+    # Нов отрязък започва там, където закръглената цена се различава от предишния ден;
+    # номерът на отрязъка е натрупаната сума на тези начала
+    conn.execute(
+        f"""
+        INSERT INTO price_segments (product_id, unit_id, start_day, end_day, price, n)
+        WITH flagged AS (
+            SELECT pr.product_id, pr.unit_id, pr.day, pr.price,
+                   CASE WHEN ROUND(pr.price, {PRICE_DECIMALS}) = ROUND(LAG(pr.price) OVER series, {PRICE_DECIMALS})
+                        THEN 0 ELSE 1 END AS is_start
+            FROM price_segments_stale s
+            CROSS JOIN prices pr ON pr.product_id = s.product_id AND pr.unit_id = s.unit_id
+            WINDOW series AS (PARTITION BY pr.product_id, pr.unit_id ORDER BY pr.day)
+        ),
+        numbered AS (
+            SELECT product_id, unit_id, day, price,
+                   SUM(is_start) OVER (PARTITION BY product_id, unit_id ORDER BY day) AS segment
+            FROM flagged
+        )
+        SELECT product_id, unit_id, MIN(day), MAX(day), AVG(price), COUNT(*)
+        FROM numbered
+        GROUP BY product_id, unit_id, segment
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO price_changes (product_id, unit_id, day, old_price, new_price)
+        SELECT product_id, unit_id, start_day, old_price, price
+        FROM (
+            SELECT seg.product_id, seg.unit_id, seg.start_day, seg.price,
+                   LAG(seg.price) OVER (PARTITION BY seg.product_id, seg.unit_id ORDER BY seg.start_day) AS old_price
+            FROM price_segments_stale s
+            CROSS JOIN price_segments seg ON seg.product_id = s.product_id AND seg.unit_id = s.unit_id
+        )
+        WHERE old_price IS NOT NULL
+        """
+    )
+    conn.execute("DELETE FROM price_segments_stale")
+    return stale
@@ -0,0 +1,159 @@
+"""Поточен (write-only) запис на ценовата история в XLSX.
+
+Работната книга е в режим write_only на openpyxl: редовете се записват във
+файла веднага щом се генерират, без да се пази модел на всяка клетка в
+паметта. Оформлението е в именувани стилове (XLSX_STYLES), регистрирани
+веднъж в книгата, а всяка клетка само сочи към стила си – вместо отделни
+Font/Alignment/Border/number_format на всяка клетка.
+
+Два изгледа:
+
+* wide – както досега: ред на продукт, колона на дата (празните клетки само
+  с рамка);
+* long – „подреден“ (tidy) лист с ред на наблюдение: Артикул, Единица,
+  Дата, Цена; удобен за филтри и обобщени таблици.
+"""
+
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+from price_db import UNIX_EPOCH_ORDINAL
+from price_matrix import PriceMatrix
+
+XLSX_LAYOUTS = ("wide", "long")
+PRICE_NUMBER_FORMAT = "[$€-407] #,##0.00"
+
+_HEADER_COLOR = "4472C4"
+# (име, хоризонтално подравняване, числов формат); заглавният ред е отделен
+_CELL_STYLES = (
+    ("price_name", None, "General"),
+    ("price_unit", "center", "General"),
+    ("price_value", "right", PRICE_NUMBER_FORMAT),
+    ("price_date", "center", "DD.MM.YYYY"),
+    ("price_empty", None, "General"),
+)
+XLSX_STYLES = ("price_header",) + tuple(name for name, _, _ in _CELL_STYLES)
+
+
+def _register_styles(wb) -> None:
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    thin = Side(style="thin")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    wb.add_named_style(
+        NamedStyle(
+            name="price_header",
+            font=Font(bold=True, size=12, color="FFFFFF"),
+            fill=PatternFill(start_color=_HEADER_COLOR, end_color=_HEADER_COLOR, fill_type="solid"),
+            alignment=Alignment(horizontal="center", vertical="center"),
+            border=border,
+        )
+    )
+    for name, horizontal, number_format in _CELL_STYLES:
+        wb.add_named_style(
+            NamedStyle(
+                name=name,
+                alignment=Alignment(horizontal=horizontal, vertical="center"),
+                border=border,
+                number_format=number_format,
+            )
+        )
+
+
+class _StyledCells:
+    """По една клетка-шаблон на стил.
+
+    Write-only листът записва всяка клетка, преди да поиска следващата от
+    генератора на реда, затова един обект на стил се преизползва за целия
+    лист (стилът се търси само веднъж).
+    """
+
+    def __init__(self, ws):
+        from openpyxl.cell import WriteOnlyCell
+
+        self._cells = {}
+        for name in XLSX_STYLES:
+            cell = WriteOnlyCell(ws)
+            cell.style = name
+            self._cells[name] = cell
+
+    def __call__(self, style: str, value=None):
+        cell = self._cells[style]
+        cell.value = value
+        return cell
+
+
+def _header(cells: _StyledCells, titles) -> Iterator:
+    for title in titles:
+        yield cells("price_header", title)
+
+
+def _wide_rows(matrix: PriceMatrix, cells: _StyledCells) -> Iterator[Iterator]:
+    n_columns = len(matrix.days)
+    dates = [date.fromordinal(int(day) + UNIX_EPOCH_ORDINAL).strftime("%d.%m.%Y") for day in matrix.days]
+    yield _header(cells, ["Артикул", "Единица"] + dates)
+
+    def product_row(row: int) -> Iterator:
+        yield cells("price_name", matrix.names[row])
+        yield cells("price_unit", matrix.units[row] or "€")
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        column = 0
+        for price_column, price in zip(matrix.cols[start:end].tolist(), matrix.values[start:end].tolist()):
+            for _ in range(column, price_column):
+                yield cells("price_empty")
+            yield cells("price_value", price)
+            column = price_column + 1
+        for _ in range(column, n_columns):
+            yield cells("price_empty")
+
+    for row in range(len(matrix)):
+        yield product_row(row)
+
+
+def _long_rows(matrix: PriceMatrix, cells: _StyledCells) -> Iterator[Iterator]:
+    dates = [date.fromordinal(int(day) + UNIX_EPOCH_ORDINAL) for day in matrix.days]
+    yield _header(cells, ["Артикул", "Единица", "Дата", "Цена"])
+
+    def observation(name: str, unit: str, column: int, price: float) -> Iterator:
+        yield cells("price_name", name)
+        yield cells("price_unit", unit)
+        yield cells("price_date", dates[column])
+        yield cells("price_value", price)
+
+    for row, name in enumerate(matrix.names):
+        unit = matrix.units[row] or "€"
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        for column, price in zip(matrix.cols[start:end].tolist(), matrix.values[start:end].tolist()):
+            yield observation(name, unit, column, price)
+
+
+def write_price_xlsx(matrix: PriceMatrix, output_file, layout: str = "wide") -> str:
+    """Записва матрицата поточно в output_file с изглед layout (виж XLSX_LAYOUTS)."""
+    if layout not in XLSX_LAYOUTS:
+        raise ValueError(f"Непознат изглед на XLSX: {layout}")
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    _register_styles(wb)
+    ws = wb.create_sheet("Price History" if layout == "wide" else "Prices")
+
+    # Ширините и замразяването трябва да се зададат преди първия ред
+    ws.column_dimensions["A"].width = 50
+    ws.column_dimensions["B"].width = 12
+    if layout == "wide":
+        for column in range(3, len(matrix.days) + 3):
+            ws.column_dimensions[get_column_letter(column)].width = 15
+        ws.freeze_panes = "C2"
+        rows = _wide_rows(matrix, _StyledCells(ws))
+    else:
+        ws.column_dimensions["C"].width = 14
+        ws.column_dimensions["D"].width = 15
+        ws.freeze_panes = "A2"
+        rows = _long_rows(matrix, _StyledCells(ws))
+
+    for row in rows:
+        ws.append(row)
+    wb.save(output_file)
+    return str(output_file)
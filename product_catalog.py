@@ -0,0 +1,314 @@
+"""Каталог на продуктите от касовите бележки.
+
+За всяко сурово име от бележките (напр. „КАШКАВАЛ ВИАНГА 250Г“) се изчисляват
+веднъж канонично име, тегло, базова единица и категория. Резултатът се пази в
+таблица products на локалната база, а пред нея стои LRU кеш в паметта, така че
+повтарящите се имена не минават отново през регулярните изрази и списъците с
+ключови думи.
+
+Имената се индексират и в пълнотекстов индекс products_fts (FTS5 с trigram
+токенизатор, който работи и с кирилица), поддържан в синхрон с тригери.
+"""
+
+import sqlite3
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from price_db import SQL_BATCH_SIZE
+
+CATALOG_CACHE_SIZE = 8192
+# Trigram индексът намира само поднизове с поне 3 символа
+FTS_MIN_TERM_LENGTH = 3
+
+
+class ProductInfo(NamedTuple):
+    product_id: Optional[int]
+    raw_name: str
+    canonical_name: str
+    weight_kg: Optional[float]
+    unit_basis: str
+    category: Optional[str]
+    cluster_id: Optional[int] = None
+
+
+class ProductCatalog:
+    """Таблица products + LRU кеш.
+
+    describe(raw_name) връща (canonical_name, weight_kg, unit_basis, category)
+    и се извиква само за имена, които ги няма нито в кеша, нито в базата.
+    db е PriceDatabase: четенията са през db.reader(), записите – през db.write.
+    Кешът се ползва от нишката на писателя и от нишките на отчетите, затова
+    операциите с него са под _cache_lock (без заявките към базата).
+    """
+
+    def __init__(self, db, describe: Callable[[str], tuple], cache_size: int = CATALOG_CACHE_SIZE):
+        self._db = db
+        self._describe = describe
+        self._cache: "OrderedDict[str, ProductInfo]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+    @staticmethod
+    def create_schema(conn) -> None:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY,
+                raw_name TEXT NOT NULL UNIQUE,
+                canonical_name TEXT NOT NULL,
+                weight_kg REAL,
+                unit_basis TEXT NOT NULL DEFAULT '€',
+                category TEXT,
+                cluster_id INTEGER,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+        if "cluster_id" not in columns:
+            conn.execute("ALTER TABLE products ADD COLUMN cluster_id INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_canonical ON products(canonical_name)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_cluster ON products(cluster_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)")
+        conn.execute("CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)")
+        ProductCatalog._create_search_index(conn)
+
+    @staticmethod
+    def _create_search_index(conn) -> None:
+        """FTS5 индекс върху products (external content) + тригери за синхронизация.
+
+        Ако SQLite е компилиран без FTS5, индексът се пропуска и search
+        използва LIKE.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        ).fetchone()
+        try:
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    raw_name, canonical_name,
+                    content = 'products', content_rowid = 'id', tokenize = 'trigram'
+                )
+                """
+            )
+        except sqlite3.OperationalError:
+            return
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, raw_name, canonical_name)
+                VALUES (new.id, new.raw_name, new.canonical_name);
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, raw_name, canonical_name)
+                VALUES ('delete', old.id, old.raw_name, old.canonical_name);
+            END
+            """
+        )
+        conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS products_fts_update
+            AFTER UPDATE OF raw_name, canonical_name ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, raw_name, canonical_name)
+                VALUES ('delete', old.id, old.raw_name, old.canonical_name);
+                INSERT INTO products_fts (rowid, raw_name, canonical_name)
+                VALUES (new.id, new.raw_name, new.canonical_name);
+            END
+            """
+        )
+        if not exists:
+            # Индексът е нов – попълва се от вече съществуващите продукти
+            conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+    def get(self, raw_name: str) -> ProductInfo:
+        return self.get_many([raw_name])[raw_name]
+
+    def get_many(self, raw_names: Iterable[str], conn=None) -> Dict[str, ProductInfo]:
+        """Връща {raw_name: ProductInfo}; липсващите имена се добавят в каталога.
+
+        Ако е подаден conn (връзката на писателя), новите редове се записват в
+        текущата му транзакция (например заедно с пакетния запис на цени).
+        """
+        result = {}
+        missing = []
+        with self._cache_lock:
+            for name in dict.fromkeys(raw_names):
+                info = self._cache.get(name)
+                if info is None:
+                    missing.append(name)
+                else:
+                    self._cache.move_to_end(name)
+                    result[name] = info
+
+        if missing:
+            found = self._load(conn or self._db.reader(), missing)
+            new_names = [name for name in missing if name not in found]
+            if new_names:
+                rows = [(name, *self._describe(name)) for name in new_names]
+                if conn is None:
+                    self._db.write(self._insert, rows)
+                    found.update(self._load(self._db.reader(), new_names))
+                else:
+                    self._insert(conn, rows)
+                    found.update(self._load(conn, new_names))
+            with self._cache_lock:
+                for name, info in found.items():
+                    self._remember(info)
+                    result[name] = info
+        return result
+
+    def search(self, query: str, limit: int = 20) -> List[tuple]:
+        """Търси продукти по част от името и връща [(product_id, rank)], най-добрите първи.
+
+        Всяка дума от заявката трябва да се среща в суровото или каноничното име.
+        rank е BM25 оценката от FTS5 (по-малка е по-добра); без FTS5 или при
+        думи, по-къси от 3 символа, се търси с LIKE и rank е 0.
+        """
+        terms = query.upper().split()
+        if not terms:
+            return []
+        if all(len(term) >= FTS_MIN_TERM_LENGTH for term in terms):
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            try:
+                return self._db.reader().execute(
+                    """
+                    SELECT rowid, bm25(products_fts, 2.0, 1.0) AS rank
+                    FROM products_fts
+                    WHERE products_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ?
+                    """,
+                    (match, limit),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                pass
+
+        conditions = " AND ".join(
+            "(raw_name LIKE ? ESCAPE '\\' OR canonical_name LIKE ? ESCAPE '\\')" for _ in terms
+        )
+        params = []
+        for term in terms:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend((pattern, pattern))
+        return self._db.reader().execute(
+            f"SELECT id, 0.0 FROM products WHERE {conditions} ORDER BY LENGTH(raw_name), raw_name LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+
+    def reclassify(self, classify: Callable[[str], Optional[str]], version: str) -> int:
+        """Преизчислява категориите на целия каталог, ако версията на таблиците се е сменила.
+
+        Всяко име минава веднъж през classify (един линеен проход по каталога);
+        записват се само променените категории. Връща броя обновени редове.
+        """
+        conn = self._db.reader()
+        row = conn.execute("SELECT value FROM catalog_meta WHERE key = 'classifier_version'").fetchone()
+        if row and row[0] == version:
+            return 0
+
+        changed = [
+            (category, product_id)
+            for product_id, raw_name, old_category in conn.execute(
+                "SELECT id, raw_name, category FROM products"
+            )
+            for category in (classify(raw_name),)
+            if category != old_category
+        ]
+
+        def store(writer) -> None:
+            writer.executemany("UPDATE products SET category = ? WHERE id = ?", changed)
+            writer.execute(
+                "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('classifier_version', ?)",
+                (version,),
+            )
+
+        self._db.write(store)
+        self.clear_cache()
+        return len(changed)
+
+    def update_clusters(self, threshold: Optional[float] = None) -> int:
+        """Групира каноничните имена по сходство и записва cluster_id за всеки продукт.
+
+        cluster_id е id на един от продуктите в групата. Връща броя групи с
+        повече от едно канонично име.
+        """
+        from product_clustering import SIMILARITY_THRESHOLD, cluster_names
+
+        rows = self._db.reader().execute("SELECT id, canonical_name, cluster_id FROM products").fetchall()
+        canonical_ids = {}
+        for product_id, canonical_name, _ in rows:
+            canonical_ids.setdefault(canonical_name, product_id)
+        clusters = cluster_names(
+            {product_id: name for name, product_id in canonical_ids.items()},
+            threshold=SIMILARITY_THRESHOLD if threshold is None else threshold,
+        )
+
+        changed = [
+            (cluster_id, product_id)
+            for product_id, canonical_name, old_cluster_id in rows
+            for cluster_id in (clusters[canonical_ids[canonical_name]],)
+            if cluster_id != old_cluster_id
+        ]
+        self._db.write(lambda conn: conn.executemany("UPDATE products SET cluster_id = ? WHERE id = ?", changed))
+        self.clear_cache()
+
+        sizes = defaultdict(int)
+        for cluster_id in clusters.values():
+            sizes[cluster_id] += 1
+        return sum(1 for size in sizes.values() if size > 1)
+
+    def cluster_labels(self) -> Dict[int, str]:
+        """Етикет за всяка група: най-честото канонично име (при равенство – най-краткото)."""
+        labels = {}
+        rows = self._db.reader().execute(
+            """
+            SELECT cluster_id, canonical_name, COUNT(*) AS variants
+            FROM products
+            WHERE cluster_id IS NOT NULL
+            GROUP BY cluster_id, canonical_name
+            ORDER BY cluster_id, variants DESC, LENGTH(canonical_name), canonical_name
+            """
+        )
+        for cluster_id, canonical_name, _ in rows:
+            labels.setdefault(cluster_id, canonical_name)
+        return labels
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _remember(self, info: ProductInfo) -> None:
+        # Извиква се под _cache_lock
+        self._cache[info.raw_name] = info
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _load(conn, raw_names: List[str]) -> Dict[str, ProductInfo]:
+        found = {}
+        for start in range(0, len(raw_names), SQL_BATCH_SIZE):
+            batch = raw_names[start:start + SQL_BATCH_SIZE]
+            rows = conn.execute(
+                "SELECT id, raw_name, canonical_name, weight_kg, unit_basis, category, cluster_id FROM products "
+                f"WHERE raw_name IN ({','.join('?' * len(batch))})",
+                batch,
+            ).fetchall()
+            for row in rows:
+                found[row[1]] = ProductInfo(*row)
+        return found
+
+    @staticmethod
+    def _insert(conn, rows: List[tuple]) -> None:
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO products (raw_name, canonical_name, weight_kg, unit_basis, category)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
@@ -0,0 +1,116 @@
+"""Групиране на варианти на едно и също име на продукт по сходство.
+
+Имената се разбиват на символни n-грами, за всяко се изчислява MinHash
+сигнатура, а LSH индекс (ленти от сигнатурата) дава само кандидат-двойки с
+вероятно високо сходство. Така не се сравняват всички двойки имена, а
+кандидатите се потвърждават с точен коефициент на Жакар и се обединяват
+с union-find.
+"""
+
+import zlib
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Mapping, Optional, Set, Tuple
+
+import numpy as np
+
+NGRAM_SIZE = 3
+LSH_BANDS = 16
+LSH_ROWS = 4
+SIMILARITY_THRESHOLD = 0.7
+# Кофи с повече имена от това се пропускат (твърде общи n-грами)
+MAX_BUCKET_SIZE = 200
+
+
+def shingles(name: str, size: int = NGRAM_SIZE) -> Set[str]:
+    """Символни n-грами на името (с интервали в краищата)."""
+    text = f" {' '.join(name.upper().split())} "
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+    """MinHash с bands * rows хеш функции от вида ((a*x + b) mod 2**64) >> 32."""
+
+    def __init__(self, bands: int = LSH_BANDS, rows: int = LSH_ROWS, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        count = bands * rows
+        # Нечетни множители за multiply-shift хеширане (mod 2**64)
+        self._a = rng.integers(0, np.iinfo(np.uint64).max, size=count, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self._b = rng.integers(0, np.iinfo(np.uint64).max, size=count, dtype=np.uint64, endpoint=True)
+
+    def signature(self, grams: Iterable[str]) -> np.ndarray:
+        base = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64)
+        # Умножението на uint64 масиви се пресмята по модул 2**64; горните 32 бита са хешът
+        hashed = (base[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return hashed.min(axis=0)
+
+    def band_keys(self, signature: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+
+def cluster_names(
+    names: Mapping[Hashable, str],
+    threshold: float = SIMILARITY_THRESHOLD,
+    hasher: Optional[MinHasher] = None,
+) -> Dict[Hashable, Hashable]:
+    """Групира имената по сходство и връща {key: cluster_key}.
+
+    cluster_key е най-малкият ключ в групата, така че резултатът не зависи
+    от реда на входа. Еднаквите имена винаги са в една група.
+    """
+    hasher = hasher or MinHasher()
+    keys = sorted(names)
+    parent = {key: key for key in keys}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(first, second):
+        root_first, root_second = find(first), find(second)
+        if root_first != root_second:
+            if root_second < root_first:
+                root_first, root_second = root_second, root_first
+            parent[root_second] = root_first
+
+    # Еднакви имена – директно в една група, и само един представител в LSH индекса
+    by_text: Dict[str, Hashable] = {}
+    for key in keys:
+        text = " ".join(names[key].upper().split())
+        if text in by_text:
+            union(by_text[text], key)
+        else:
+            by_text[text] = key
+
+    grams = {key: shingles(text) for text, key in by_text.items()}
+    buckets = defaultdict(list)
+    for key, key_grams in grams.items():
+        for band_key in hasher.band_keys(hasher.signature(key_grams)):
+            buckets[band_key].append(key)
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > MAX_BUCKET_SIZE:
+            continue
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                pair = (first, second)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if find(first) != find(second) and jaccard(grams[first], grams[second]) >= threshold:
+                    union(first, second)
+
+    return {key: find(key) for key in keys}
@@ -15,6 +15,16 @@ from pathlib import Path
 from typing import Optional, List
 
 
+def _copy_report(source: Path, reports_dir: Path) -> Path:
+    """Copy a report and, for HTML reports, its externalised chart data (<name>_data/)."""
+    dest = reports_dir / source.name
+    shutil.copy2(source, dest)
+    data_dir = source.with_name(source.stem + "_data")
+    if source.suffix.lower() == '.html' and data_dir.is_dir():
+        shutil.copytree(data_dir, reports_dir / data_dir.name, dirs_exist_ok=True)
+    return dest
+
+
 def publish_report(source_path: str, gh_pages_dir: Optional[str] = None) -> List[str]:
     """Publish one or more reports to GitHub Pages.
     
@@ -46,8 +56,7 @@ def publish_report(source_path: str, gh_pages_dir: Optional[str] = None) -> List
     if source.is_file():
         # Copy single file
         if source.suffix.lower() in {'.html', '.xlsx'}:
-            dest = reports_dir / source.name
-            shutil.copy2(source, dest)
+            dest = _copy_report(source, reports_dir)
             published.append(str(dest))
             print(f"✓ Published: {dest}")
         else:
@@ -57,8 +66,7 @@ def publish_report(source_path: str, gh_pages_dir: Optional[str] = None) -> List
         # Copy all reports from directory
         for file in source.iterdir():
             if file.suffix.lower() in {'.html', '.xlsx'} and 'lidl_receipts' in file.name:
-                dest = reports_dir / file.name
-                shutil.copy2(file, dest)
+                dest = _copy_report(file, reports_dir)
                 published.append(str(dest))
                 print(f"✓ Published: {dest}")
     
@@ -1,17 +1,44 @@
 """Анализ на изтеглени касови бележки: история на цените, XLSX, графики,
 сезонен анализ на плодове и зеленчуци."""
 
+import hashlib
 import json
+import multiprocessing
+import os
 import re
 import sqlite3
-from collections import defaultdict
-from datetime import datetime, date
+import tempfile
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from itertools import groupby, islice
+from operator import itemgetter
 from pathlib import Path
 from typing import Callable, Optional
 
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
-import plotly.graph_objects as go
+import numpy as np
+
+from chart_data import DEFAULT_VISIBLE_TRACES, prepare_traces
+from db_migrations import apply_migrations, schema_version
+from keyword_classifier import CategoryClassifier
+from price_export import export_database
+from price_matrix import PriceMatrix
+from price_merge import copy_database, legacy_database_id, merge_databases
+from price_segments import refresh_price_segments
+from price_xlsx import write_price_xlsx
+from report_pipeline import PROCESS_START_METHOD, ReportStage, run_stages
+from price_db import (
+    UNIX_EPOCH_ORDINAL, PriceColumns, PriceDatabase, dictionary_ids, from_day, read_price_columns, to_day,
+)
+from product_catalog import SQL_BATCH_SIZE, ProductCatalog
+from receipt_model import LineItem, Receipt
+from receipt_reader import iter_receipts
+from report_templates import (
+    CHART_PAGE, CHART_TOP_ROW, CHART_TOP_TABLE, INDEX_LINK, INDEX_PAGE, INDEX_REPORTS, SEASONAL_PAGE, SEASONAL_ROW,
+    YEARS_PAGE, YEARS_ROW,
+)
 
 EUR_PER_BGN = 1.95583
 EUR_INTRODUCTION_DATE = datetime(2026, 1, 1)
@@ -24,6 +51,9 @@ MONTHS_BG = {
 
 PRICE_PATTERN = r"^([А-ЯA-Z][А-ЯA-ZА-Яа-я\s\.\,\'\"\-\/\(\)0-9]+?)\s{2,}(\d+[\.,]\d{2})\s*[€BDлв#]*\s*$"
 UNIT_PRICE_PATTERN = r"(\d+[\.,]\d+)\s*[xх]\s*(\d+[\.,]\d{2})"
+DISCOUNT_PATTERN = r"^(.+?)\s{2,}-\s*(\d+[\.,]\d{2})"
+TOTAL_PATTERN = re.compile(r"ОБЩА СУМА\s+(\d+[\.,]\d{2})")
+STORE_PATTERN = re.compile(r"^\s*((?:гр|ГР|с|С)\.\s*\S.*?)\s*$", re.MULTILINE)
 
 SKIP_KEYWORDS = [
     "ОБЩА", "ОБЩО", "ПЛАТЕНО", "СУМА", "TOTAL", "PAID", "НАЛИЧНОСТ",
@@ -39,6 +69,8 @@ SKIP_LINE_MARKERS = [
     "КРЕДИТНА/ДЕБИТНА", "РЕСТО", "-----",
     "Ти спести", "#Ном:", "#Z-отчет:", "#Каса:",
 ]
+# Редове с отстъпка, която се отнася за предходния артикул
+ITEM_DISCOUNT_MARKERS = ["#Lidl Plus купон", "#Акция"]
 
 # Падеж/тегло в края на името на продукта (за канонично име при сравнение по грамаж)
 WEIGHT_SUFFIX_RE = re.compile(
@@ -105,6 +137,61 @@ FV_EXCLUDE_KEYWORDS = [
     "СЛОЕНА", "СЛИВЕНСК", "ЗЕЛЕНОСАН", "ГРАХАМ",
 ]
 
+# Таблици за категории: (категория, ключови думи, изключения). Редът определя
+# приоритета при няколко съвпадения – плодове/зеленчуци са първи, за да съвпада
+# категорията с is_fruit_or_vegetable.
+CATEGORY_KEYWORDS = (
+    ("fruit_veg", FRUITS_VEGETABLES_KEYWORDS, FV_EXCLUDE_KEYWORDS),
+    ("dairy", (
+        "МЛЯК", "МЛЕЧ", "КИС.МЛ", "СИРЕНЕ", "КАШКАВАЛ", "ЙОГУРТ", "КЕФИР", "АЙРЯН",
+        "КРАВЕ МАСЛО", "МАСЛО 82", "СМЕТАНА", "ИЗВАРА", "МОЦАРЕЛА", "ПАРМЕЗАН", "ГАУДА",
+        "ЕМЕНТАЛ", "ЧЕДЪР", "РИКОТА", "МАСКАРПОНЕ", "КАМАМБЕР", "ФЕТА", "ХАЛУМИ",
+    ), ("КОКОСОВО МЛЯКО", "ШОКОЛАД")),
+    ("meat", (
+        "СВИН", "ПИЛЕ", "ПИЛ.", "ГОВЕЖД", "ГОВ.", "ГОВМЕСО", "ТЕЛЕШ", "АГНЕШ", "ПУЕШ",
+        "КАЙМА", "КЕБАПЧ", "КЮФТЕ", "НАДЕНИЦ", "ЛУКАНК", "САЛАМ", "ШУНКА", "БЕКОН",
+        "КРЕНВИРШ", "ПАСТЪРМА", "СУДЖУК", "КАРНАЧЕ", "ВРАТНА", "ПЪРЖОЛ", "СТЕК",
+        "ШНИЦЕЛ", "ФИЛЕ ОТ ПИЛ", "ДРОБ", "ПРОШУТО", "ХАМБУРГЕР",
+    ), ()),
+    ("fish", (
+        "РИБА", "РИБН", "СЬОМГ", "СКАРИД", "СКУМРИ", "ПЪСТЪРВ", "ЦИПУР", "ЛАВРАК",
+        "ХЕК", "МИДИ", "КАЛМАР", "ОКТОПОД", "ХАЙВЕР", "РИБА ТОН", "ТОН В ", "ХЕРИНГА", "ПАНГАСИУС",
+    ), ()),
+    ("bakery", (
+        "ХЛЯБ", "ПИТКА", "БАНИЦ", "КРОАСАН", "КИФЛ", "БАГЕТ", "ЗЕМЕЛ", "ТОСТЕН",
+        "ПОГАЧ", "ДОНЪТ", "МЪФИН", "БРЕЗЕЛ", "ЧАБАТА", "ПИТА", "ПИРОЖК", "ЗАКУСКА",
+    ), ()),
+    ("sweets", (
+        "ШОКОЛАД", "БОНБОН", "БИСКВИТ", "ВАФЛ", "ТОРТА", "КЕКС", "СЛАДОЛЕД", "ДРАЖЕ",
+        "ЛОКУМ", "ХАЛВА", "ЖЕЛИР", "ДЕСЕРТ", "БАКЛАВА", "ПРАЛИН", "ДЪВКИ",
+    ), ()),
+    ("drinks", (
+        "ВОДА", "МИН.ВОДА", "СОК ", "НЕКТАР", "БИРА", "ВИНО", "КОЛА", "ЛИМОНАДА",
+        "ТОНИК", "ЕНЕРГИЙНА", "КАФЕ", "ЧАЙ", "УИСКИ", "ВОДКА", "РАКИЯ", "ДЖИН", "ГАЗИРАНА",
+    ), ("ТОАЛЕТНА ВОДА", "МИЦЕЛАРНА ВОДА")),
+    ("household", (
+        "ПРАХ ЗА", "ОМЕКОТИТЕЛ", "ПРЕПАРАТ", "ТОАЛЕТНА ХАРТИЯ", "КУХНЕНСКА РОЛКА",
+        "САЛФЕТК", "ТОРБ", "ПЕРИЛЕН", "ДЕТЕРГЕНТ", "ТАБЛЕТКИ ЗА", "БАТЕРИ", "ФОЛИО",
+        "ПЛИКОВЕ", "ГАЩИЧКИ", "ШАМПОАН", "САПУН", "ДУШ ГЕЛ", "ПАСТА ЗА ЗЪБИ",
+        "ЧЕТКА ЗА", "ДЕЗОДОРАНТ", "ПЕЛЕНИ", "МОКРИ КЪРПИ", "ТОАЛЕТНА ВОДА", "МИЦЕЛАРНА ВОДА",
+    ), ()),
+)
+
+CATEGORY_LABELS = {
+    "fruit_veg": "Плодове и зеленчуци",
+    "dairy": "Млечни",
+    "meat": "Месо и колбаси",
+    "fish": "Риба и морски дарове",
+    "bakery": "Хляб и тестени",
+    "sweets": "Сладки изделия",
+    "drinks": "Напитки",
+    "household": "Домакински и хигиена",
+    None: "Други",
+}
+
+# Компилира се веднъж при зареждане на модула
+PRODUCT_CLASSIFIER = CategoryClassifier(CATEGORY_KEYWORDS)
+
 # Марки/суфикси, които не променят смисъла на продукта, но често се появяват в името.
 # Те помагат да се сравняват варианти като „Кашкавал Вианга“ и „Кашкавал“ като един и същ артикул.
 BRAND_SUFFIXES = (
@@ -117,6 +204,15 @@ BRAND_SUFFIXES = (
     "CLASSIC",
 )
 
+# Паралелен парсинг: под този общ размер на файловете се работи в един процес,
+# а по-големите файлове се разделят на части от по PARSE_CHUNK_RECEIPTS бележки.
+PARALLEL_PARSE_MIN_BYTES = 512 * 1024
+PARSE_CHUNK_RECEIPTS = 200
+# Размер на LRU кеша за нормализация/тегло/категория на имена на продукти
+PRODUCT_NAME_CACHE_SIZE = 8192
+# Граница за номерата на дните, когато периодът в get_price_histories не е ограничен
+HISTORY_DAY_BOUND = 1 << 40
+
 # Летен сезон - месеци с по-ниски цени за свежи плодове/зеленчуци
 SUMMER_MONTHS = {6, 7, 8, 9}
 SUMMER_MONTHS_NAMES = "Юни, Юли, Август, Септември"
@@ -129,45 +225,148 @@ class ReceiptAnalyzer:
         # Единица за всеки продукт: '€/кг', '€/100г' или '€' (цена за пакет)
         self.products_units = {}
         self.db_path = db_path or str(Path(__file__).with_name("lidl_local_prices.db"))
-        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+        # Записите минават през нишката-писател, четенията – през връзка на текущата нишка
+        self.db = PriceDatabase(self.db_path)
+        self.catalog = ProductCatalog(self.db, self._describe_product)
         self._init_db()
 
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Връзка за четене от локалната база за текущата нишка."""
+        return self.db.reader()
+
+    def close(self) -> None:
+        """Изчаква чакащите записи и затваря връзките към базата."""
+        self.db.close()
+
+    def __enter__(self) -> "ReceiptAnalyzer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def _init_db(self) -> None:
         """Създава локалната SQLite база данни за исторически цени по продукт и дата."""
         try:
-            db_file = Path(self.db_path)
-            if str(self.db_path) != ':memory:':
-                db_file.parent.mkdir(parents=True, exist_ok=True)
-            self._conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS price_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_name TEXT NOT NULL,
-                    normalized_name TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    price REAL NOT NULL,
-                    unit TEXT NOT NULL,
-                    source TEXT DEFAULT 'receipt',
-                    receipt_file TEXT,
-                    sample_count INTEGER DEFAULT 1,
-                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(product_name, date, unit)
-                )
-                """
+            applied = self.db.write(self._migrate)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при обновяване на локалната база данни: {exc}")
+            return
+        for version, description in applied:
+            self.log(f"Локалната база е обновена до версия {version}: {description}")
+        if applied and not self.db.in_memory:
+            self._compact_db()
+        try:
+            self.catalog.reclassify(self.classify_product, PRODUCT_CLASSIFIER.version)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при инициализация на локалната база данни: {exc}")
+
+    def _compact_db(self) -> None:
+        """VACUUM след миграция – освобождава страниците на заменените таблици.
+
+        Не е задължително: ако базата е заета от друг читател или няма място
+        на диска, грешката се записва в лога и работата продължава.
+        """
+        try:
+            self.db.write(_vacuum)
+        except Exception as exc:
+            self.log(f"Базата не беше компактирана (VACUUM): {exc}")
+
+    def _migrate(self, conn) -> list:
+        """Създава началната схема (версия 0) при нова база и изпълнява липсващите миграции."""
+        # Явна транзакция, за да се върнат и CREATE/DROP при грешка в миграция
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        if schema_version(conn) == 0:
+            self._create_schema(conn)
+        return apply_migrations(conn, self.catalog)
+
+    @staticmethod
+    def _create_schema(conn) -> None:
+        """Начална схема (версия 0); следващите промени са миграции в db_migrations."""
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS price_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_name TEXT NOT NULL,
+                normalized_name TEXT NOT NULL,
+                date TEXT NOT NULL,
+                price REAL NOT NULL,
+                unit TEXT NOT NULL,
+                source TEXT DEFAULT 'receipt',
+                receipt_file TEXT,
+                sample_count INTEGER DEFAULT 1,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(product_name, date, unit)
             )
-            self._conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_price_history_product_date "
-                "ON price_history(normalized_name, date)"
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_price_history_product_date "
+            "ON price_history(normalized_name, date)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_price_history_product_name "
+            "ON price_history(product_name, date)"
+        )
+        # Регистър на вече обработените файлове и бележки (за идемпотентен внос)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingested_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                receipt_count INTEGER NOT NULL DEFAULT 0,
+                parsed TEXT,
+                ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
             )
-            self._conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_price_history_product_name "
-                "ON price_history(product_name, date)"
+            """
+        )
+        # Нормализирани бележки и артикули; receipts е и регистърът на вече
+        # записаните бележки (уникален receipt_hash)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS receipts (
+                id INTEGER PRIMARY KEY,
+                receipt_hash TEXT NOT NULL UNIQUE,
+                receipt_file TEXT,
+                date TEXT NOT NULL,
+                timestamp TEXT,
+                store TEXT,
+                total REAL,
+                currency TEXT,
+                item_count INTEGER NOT NULL DEFAULT 0,
+                ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
             )
-            self._conn.commit()
-        except Exception as exc:  # pragma: no cover - safety fallback
-            self.log(f"Грешка при инициализация на локалната база данни: {exc}")
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS line_items (
+                receipt_id INTEGER NOT NULL REFERENCES receipts(id) ON DELETE CASCADE,
+                line_no INTEGER NOT NULL,
+                product_name TEXT NOT NULL,
+                unit TEXT NOT NULL,
+                quantity REAL,
+                unit_price REAL,
+                amount REAL NOT NULL,
+                discount REAL NOT NULL DEFAULT 0,
+                price REAL NOT NULL,
+                price_history_id INTEGER REFERENCES price_history(id),
+                PRIMARY KEY (receipt_id, line_no)
+            )
+            """
+        )
+        ProductCatalog.create_schema(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_receipts_date ON receipts(date)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_line_items_product ON line_items(product_name, receipt_id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_line_items_price_history ON line_items(price_history_id)"
+        )
 
     def record_price(
         self,
@@ -179,48 +378,72 @@ class ReceiptAnalyzer:
         receipt_file: Optional[str] = None,
     ) -> None:
         """Записва цена за продукт и дата в локалната SQLite база. Ако има вече запис за същия продукт/дата/единица, се усреднява."""
-        if not product_name or not date_str or price is None:
-            return
+        self.record_prices([(product_name, date_str, price, unit, source, receipt_file)])
 
-        normalized_name = self.normalize_product_name(product_name)
-        safe_date = date_str[:10]
-        safe_unit = unit or "€"
+    def record_prices(self, observations) -> int:
+        """Записва пакет от цени в една транзакция и връща броя записани наблюдения.
 
+        Всяко наблюдение е (product_name, date_str, price, unit, source, receipt_file).
+        Съществуващ запис за същия продукт/дата/единица се усреднява в SQL чрез
+        INSERT ... ON CONFLICT DO UPDATE, така че резултатът е същият като при
+        последователни извиквания на record_price, но с едно записване на диска.
+        """
         try:
-            row = self._conn.execute(
-                """
-                SELECT price, sample_count
-                FROM price_history
-                WHERE product_name = ? AND date = ? AND unit = ?
-                LIMIT 1
-                """,
-                (product_name, safe_date, safe_unit),
-            ).fetchone()
-
-            if row:
-                old_price, sample_count = row
-                new_count = int(sample_count) + 1
-                avg = ((float(old_price) * int(sample_count)) + float(price)) / new_count
-                self._conn.execute(
-                    """
-                    UPDATE price_history
-                    SET price = ?, sample_count = ?, source = ?, receipt_file = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE product_name = ? AND date = ? AND unit = ?
-                    """,
-                    (avg, new_count, source, receipt_file, product_name, safe_date, safe_unit),
-                )
-            else:
-                self._conn.execute(
-                    """
-                    INSERT INTO price_history (
-                        product_name, normalized_name, date, price, unit, source, receipt_file, sample_count
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, 1)
-                    """,
-                    (product_name, normalized_name, safe_date, float(price), safe_unit, source, receipt_file),
-                )
-            self._conn.commit()
+            count, skipped = self.db.write(self._upsert_prices, observations)
         except Exception as exc:  # pragma: no cover - safety fallback
             self.log(f"Грешка при запис в локалната база данни: {exc}")
+            return 0
+        self._log_skipped_prices(skipped)
+        return count
+
+    def _upsert_prices(self, conn, observations) -> tuple:
+        """Изпълнява пакетния UPSERT в транзакцията на писателя (conn).
+
+        Връща (брой записани, [(продукт, дата) с невалидна дата]). Тук не се
+        логва: нишката на писателя не бива да чака интерфейса.
+        """
+        rows = []
+        skipped = []
+        for product_name, date_str, price, unit, source, receipt_file in observations:
+            if not product_name or not date_str or price is None:
+                continue
+            try:
+                day = to_day(date_str)
+            except ValueError:
+                skipped.append((product_name, date_str))
+                continue
+            rows.append((product_name, day, float(price), unit or "€", source, receipt_file))
+        if not rows:
+            return 0, skipped
+
+        products = self.catalog.get_many((row[0] for row in rows), conn=conn)
+        units = dictionary_ids(conn, "units", "name", (row[3] for row in rows))
+        sources = dictionary_ids(conn, "sources", "name", (row[4] for row in rows))
+        files = dictionary_ids(conn, "receipt_files", "path", (row[5] for row in rows))
+        conn.executemany(
+            """
+            INSERT INTO prices (product_id, day, unit_id, price, sample_count, source_id, file_id)
+            VALUES (?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT(product_id, day, unit_id) DO UPDATE SET
+                price = (price * sample_count + excluded.price) / (sample_count + 1),
+                sample_count = sample_count + 1,
+                source_id = excluded.source_id,
+                file_id = excluded.file_id
+            """,
+            [
+                (
+                    products[product_name].product_id, day, units[unit], price,
+                    sources.get(source), files.get(receipt_file),
+                )
+                for product_name, day, price, unit, source, receipt_file in rows
+            ],
+        )
+        refresh_price_segments(conn)
+        return len(rows), skipped
+
+    def _log_skipped_prices(self, skipped: list) -> None:
+        for product_name, date_str in skipped:
+            self.log(f"Пропусната цена с невалидна дата: {product_name} ({date_str})")
 
     def get_price_history(self, product_name: str) -> list:
         """Връща исторически данни за продукт от локалната база. Подава се името, без да се изисква файловете."""
@@ -231,10 +454,14 @@ class ReceiptAnalyzer:
         try:
             rows = self._conn.execute(
                 """
-                SELECT product_name, date, price, unit, source, receipt_file
-                FROM price_history
-                WHERE product_name = ? OR normalized_name = ?
-                ORDER BY date ASC, created_at ASC
+                SELECT p.raw_name, date(pr.day * 86400, 'unixepoch'), pr.price, u.name, s.name, f.path
+                FROM prices pr
+                JOIN products p ON p.id = pr.product_id
+                JOIN units u ON u.id = pr.unit_id
+                LEFT JOIN sources s ON s.id = pr.source_id
+                LEFT JOIN receipt_files f ON f.id = pr.file_id
+                WHERE pr.product_id IN (SELECT id FROM products WHERE raw_name = ? OR canonical_name = ?)
+                ORDER BY pr.day ASC, p.raw_name ASC, u.name ASC
                 """,
                 (product_name, normalized_name),
             ).fetchall()
@@ -254,52 +481,397 @@ class ReceiptAnalyzer:
             for row in rows
         ]
 
+    def get_price_segments(self, product_name: str) -> list:
+        """Историята на продукт като отрязъци с постоянна цена (по-кратка от get_price_history)."""
+        if not product_name:
+            return []
+
+        normalized_name = self.normalize_product_name(product_name)
+        try:
+            rows = self._conn.execute(
+                """
+                SELECT p.raw_name, date(seg.start_day * 86400, 'unixepoch'), date(seg.end_day * 86400, 'unixepoch'),
+                       seg.price, u.name, seg.n
+                FROM price_segments seg
+                JOIN products p ON p.id = seg.product_id
+                JOIN units u ON u.id = seg.unit_id
+                WHERE seg.product_id IN (SELECT id FROM products WHERE raw_name = ? OR canonical_name = ?)
+                ORDER BY seg.start_day ASC, p.raw_name ASC, u.name ASC
+                """,
+                (product_name, normalized_name),
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return []
+
+        return [
+            {
+                "product_name": row[0],
+                "start": row[1],
+                "end": row[2],
+                "price": float(row[3]),
+                "unit": row[4],
+                "observations": row[5],
+            }
+            for row in rows
+        ]
+
+    def get_price_changes(self, since: Optional[str] = None) -> list:
+        """Промените в цените от дата since (по подразбиране – началото на миналия месец), най-новите първи."""
+        if since is None:
+            first_of_month = date.today().replace(day=1)
+            since = (first_of_month - timedelta(days=1)).replace(day=1).isoformat()
+        try:
+            rows = self._conn.execute(
+                """
+                SELECT p.raw_name, date(c.day * 86400, 'unixepoch'), c.old_price, c.new_price, u.name
+                FROM price_changes c
+                JOIN products p ON p.id = c.product_id
+                JOIN units u ON u.id = c.unit_id
+                WHERE c.day >= ?
+                ORDER BY c.day DESC, p.raw_name ASC
+                """,
+                (to_day(since),),
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return []
+
+        return [
+            {
+                "product_name": row[0],
+                "date": row[1],
+                "old_price": float(row[2]),
+                "new_price": float(row[3]),
+                "change_pct": (row[3] - row[2]) / row[2] * 100 if row[2] else None,
+                "unit": row[4],
+            }
+            for row in rows
+        ]
+
+    def get_price_histories(
+        self,
+        products,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        page_size: Optional[int] = None,
+        after: Optional[tuple] = None,
+    ) -> dict:
+        """Историите на много продукти наведнъж, групирани по продукт.
+
+        products е списък от имена (сурови или канонични) и/или product_id.
+        start_date/end_date (ISO, включително) ограничават периода. При
+        page_size се връщат най-много толкова реда, а "next" е ключът, който се
+        подава като after за следващата страница (None, ако няма още).
+        Продуктите се откриват с IN списъци по индексите на products, а цените
+        се четат по първичния ключ на prices, без сортиране.
+        Връща {"histories": {product_name: [{date, price, unit, sample_count}]}, "next": ...}.
+        """
+        result = {"histories": {}, "next": None}
+        try:
+            product_ids = self._resolve_product_ids(products)
+            first_day = to_day(start_date) if start_date else -HISTORY_DAY_BOUND
+            last_day = to_day(end_date) if end_date else HISTORY_DAY_BOUND
+            after = tuple(after) if after else (-1, -HISTORY_DAY_BOUND, -1)
+            product_ids = [product_id for product_id in product_ids if product_id >= after[0]]
+
+            remaining = page_size
+            last_key = None
+            for start in range(0, len(product_ids), SQL_BATCH_SIZE):
+                if remaining is not None and remaining <= 0:
+                    break
+                batch = product_ids[start:start + SQL_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"""
+                    SELECT pr.product_id, pr.day, pr.unit_id, p.raw_name,
+                           date(pr.day * 86400, 'unixepoch'), pr.price, u.name, pr.sample_count
+                    FROM prices pr
+                    JOIN products p ON p.id = pr.product_id
+                    JOIN units u ON u.id = pr.unit_id
+                    WHERE pr.product_id IN ({','.join('?' * len(batch))})
+                      AND pr.day BETWEEN ? AND ?
+                      AND (pr.product_id, pr.day, pr.unit_id) > (?, ?, ?)
+                    ORDER BY pr.product_id, pr.day, pr.unit_id
+                    LIMIT ?
+                    """,
+                    (*batch, first_day, last_day, *after, -1 if remaining is None else remaining),
+                ).fetchall()
+                for product_id, day, unit_id, name, date_str, price, unit, sample_count in rows:
+                    result["histories"].setdefault(name, []).append(
+                        {"date": date_str, "price": float(price), "unit": unit, "sample_count": sample_count}
+                    )
+                    last_key = (product_id, day, unit_id)
+                if remaining is not None:
+                    remaining -= len(rows)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return result
+
+        if remaining is not None and remaining <= 0 and last_key is not None:
+            result["next"] = last_key
+        return result
+
+    def _resolve_product_ids(self, products) -> list:
+        """Подредени product_id за смесен списък от имена и id (имената съвпадат по сурово или канонично име)."""
+        ids = {product for product in products if isinstance(product, int)}
+        names = [product for product in products if isinstance(product, str) and product]
+        canonical = list(dict.fromkeys(self.normalize_product_name(name) for name in names))
+        for column, values in (("raw_name", names), ("canonical_name", canonical)):
+            for start in range(0, len(values), SQL_BATCH_SIZE):
+                batch = values[start:start + SQL_BATCH_SIZE]
+                rows = self._conn.execute(
+                    f"SELECT id FROM products WHERE {column} IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                ids.update(row[0] for row in rows)
+        return sorted(ids)
+
+    def search_products(self, query: str, limit: int = 20) -> list:
+        """Пълнотекстово търсене на продукти в локалната база (напр. "кашкавал").
+
+        Връща продуктите по релевантност, всеки с последната си цена и броя
+        наблюдения в prices.
+        """
+        if not query or not query.strip():
+            return []
+        try:
+            matches = self.catalog.search(query, limit)
+            if not matches:
+                return []
+            rank_by_id = dict(matches)
+            rows = self._conn.execute(
+                f"""
+                SELECT p.id, p.raw_name, p.canonical_name, p.category,
+                       COUNT(pr.day), COALESCE(SUM(pr.sample_count), 0), MAX(pr.day), pr.price, u.name
+                FROM products p
+                LEFT JOIN prices pr ON pr.product_id = p.id
+                LEFT JOIN units u ON u.id = pr.unit_id
+                WHERE p.id IN ({','.join('?' * len(rank_by_id))})
+                GROUP BY p.id
+                """,
+                list(rank_by_id),
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при търсене в локалната база данни: {exc}")
+            return []
+
+        # При MAX(pr.day) SQLite връща price и unit от реда с последната дата
+        results = [
+            {
+                "product_name": row[1],
+                "canonical_name": row[2],
+                "category": row[3],
+                "label": CATEGORY_LABELS.get(row[3], row[3]),
+                "observations": row[4],
+                "samples": row[5],
+                "last_date": from_day(row[6]) if row[6] is not None else None,
+                "last_price": float(row[7]) if row[7] is not None else None,
+                "unit": row[8],
+                "rank": rank_by_id[row[0]],
+            }
+            for row in rows
+        ]
+        results.sort(key=lambda item: (item["rank"], -item["observations"], item["product_name"]))
+        return results
+
+    def iter_db_summary(self):
+        """Поточно обхождане на базата: (product_name, [(date, price, unit), ...]) по продукт.
+
+        Редовете идват подредени по име и дата директно от индексите (CROSS JOIN
+        фиксира обхождането: индексът по products.raw_name, после първичният
+        ключ на prices), без сортиране и без цялата база в паметта – във всеки
+        момент се държи историята само на един продукт.
+        """
+        try:
+            cursor = self._conn.execute(
+                """
+                SELECT p.raw_name, date(pr.day * 86400, 'unixepoch'), pr.price, u.name
+                FROM products p
+                CROSS JOIN prices pr ON pr.product_id = p.id
+                JOIN units u ON u.id = pr.unit_id
+                ORDER BY p.raw_name, pr.day, pr.unit_id
+                """
+            )
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return
+        for product_name, rows in groupby(cursor, key=itemgetter(0)):
+            yield product_name, [(date_str, float(price), unit) for _, date_str, price, unit in rows]
+
+    def iter_price_segments(self):
+        """Поточно обхождане на отрязъците: (product_name, [(start, end, price, unit, n), ...]) по продукт."""
+        try:
+            cursor = self._conn.execute(
+                """
+                SELECT p.raw_name, date(seg.start_day * 86400, 'unixepoch'), date(seg.end_day * 86400, 'unixepoch'),
+                       seg.price, u.name, seg.n
+                FROM products p
+                CROSS JOIN price_segments seg ON seg.product_id = p.id
+                JOIN units u ON u.id = seg.unit_id
+                ORDER BY p.raw_name, seg.unit_id, seg.start_day
+                """
+            )
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return
+        for product_name, rows in groupby(cursor, key=itemgetter(0)):
+            yield product_name, [(start, end, float(price), unit, n) for _, start, end, price, unit, n in rows]
+
+    def get_db_columns(self) -> Optional[PriceColumns]:
+        """Всички цени като масиви (product_ids, days, unit_ids, prices) за векторни изчисления."""
+        try:
+            return read_price_columns(self._conn)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return None
+
+    def export_database(self, output_dir: str, fmt: str = "parquet") -> list:
+        """Изнася цените, каталога и бележките в output_dir (parquet, arrow или csv)."""
+        try:
+            used, paths = export_database(self._conn, output_dir, fmt)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при износ на локалната база данни: {exc}")
+            return []
+        if used != fmt:
+            self.log(f"pyarrow не е инсталиран – износ в CSV вместо {fmt}")
+        self.log(f"Износ на локалната база ({used}): {len(paths)} файла в {output_dir}")
+        return paths
+
+    def merge_databases(self, paths: list) -> list:
+        """Слива други локални бази (напр. от други компютри) в тази; връща [MergeResult]."""
+        try:
+            results = merge_databases(self.db, self.catalog, [str(path) for path in paths])
+            outdated = [result.path for result in results if result.status == "outdated"]
+            if outdated:
+                retried = {result.path: result for result in self._merge_outdated(outdated)}
+                results = [retried.get(result.path, result) for result in results]
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при сливане на бази: {exc}")
+            return []
+        messages = {
+            "unchanged": "без промени от предишното сливане",
+            "self": "това е същата база",
+            "outdated": "базата е от друга версия на програмата",
+        }
+        for result in results:
+            if result.status == "merged":
+                self.log(f"Слята база {result.path}: {result.rows} цени, {result.receipts} нови бележки")
+            else:
+                self.log(f"Пропусната база {result.path}: {messages[result.status]}")
+        if any(result.status == "merged" for result in results):
+            self.catalog.clear_cache()
+        return results
+
+    def _merge_outdated(self, paths: list) -> list:
+        """Слива бази от по-стара версия чрез временни мигрирани копия; оригиналите не се пипат."""
+        with tempfile.TemporaryDirectory() as tmp:
+            copies = []
+            for index, path in enumerate(paths):
+                copy = str(Path(tmp) / f"merge_src{index}.db")
+                copy_database(path, copy)
+                conn = sqlite3.connect(copy)
+                try:
+                    # database_id се появява с миграцията v3 (регистър на сливанията)
+                    has_id = schema_version(conn) >= 3
+                finally:
+                    conn.close()
+                # Мигрира се както при отваряне от програмата
+                ReceiptAnalyzer(log=self.log, db_path=copy).close()
+                if not has_id:
+                    conn = sqlite3.connect(copy)
+                    try:
+                        with conn:
+                            conn.execute(
+                                "UPDATE catalog_meta SET value = ? WHERE key = 'database_id'",
+                                (legacy_database_id(path),),
+                            )
+                    finally:
+                        conn.close()
+                copies.append(copy)
+            return merge_databases(self.db, self.catalog, copies, names=paths)
+
     def get_db_summary(self) -> dict:
         """Връща всички записани истории по продукт: {product_name: {date: price}}."""
+        summary = {}
+        for product_name, rows in self.iter_db_summary():
+            summary[product_name] = {date_str: price for date_str, price, _ in rows}
+            self.products_units.setdefault(product_name, rows[0][2])
+        return summary
+
+    def get_category_summary(self) -> list:
+        """Обобщение на базата по категории: брой продукти, наблюдения и последна дата."""
         try:
             rows = self._conn.execute(
                 """
-                SELECT product_name, date, price, unit
-                FROM price_history
-                ORDER BY product_name ASC, date ASC
+                SELECT p.category, COUNT(DISTINCT p.id), COUNT(*), SUM(pr.sample_count),
+                       date(MAX(pr.day) * 86400, 'unixepoch')
+                FROM prices pr
+                JOIN products p ON p.id = pr.product_id
+                GROUP BY p.category
+                ORDER BY COUNT(*) DESC
                 """
             ).fetchall()
         except Exception as exc:  # pragma: no cover - safety fallback
             self.log(f"Грешка при четене от локалната база данни: {exc}")
-            return {}
+            return []
 
-        summary = defaultdict(dict)
-        for row in rows:
-            product_name, date_str, price, unit = row
-            summary[product_name][date_str] = float(price)
-            self.products_units.setdefault(product_name, unit)
-        return dict(summary)
-
-    def generate_local_db_report(self, output_file: str) -> str:
-        """Генерира HTML отчет от локалната база данни с графика по продукт и дата."""
-        product_history = self.get_db_summary()
-        if not product_history:
-            raise ValueError("Локалната база данни е празна. Няма данни за анализ.")
+        return [
+            {
+                "category": row[0],
+                "label": CATEGORY_LABELS.get(row[0], row[0]),
+                "products": row[1],
+                "observations": row[2],
+                "samples": row[3],
+                "last_date": row[4],
+            }
+            for row in rows
+        ]
 
-        traces = []
-        for product_name, prices_by_date in sorted(product_history.items()):
-            ordered = sorted(prices_by_date.items(), key=lambda item: item[0])
-            if len(ordered) < 2:
-                continue
-            traces.append(
-                {
-                    "x": [date_str for date_str, _ in ordered],
-                    "y": [float(price) for _, price in ordered],
-                    "mode": "lines+markers",
-                    "name": product_name,
-                    "line": {"width": 2},
-                    "marker": {"size": 5},
-                    "hovertemplate": "<b>%{fullData.name}</b><br>Дата: %{x}<br>Цена: %{y:.2f} €<extra></extra>",
-                }
+    def generate_local_db_report(self, output_file: str, data_format: Optional[str] = None) -> str:
+        """Генерира HTML отчет от локалната база данни с графика по продукт и дата.
+
+        С data_format (виж chart_data.CHART_DATA_FORMATS) при отваряне се виждат
+        първите DEFAULT_VISIBLE_TRACES серии, а данните на останалите се
+        изнасят в шардове по категория и се зареждат при показване.
+        """
+        table_rows = []
+        for product_name, rows in self.iter_db_summary():
+            # Редовете са подредени по дата; при няколко единици за една дата остава последната
+            ordered = list({date_str: price for date_str, price, _ in rows}.items())
+            table_rows.append(
+                f'<tr><td>{product_name}</td><td>{", ".join(date_str for date_str, _ in ordered)}</td>'
+                f'<td>{", ".join(f"{p:.2f} €" for p in sorted(price for _, price in ordered))}</td></tr>'
             )
 
+        # Графиката се чертае стъпаловидно от отрязъците с постоянна цена: по една
+        # точка на промяна вместо по една на ден с покупка
+        traces = []
+        trace_products = []
+        for product_name, segments in self.iter_price_segments():
+            units = list(dict.fromkeys(unit for _, _, _, unit, _ in segments))
+            for unit in units:
+                unit_segments = [segment for segment in segments if segment[3] == unit]
+                if sum(n for *_, n in unit_segments) < 2:
+                    continue
+                last_end, last_price = unit_segments[-1][1], unit_segments[-1][2]
+                traces.append(
+                    {
+                        "x": [start for start, *_ in unit_segments] + [last_end],
+                        "y": [price for _, _, price, _, _ in unit_segments] + [last_price],
+                        "mode": "lines+markers",
+                        "name": product_name if len(units) == 1 else f"{product_name} ({unit})",
+                        "line": {"width": 2, "shape": "hv"},
+                        "marker": {"size": 5},
+                        "hovertemplate": "<b>%{fullData.name}</b><br>Дата: %{x}<br>Цена: %{y:.2f} €<extra></extra>",
+                    }
+                )
+                trace_products.append(product_name)
+
+        if not table_rows:
+            raise ValueError("Локалната база данни е празна. Няма данни за анализ.")
         if not traces:
             raise ValueError("Локалната база данни няма достатъчно данни за графика.")
+        loader = self._prepare_chart(traces, trace_products, output_file, data_format)
 
         html = f'''<!DOCTYPE html>
 <html lang="bg">
@@ -325,12 +897,12 @@ class ReceiptAnalyzer:
         <tr><th>Продукт</th><th>Дати</th><th>Цени</th></tr>
       </thead>
       <tbody>
-        {''.join(f'<tr><td>{product_name}</td><td>{", ".join(date_str for date_str, _ in sorted(prices_by_date.items()))}</td><td>{", ".join(f"{p:.2f} €" for p in sorted(prices_by_date.values()))}</td></tr>' for product_name, prices_by_date in sorted(product_history.items()))}
+        {''.join(table_rows)}
       </tbody>
     </table>
   </div>
   <script>
-    var traces = {json.dumps(traces, ensure_ascii=False)};
+    var traces = {json.dumps(traces, ensure_ascii=False, separators=(",", ":") if loader else None)};
     var layout = {{
       title: 'История на цените от локалната база',
       template: 'plotly_white',
@@ -343,35 +915,68 @@ class ReceiptAnalyzer:
     }};
     Plotly.newPlot('chart', traces, layout, {{responsive: true}});
     window.addEventListener('resize', function() {{ Plotly.Plots.resize(document.getElementById('chart')); }});
-  </script>
+  </script>{loader}
 </body>
 </html>'''
 
         Path(output_file).write_text(html, encoding="utf-8")
         return output_file
 
-    def parse_files(self, file_paths) -> dict:
-        """Парсва множество файлове и обединява продуктите в {product: {date: price}}."""
+    def _prepare_chart(self, traces: list, products: list, output_file, data_format: Optional[str]) -> str:
+        """Прорежда дългите серии (LTTB, WebGL) и при data_format изнася данните на скритите по категория.
+
+        Връща <script> за зареждане на изнесените и пълните серии ('' ако няма такива).
+        """
+        groups = [None] * len(traces)
+        if data_format:
+            for trace in traces[DEFAULT_VISIBLE_TRACES:]:
+                if trace.get("visible", True) is True:
+                    trace["visible"] = "legendonly"
+            catalog = self.catalog.get_many(list(dict.fromkeys(products)))
+            groups = [catalog[name].category if name in catalog else None for name in products]
+        return prepare_traces(traces, groups, output_file, data_format)
+
+    def parse_files(self, file_paths, max_workers: Optional[int] = None) -> dict:
+        """Парсва множество файлове и обединява продуктите в {product: {date: price}}.
+
+        Бележките се парсват паралелно в пул от процеси (по файл или на части от
+        голям файл), а резултатите се обединяват и записват в базата от текущия
+        процес в реда на файловете, така че изходът не зависи от броя процеси.
+        Непроменените файлове (по размер, mtime и хеш) не се парсват отново, а
+        вече записаните бележки не променят базата повторно.
+        """
+        file_paths = list(file_paths)
         products_data = defaultdict(dict)
         total_receipts = 0
 
-        for file_idx, file_path in enumerate(file_paths, 1):
+        states = [self._ledger_lookup(file_path) for file_path in file_paths]
+        to_parse = [file_path for file_path, (_, known_count) in zip(file_paths, states) if known_count is None]
+        parsed_files = self._iter_parsed_files(to_parse, max_workers)
+
+        for file_idx, (file_path, (fingerprint, known_count)) in enumerate(zip(file_paths, states), 1):
             self.log(f"\nФайл {file_idx}/{len(file_paths)}: {Path(file_path).name}")
             try:
-                file_products = self.parse_file(file_path)
-                for product_name, dates_prices in file_products.items():
-                    for date_str, price in dates_prices.items():
-                        if date_str in products_data[product_name]:
-                            existing = products_data[product_name][date_str]
-                            products_data[product_name][date_str] = (existing + price) / 2
-                        else:
-                            products_data[product_name][date_str] = price
-
-                content = Path(file_path).read_text(encoding="utf-8")
-                total_receipts += content.count("БЕЛЕЖКА #")
+                if known_count is not None:
+                    self.log("  Файлът не е променян от последния анализ – използват се записаните бележки")
+                    file_products = self._load_ingested_file(fingerprint[0])
+                    total_receipts += known_count
+                else:
+                    _, _, parsed = next(parsed_files)
+                    if isinstance(parsed, Exception):
+                        self.log(f"  Грешка при четене на файл: {parsed}")
+                        continue
+                    file_products = self._merge_parsed_receipts(file_path, parsed, fingerprint=fingerprint)
+                    total_receipts += len(parsed)
             except Exception as e:
                 self.log(f"  Грешка при четене на файл: {e}")
                 continue
+            for product_name, dates_prices in file_products.items():
+                for date_str, price in dates_prices.items():
+                    if date_str in products_data[product_name]:
+                        existing = products_data[product_name][date_str]
+                        products_data[product_name][date_str] = (existing + price) / 2
+                    else:
+                        products_data[product_name][date_str] = price
 
         self.log(f"\nОбработени {total_receipts} бележки от {len(file_paths)} файла")
         self.log(f"Намерени {len(products_data)} уникални артикула")
@@ -379,95 +984,281 @@ class ReceiptAnalyzer:
 
     def parse_file(self, file_path) -> dict:
         """Парсва един файл с бележки и връща {product: {date: price}}."""
-        products_data = defaultdict(dict)
-        content = Path(file_path).read_text(encoding="utf-8")
-        receipts = content.split("БЕЛЕЖКА #")
+        fingerprint, known_count = self._ledger_lookup(file_path)
+        if known_count is not None:
+            return self._load_ingested_file(fingerprint[0])
+        parsed = _parse_file_job(str(file_path))
+        return self._merge_parsed_receipts(file_path, parsed, fingerprint=fingerprint)
+
+    def _ledger_lookup(self, file_path):
+        """Връща (fingerprint, receipt_count) за файла според регистъра ingested_files.
+
+        fingerprint е (path, size, mtime_ns, content_hash) или None, ако файлът не
+        може да се прочете. receipt_count е броят бележки при последния внос, ако
+        файлът не е променян (същите размер и mtime, или същият хеш), иначе None –
+        тогава файлът трябва да се парсне.
+        """
+        path = str(Path(file_path).resolve())
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
 
-        self.log(f"  Намерени {len(receipts) - 1} бележки за парсинг...")
+        try:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, content_hash, receipt_count FROM ingested_files WHERE path = ?",
+                (path,),
+            ).fetchone()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            row = None
 
-        for receipt_idx, receipt in enumerate(receipts[1:], 1):
-            receipt_date_str = self._parse_receipt_date(receipt)
-            if receipt_date_str is None:
-                self.log(f"  Пропусната бележка #{receipt_idx} - не може да се извлече дата")
-                continue
+        if row and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return (path, row["size"], row["mtime_ns"], row["content_hash"]), row["receipt_count"]
 
-            try:
-                receipt_date = datetime.strptime(receipt_date_str, "%Y-%m-%d")
-            except ValueError:
-                self.log(f"  Пропусната бележка #{receipt_idx} - невалидна дата")
-                continue
+        content_hash = _hash_file(path)
+        fingerprint = (path, stat.st_size, stat.st_mtime_ns, content_hash)
+        if row and row["content_hash"] == content_hash:
+            # Файлът е само „докоснат“ – обновяваме mtime, без да го парсваме
+            self._store_ingestion([], [], [], fingerprint, None)
+            return fingerprint, row["receipt_count"]
+        return fingerprint, None
 
-            is_bgn = "BGN" in receipt or "# лв" in receipt or "лв  #" in receipt
-            is_eur = "Евро" in receipt or "# Евро #" in receipt or "EUR" in receipt
+    def _load_ingested_file(self, path: str) -> dict:
+        """Възстановява {product: {date: price}} на непроменен файл от receipts и line_items.
 
-            if receipt_date < EUR_INTRODUCTION_DATE:
-                conversion_rate = EUR_PER_BGN
+        Бележките на файла (и онези, записани по-рано от друг файл) са в
+        ingested_receipts в реда им във файла, така че резултатът и единиците
+        са същите като при повторен парсинг.
+        """
+        products_data = defaultdict(dict)
+        rows = self._conn.execute(
+            """
+            SELECT li.product_name, li.unit, r.date, li.price
+            FROM ingested_receipts ir
+            JOIN receipts r ON r.id = ir.receipt_id
+            JOIN line_items li ON li.receipt_id = r.id
+            WHERE ir.path = ?
+            ORDER BY ir.position, li.line_no
+            """,
+            (path,),
+        )
+        for product_name, unit, date_str, price in rows:
+            if unit == "€":
+                self.products_units.setdefault(product_name, unit)
             else:
-                conversion_rate = EUR_PER_BGN if is_bgn else 1.0
-
-            products_found = 0
-            lines = receipt.split("\n")
-
-            for i, line in enumerate(lines):
-                if any(marker in line for marker in SKIP_LINE_MARKERS):
-                    continue
-
-                match = re.match(PRICE_PATTERN, line.strip())
-                if not match:
-                    continue
+                self.products_units[product_name] = unit
+            products_data[product_name][date_str] = price
+        self.log(f"  От този файл: {len(products_data)} уникални артикула")
+        return products_data
 
-                product_name = match.group(1).strip()
-                price_str = match.group(2).replace(",", ".")
+    def _iter_parsed_files(self, file_paths: list, max_workers: Optional[int]):
+        """Връща (file_idx, file_path, parsed | Exception) в реда на файловете.
 
+        Малките входове се парсват в текущия процес – стартирането на пул
+        струва повече от самия парсинг. Големите файлове се четат поточно и се
+        разделят на части от по PARSE_CHUNK_RECEIPTS бележки за всички ядра.
+        """
+        workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+        sizes = [_file_size(path) for path in file_paths]
+        if workers <= 1 or sum(sizes) < PARALLEL_PARSE_MIN_BYTES:
+            for file_idx, file_path in enumerate(file_paths, 1):
                 try:
-                    price = float(price_str)
-                except ValueError:
-                    continue
-
-                if any(keyword in product_name.upper() for keyword in SKIP_KEYWORDS):
-                    continue
-                if len(product_name) < 3:
-                    continue
-                if "x" in product_name.lower() or "х" in product_name.lower():
-                    continue
+                    parsed = _parse_file_job(str(file_path))
+                except Exception as e:
+                    parsed = e
+                yield file_idx, file_path, parsed
+            return
 
-                final_price = price / conversion_rate
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+            )
+        except (OSError, NotImplementedError, ValueError) as e:
+            self.log(f"Паралелният парсинг не е наличен ({e}), продължава последователно")
+            yield from self._iter_parsed_files(file_paths, 1)
+            return
 
-                if i > 0:
-                    unit_match = re.search(UNIT_PRICE_PATTERN, lines[i - 1].strip())
-                    if unit_match:
-                        unit_price = float(unit_match.group(2).replace(",", "."))
-                        final_price = unit_price / conversion_rate
-                        self.products_units[product_name] = "€/кг"
+        with executor:
+            small_files = {
+                file_idx: executor.submit(_parse_file_job, str(file_path))
+                for file_idx, (file_path, size) in enumerate(zip(file_paths, sizes), 1)
+                if size < PARALLEL_PARSE_MIN_BYTES
+            }
+            for file_idx, file_path in enumerate(file_paths, 1):
+                try:
+                    if file_idx in small_files:
+                        parsed = small_files[file_idx].result()
                     else:
-                        weight_kg, unit_label = self.extract_weight_from_name(product_name)
-                        if weight_kg and weight_kg > 0:
-                            if unit_label == "€/100г":
-                                final_price = final_price / (weight_kg * 10)
-                            else:
-                                final_price = final_price / weight_kg
-                            self.products_units[product_name] = unit_label
-                        else:
-                            self.products_units.setdefault(product_name, "€")
-
-                products_data[product_name][receipt_date_str] = final_price
-                self.record_price(
-                    product_name=product_name,
-                    date_str=receipt_date_str,
-                    price=final_price,
-                    unit=self.products_units.get(product_name, "€"),
-                    source="receipt",
-                    receipt_file=str(file_path),
-                )
-                products_found += 1
+                        parsed = _parse_in_chunks(executor, file_path, workers * 2)
+                except Exception as e:
+                    parsed = e
+                yield file_idx, file_path, parsed
 
-            if products_found > 0:
-                self.log(f"    Бележка #{receipt_idx} ({receipt_date_str}): {products_found} артикула")
+    def _merge_parsed_receipts(self, file_path, parsed: list, fingerprint=None) -> dict:
+        """Прилага резултатите от _parse_receipts: единици, логове и един пакетен запис в базата.
 
+        В базата (prices, receipts, line_items) се записват само бележки,
+        чийто хеш липсва в receipts; всички бележки на файла се свързват с него
+        в ingested_receipts.
+        """
+        products_data = defaultdict(dict)
+        observations = []
+        new_receipts = []
+        new_items = []
+        # {receipt_hash: хешът, с който бележката е в receipts}
+        stored = self._stored_receipt_hashes(parsed)
+        file_receipts = []
+        self.log(f"  Намерени {len(parsed)} бележки за парсинг...")
+
+        for receipt in parsed:
+            receipt_idx, receipt_date_str = receipt.index, receipt.date
+            if receipt.error == "no_date":
+                self.log(f"  Пропусната бележка #{receipt_idx} - не може да се извлече дата")
+                continue
+            if receipt.error == "bad_date":
+                self.log(f"  Пропусната бележка #{receipt_idx} - невалидна дата")
+                continue
+
+            is_new = receipt.receipt_hash not in stored
+            if is_new:
+                stored[receipt.receipt_hash] = receipt.receipt_hash
+                new_receipts.append((
+                    receipt.receipt_hash, str(file_path), receipt_date_str, receipt.timestamp,
+                    receipt.store, receipt.total, receipt.currency, len(receipt.items),
+                ))
+            file_receipts.append(stored[receipt.receipt_hash])
+
+            for line_no, item in enumerate(receipt.items, 1):
+                product_name = item.product_name
+                if item.unit == "€":
+                    self.products_units.setdefault(product_name, item.unit)
+                elif item.unit:
+                    self.products_units[product_name] = item.unit
+
+                products_data[product_name][receipt_date_str] = item.price
+                if is_new:
+                    unit = self.products_units.get(product_name, "€")
+                    observations.append((product_name, receipt_date_str, item.price, unit, "receipt", str(file_path)))
+                    new_items.append((
+                        line_no, product_name, unit, item.quantity, item.unit_price, item.amount,
+                        item.discount, item.price, receipt.receipt_hash,
+                    ))
+
+            if receipt.items:
+                self.log(f"    Бележка #{receipt_idx} ({receipt_date_str}): {len(receipt.items)} артикула")
+
+        self._store_ingestion(observations, new_receipts, new_items, fingerprint, (len(parsed), file_receipts))
+        self.log(f"  Нови бележки в базата: {len(new_receipts)}")
         self.log(f"  От този файл: {len(products_data)} уникални артикула")
         return products_data
 
-    def _parse_receipt_date(self, receipt: str) -> Optional[str]:
+    def _stored_receipt_hashes(self, receipts: list) -> dict:
+        """Връща {receipt_hash: хеш в receipts} за бележките, които вече са записани.
+
+        Бележките от по-стари бази са записани с хеш само на тялото – те се
+        разпознават по body_hash и същата дата.
+        """
+        stored = {}
+        unique = list(dict.fromkeys(
+            value for receipt in receipts for value in (receipt.receipt_hash, receipt.body_hash) if value
+        ))
+        try:
+            for start in range(0, len(unique), SQL_BATCH_SIZE):
+                batch = unique[start:start + SQL_BATCH_SIZE]
+                rows = self._conn.execute(
+                    "SELECT receipt_hash, date FROM receipts WHERE receipt_hash IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                stored.update((row[0], row[1]) for row in rows)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+        found = {}
+        for receipt in receipts:
+            if receipt.receipt_hash in stored:
+                found[receipt.receipt_hash] = receipt.receipt_hash
+            elif receipt.body_hash in stored and stored[receipt.body_hash] == receipt.date:
+                found[receipt.receipt_hash] = receipt.body_hash
+        return found
+
+    def _store_ingestion(
+        self, observations: list, new_receipts: list, new_items: list, fingerprint, file_receipts,
+    ) -> None:
+        """Записва цените, бележките с артикулите и отпечатъка на файла в една транзакция.
+
+        Артикулите се свързват с цената в prices по (продукт, дата на бележката, единица).
+        file_receipts е (брой бележки, [receipt_hash в реда им във файла]) или
+        None, ако само mtime на файла се обновява.
+        """
+        try:
+            skipped = self.db.write(
+                self._write_ingestion, observations, new_receipts, new_items, fingerprint, file_receipts
+            )
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при запис в локалната база данни: {exc}")
+            return
+        self._log_skipped_prices(skipped)
+
+    def _write_ingestion(
+        self, conn, observations: list, new_receipts: list, new_items: list, fingerprint, file_receipts,
+    ) -> list:
+        """Транзакцията на _store_ingestion; връща пропуснатите цени с невалидна дата."""
+        _, skipped = self._upsert_prices(conn, observations)
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO receipts (
+                receipt_hash, receipt_file, date, timestamp, store, total, currency, item_count
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            new_receipts,
+        )
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO line_items (
+                receipt_id, line_no, product_name, unit, quantity, unit_price, amount, discount, price
+            )
+            SELECT r.id, ?, ?, ?, ?, ?, ?, ?, ?
+            FROM receipts r
+            WHERE r.receipt_hash = ?
+            """,
+            new_items,
+        )
+        if fingerprint is None:
+            return skipped
+        path, size, mtime_ns, content_hash = fingerprint
+        if file_receipts is None:
+            conn.execute(
+                "UPDATE ingested_files SET size = ?, mtime_ns = ? WHERE path = ?",
+                (size, mtime_ns, path),
+            )
+            return skipped
+        receipt_count, receipt_hashes = file_receipts
+        conn.execute(
+            """
+            INSERT INTO ingested_files (path, size, mtime_ns, content_hash, receipt_count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size,
+                mtime_ns = excluded.mtime_ns,
+                content_hash = excluded.content_hash,
+                receipt_count = excluded.receipt_count,
+                ingested_at = CURRENT_TIMESTAMP
+            """,
+            (path, size, mtime_ns, content_hash, receipt_count),
+        )
+        conn.execute("DELETE FROM ingested_receipts WHERE path = ?", (path,))
+        conn.executemany(
+            """
+            INSERT INTO ingested_receipts (path, position, receipt_id)
+            SELECT ?, ?, id FROM receipts WHERE receipt_hash = ?
+            """,
+            [(path, position, receipt_hash) for position, receipt_hash in enumerate(receipt_hashes)],
+        )
+        return skipped
+
+    @staticmethod
+    def _parse_receipt_date(receipt: str) -> Optional[str]:
         """Извлича датата на бележката в ISO формат от различни източници."""
         header = re.search(r"Дата:\s*(\d{4})-(\d{2})-(\d{2})", receipt)
         if header:
@@ -495,7 +1286,21 @@ class ReceiptAnalyzer:
                 return f"{year}-{month_num}-{day}"
         return None
 
-    def extract_weight_from_name(self, product_name: str):
+    def _describe_product(self, product_name: str) -> tuple:
+        """Изчислява записа за каталога: (canonical_name, weight_kg, unit_basis, category)."""
+        weight_kg, unit_label = self.extract_weight_from_name(product_name)
+        category = self.classify_product(product_name)
+        return self.normalize_product_name(product_name), weight_kg, unit_label or "€", category
+
+    @staticmethod
+    @lru_cache(maxsize=PRODUCT_NAME_CACHE_SIZE)
+    def classify_product(product_name: str) -> Optional[str]:
+        """Връща категорията на продукта (ключ от CATEGORY_LABELS) или None."""
+        return PRODUCT_CLASSIFIER.classify(product_name)
+
+    @staticmethod
+    @lru_cache(maxsize=PRODUCT_NAME_CACHE_SIZE)
+    def extract_weight_from_name(product_name: str):
         """Извлича теглото от името на продукта. Връща (weight_kg, unit_label) или (None, None)."""
         upper = product_name.upper()
         weight_kg = None
@@ -541,14 +1346,14 @@ class ReceiptAnalyzer:
         unit_label = "€/100г" if weight_kg < 0.5 else "€/кг"
         return weight_kg, unit_label
 
-    def is_fruit_or_vegetable(self, product_name: str) -> bool:
+    @staticmethod
+    @lru_cache(maxsize=PRODUCT_NAME_CACHE_SIZE)
+    def is_fruit_or_vegetable(product_name: str) -> bool:
         """Проверява дали продуктът е плод или зеленчук."""
-        upper_name = product_name.upper()
-        if any(excl in upper_name for excl in FV_EXCLUDE_KEYWORDS):
-            return False
-        return any(keyword in upper_name for keyword in FRUITS_VEGETABLES_KEYWORDS)
+        return PRODUCT_CLASSIFIER.matches("fruit_veg", product_name)
 
     @staticmethod
+    @lru_cache(maxsize=PRODUCT_NAME_CACHE_SIZE)
     def normalize_product_name(product_name: str) -> str:
         """Канонично име на продукта без падеж, грамаж, размер и типични маркови суфикси."""
         name = re.sub(r"\s+", " ", product_name.strip().upper()).strip(" -.")
@@ -599,36 +1404,71 @@ class ReceiptAnalyzer:
             return price / weight_kg
         return price
 
-    def compare_years(self, products_data: dict) -> list:
+    def build_price_matrix(self, products_data) -> PriceMatrix:
+        """PriceMatrix от {product: {date: price}} с единиците от анализа; готова матрица се връща както е."""
+        if isinstance(products_data, PriceMatrix):
+            return products_data
+        return PriceMatrix.from_dict(products_data, self.products_units)
+
+    def cluster_products(self, threshold: Optional[float] = None) -> int:
+        """Групира сходни имена в каталога (MinHash/LSH) и записва cluster_id в базата."""
+        try:
+            merged = self.catalog.update_clusters(threshold)
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при групиране на продукти: {exc}")
+            return 0
+        self.log(f"Групи от сходни имена на продукти: {merged}")
+        return merged
+
+    def compare_years(self, products_data: Optional[dict] = None, group_by: str = "canonical") -> list:
         """Сравнява средни цени за 2025 срещу 2026 само на съпоставими артикули.
 
         Артикулите се групират по канонично име, за да се обединят варианти като
         „Кашкавал Вианга“ и „Кашкавал“, както и различни грамажи на един и същ продукт.
+        При group_by="cluster" се групират по cluster_id от cluster_products, което
+        обединява и различни изписвания на едно и също име.
         Ако за един артикул има както тегловни, така и пакетни данни, се взимат само
         данните, които са сравними между годините (в повечето случаи €/кг).
+        Без products_data се сравнява цялата база по годишните агрегати
+        (yearly_prices), без да се четат отделните цени; иначе годишните суми
+        се смятат от PriceMatrix (products_data може да е и готова матрица).
         """
-        yearly: dict = defaultdict(lambda: defaultdict(list))
+        if products_data is None:
+            year_totals = self._yearly_totals(("2025", "2026"))
+            catalog = self.catalog.get_many(name for name, _ in year_totals)
+        else:
+            matrix = self.build_price_matrix(products_data)
+            catalog = self.catalog.get_many(matrix.names)
+            years, counts, sums = matrix.yearly_totals()
+            wanted = [(str(year), column) for column, year in enumerate(years) if year in (2025, 2026)]
+            year_totals = {}
+            for row, name in enumerate(matrix.names):
+                unit = matrix.units[row] or ("€/кг" if catalog[name].weight_kg else "€")
+                year_totals[(name, unit)] = {
+                    year: (int(counts[row, column]), float(sums[row, column]))
+                    for year, column in wanted
+                    if counts[row, column]
+                }
+
+        yearly: dict = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
         display_names: dict = {}
         basis_by_key: dict = {}
 
+        cluster_labels = self.catalog.cluster_labels() if group_by == "cluster" else {}
         grouped = defaultdict(list)
-        for name, dates_prices in products_data.items():
-            canonical = self.normalize_product_name(name)
-            grouped[canonical].append((name, dates_prices))
+        for (name, unit), years in year_totals.items():
+            info = catalog[name]
+            canonical = cluster_labels.get(info.cluster_id, info.canonical_name)
+            grouped[canonical].append((name, unit, years))
 
         for canonical, variants in grouped.items():
             display_names[canonical] = canonical
-            has_weight_data = False
-            for name, _ in variants:
-                weight_kg, _ = self.extract_weight_from_name(name)
-                unit = self.products_units.get(name, "€/кг" if weight_kg else "€")
-                if weight_kg or unit in ("€/кг", "€/100г"):
-                    has_weight_data = True
-                    break
+            has_weight_data = any(
+                catalog[name].weight_kg or unit in ("€/кг", "€/100г") for name, unit, _ in variants
+            )
 
-            for name, dates_prices in variants:
-                weight_kg, _ = self.extract_weight_from_name(name)
-                unit = self.products_units.get(name, "€/кг" if weight_kg else "€")
+            for name, unit, years in variants:
+                weight_kg = catalog[name].weight_kg
                 basis = "kg" if weight_kg or unit in ("€/кг", "€/100г") else "package"
                 basis_by_key.setdefault(canonical, basis)
                 if not has_weight_data and basis == "package":
@@ -636,26 +1476,22 @@ class ReceiptAnalyzer:
                 elif has_weight_data and basis == "kg":
                     basis_by_key[canonical] = "kg"
 
-                for date_str, price in dates_prices.items():
-                    year = date_str[:4]
-                    if year not in ("2025", "2026"):
-                        continue
-
-                    if has_weight_data and basis == "package":
-                        continue
+                if has_weight_data and basis == "package":
+                    continue
 
-                    if basis == "kg":
-                        value = self.to_per_kg_price(price, unit, weight_kg)
-                    else:
-                        value = price
-                    yearly[canonical][year].append(value)
+                # Привеждането към €/кг е линейно, затова се прилага директно върху сумата
+                factor = self.to_per_kg_price(1.0, unit, weight_kg) if basis == "kg" else 1.0
+                for year, (count, total) in years.items():
+                    accumulated = yearly[canonical][year]
+                    accumulated[0] += count
+                    accumulated[1] += total * factor
 
         rows = []
         for key, years in yearly.items():
-            if "2025" not in years or "2026" not in years:
+            if not years["2025"][0] or not years["2026"][0]:
                 continue
-            avg_2025 = sum(years["2025"]) / len(years["2025"])
-            avg_2026 = sum(years["2026"]) / len(years["2026"])
+            avg_2025 = years["2025"][1] / years["2025"][0]
+            avg_2026 = years["2026"][1] / years["2026"][0]
             if avg_2025 <= 0:
                 continue
 
@@ -663,8 +1499,8 @@ class ReceiptAnalyzer:
                 {
                     "product": display_names.get(key, key),
                     "basis": "€/кг" if basis_by_key.get(key) == "kg" else "€/пакет",
-                    "measurements_2025": len(years["2025"]),
-                    "measurements_2026": len(years["2026"]),
+                    "measurements_2025": years["2025"][0],
+                    "measurements_2026": years["2026"][0],
                     "avg_2025": avg_2025,
                     "avg_2026": avg_2026,
                     "change_pct": (avg_2026 - avg_2025) / avg_2025 * 100,
@@ -674,6 +1510,135 @@ class ReceiptAnalyzer:
         rows.sort(key=lambda r: abs(r["change_pct"]), reverse=True)
         return rows
 
+    def _yearly_totals(self, years) -> dict:
+        """{(product_name, unit): {year: (брой, сума)}} от yearly_prices за дадените години."""
+        totals: dict = defaultdict(dict)
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT p.raw_name, u.name, y.period, y.n, y.total
+                FROM yearly_prices y
+                JOIN products p ON p.id = y.product_id
+                JOIN units u ON u.id = y.unit_id
+                WHERE y.period IN ({','.join('?' * len(years))})
+                """,
+                [int(year) for year in years],
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return {}
+        for name, unit, period, count, total in rows:
+            totals[(name, unit)][str(period)] = (count, total)
+        return dict(totals)
+
+    def get_period_stats(
+        self, granularity: str = "month", start: Optional[int] = None, end: Optional[int] = None,
+    ) -> list:
+        """Статистика по продукт, единица и период от агрегатите в базата.
+
+        granularity е "month" (период YYYYMM) или "year" (период YYYY); start и
+        end ограничават периодите (включително).
+        """
+        table = {"month": "monthly_prices", "year": "yearly_prices"}[granularity]
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT p.raw_name, u.name, a.period, a.n, a.total, a.total_sq, a.min_price, a.max_price
+                FROM {table} a
+                JOIN products p ON p.id = a.product_id
+                JOIN units u ON u.id = a.unit_id
+                WHERE a.period BETWEEN ? AND ?
+                ORDER BY p.raw_name, u.name, a.period
+                """,
+                (start if start is not None else 0, end if end is not None else 999999),
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return []
+
+        stats = []
+        for name, unit, period, count, total, total_sq, min_price, max_price in rows:
+            avg = total / count
+            stats.append(
+                {
+                    "product_name": name,
+                    "unit": unit,
+                    "period": period,
+                    "count": count,
+                    "avg": avg,
+                    "min": min_price,
+                    "max": max_price,
+                    "stddev": max(total_sq / count - avg * avg, 0.0) ** 0.5,
+                }
+            )
+        return stats
+
+    def get_seasonal_summary(self) -> list:
+        """Средна цена през сезона (SUMMER_MONTHS) и извън него по продукт от месечните агрегати."""
+        months = ",".join(str(month) for month in sorted(SUMMER_MONTHS))
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT p.raw_name, u.name,
+                       SUM(CASE WHEN m.period % 100 IN ({months}) THEN m.total END),
+                       SUM(CASE WHEN m.period % 100 IN ({months}) THEN m.n END),
+                       SUM(CASE WHEN m.period % 100 NOT IN ({months}) THEN m.total END),
+                       SUM(CASE WHEN m.period % 100 NOT IN ({months}) THEN m.n END)
+                FROM monthly_prices m
+                JOIN products p ON p.id = m.product_id
+                JOIN units u ON u.id = m.unit_id
+                GROUP BY m.product_id, m.unit_id
+                ORDER BY p.raw_name, u.name
+                """
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return []
+
+        summary = []
+        for name, unit, summer_total, summer_n, off_total, off_n in rows:
+            avg_summer = summer_total / summer_n if summer_n else None
+            avg_off = off_total / off_n if off_n else None
+            diff_pct = (avg_summer - avg_off) / avg_off * 100 if avg_summer is not None and avg_off else None
+            summary.append(
+                {"name": name, "unit": unit, "avg_summer": avg_summer, "avg_off": avg_off, "diff_pct": diff_pct}
+            )
+        return summary
+
+    def get_top_movers(self, start: int, end: int, granularity: str = "year", limit: int = 20) -> list:
+        """Продуктите с най-голяма промяна на средната цена между два периода (напр. 2025 → 2026)."""
+        table = {"month": "monthly_prices", "year": "yearly_prices"}[granularity]
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT p.raw_name, u.name, a.total / a.n, b.total / b.n, a.n, b.n
+                FROM {table} a
+                JOIN {table} b ON b.product_id = a.product_id AND b.unit_id = a.unit_id AND b.period = ?
+                JOIN products p ON p.id = a.product_id
+                JOIN units u ON u.id = a.unit_id
+                WHERE a.period = ? AND a.total > 0
+                ORDER BY ABS((b.total / b.n) / (a.total / a.n) - 1) DESC, p.raw_name
+                LIMIT ?
+                """,
+                (end, start, limit),
+            ).fetchall()
+        except Exception as exc:  # pragma: no cover - safety fallback
+            self.log(f"Грешка при четене от локалната база данни: {exc}")
+            return []
+
+        return [
+            {
+                "product_name": name,
+                "unit": unit,
+                "avg_start": avg_start,
+                "avg_end": avg_end,
+                "count_start": count_start,
+                "count_end": count_end,
+                "change_pct": (avg_end - avg_start) / avg_start * 100,
+            }
+            for name, unit, avg_start, avg_end, count_start, count_end in rows
+        ]
+
     def generate_years_html(self, rows: list, output_file: str) -> None:
         """HTML отчет: дивергираща графика + таблица с търсене и сортиране."""
         total = len(rows)
@@ -690,9 +1655,6 @@ class ReceiptAnalyzer:
         top_up = max(rows, key=lambda r: r["change_pct"])
         top_dn = min(rows, key=lambda r: r["change_pct"])
 
-        def fmt_price(p):
-            return f"{p:.2f} €"
-
         def diff_cell(d):
             if d is None:
                 return "–", "#888"
@@ -700,24 +1662,24 @@ class ReceiptAnalyzer:
             sign = "+" if d > 0 else ""
             return f"{sign}{d:.1f}%", color
 
-        table_rows = ""
-        for idx, row in enumerate(rows, 1):
-            diff_text, diff_color = diff_cell(row["change_pct"])
-            low_conf = row["measurements_2025"] == 1 and row["measurements_2026"] == 1
-            opacity = "opacity:0.65;" if low_conf else ""
-            row_bg = "#fff8f8" if row["change_pct"] > 0 else ("#f3fff3" if row["change_pct"] < 0 else "#f9f9f9")
-            conf_badge = '<span title="Само по 1 измерване" style="color:#aaa;font-size:10px"> ⚠</span>' if low_conf else ""
-            table_rows += f'''
-            <tr style="background:{row_bg};{opacity}">
-              <td style="text-align:center">{idx}</td>
-              <td>{row["product"]}{conf_badge}</td>
-              <td style="text-align:center;color:#666">{row["basis"]}</td>
-              <td style="text-align:right">{fmt_price(row["avg_2025"])}</td>
-              <td style="text-align:right">{fmt_price(row["avg_2026"])}</td>
-              <td style="text-align:center;font-weight:bold;color:{diff_color}">{diff_text}</td>
-              <td style="text-align:center;color:#999">{row["measurements_2025"]}</td>
-              <td style="text-align:center;color:#999">{row["measurements_2026"]}</td>
-            </tr>'''
+        def row_values():
+            for idx, row in enumerate(rows, 1):
+                diff_text, diff_color = diff_cell(row["change_pct"])
+                low_conf = row["measurements_2025"] == 1 and row["measurements_2026"] == 1
+                yield {
+                    "idx": idx,
+                    "row_bg": "#fff8f8" if row["change_pct"] > 0 else ("#f3fff3" if row["change_pct"] < 0 else "#f9f9f9"),
+                    "opacity": "opacity:0.65;" if low_conf else "",
+                    "product": row["product"],
+                    "conf_badge": '<span title="Само по 1 измерване" style="color:#aaa;font-size:10px"> ⚠</span>' if low_conf else "",
+                    "basis": row["basis"],
+                    "avg_2025": row["avg_2025"],
+                    "avg_2026": row["avg_2026"],
+                    "diff_text": diff_text,
+                    "diff_color": diff_color,
+                    "measurements_2025": row["measurements_2025"],
+                    "measurements_2026": row["measurements_2026"],
+                }
 
         chart_data = [
             {
@@ -733,356 +1695,185 @@ class ReceiptAnalyzer:
         ]
         chart_json = json.dumps(chart_data, ensure_ascii=False)
 
-        html = f'''<!DOCTYPE html>
-<html lang="bg">
-<head>
-  <meta charset="utf-8">
-  <title>Lidl – Сравнение 2025/2026</title>
-  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-  <style>
-    *{{ box-sizing:border-box; }}
-    body{{ font-family:'Segoe UI',Arial,sans-serif; margin:0; padding:16px 20px; background:#f4f6f9; color:#1e293b; }}
-    h1{{ margin:0 0 4px; font-size:20px; color:#1e3a5f; }}
-    .sub{{ color:#64748b; font-size:13px; margin-bottom:14px; }}
-    .kpi-row{{ display:flex; gap:12px; flex-wrap:wrap; margin-bottom:16px; }}
-    .kpi{{ background:white; border-radius:10px; padding:12px 18px; flex:1; min-width:140px;
-            box-shadow:0 1px 4px rgba(0,0,0,.08); border-left:4px solid #cbd5e1; }}
-    .kpi.up{{ border-color:#d64541; }}
-    .kpi.dn{{ border-color:#22c55e; }}
-    .kpi.neutral{{ border-color:#3b82f6; }}
-    .kpi .val{{ font-size:22px; font-weight:700; line-height:1.1; }}
-    .kpi .lbl{{ font-size:11px; color:#64748b; margin-top:2px; }}
-    .card{{ background:white; border-radius:10px; padding:16px; box-shadow:0 1px 4px rgba(0,0,0,.08); margin-bottom:16px; }}
-    .toggle-row{{ display:flex; gap:8px; align-items:center; margin-bottom:10px; flex-wrap:wrap; }}
-    button{{ padding:6px 14px; border:1px solid #cbd5e1; border-radius:6px; cursor:pointer;
-             background:white; color:#334155; font-size:12px; transition:all .15s; }}
-    button.active, button:hover{{ background:#1e3a5f; color:white; border-color:#1e3a5f; }}
-    input#search{{ padding:6px 12px; border:1px solid #cbd5e1; border-radius:6px;
-                   font-size:12px; width:220px; outline:none; }}
-    table{{ width:100%; border-collapse:collapse; font-size:12px; }}
-    thead tr{{ background:#1e3a5f; color:white; }}
-    th{{ padding:9px 8px; border:1px solid #2d5080; cursor:pointer; user-select:none; white-space:nowrap; }}
-    th:hover{{ background:#2b5aa0; }}
-    td{{ border:1px solid #e2e8f0; padding:7px 8px; }}
-    .note{{ font-size:11px; color:#94a3b8; margin-top:8px; }}
-  </style>
-</head>
-<body>
-  <h1>Сравнение на цени Lidl: 2025 → 2026</h1>
-  <div class="sub">Сортирано по абсолютна промяна &nbsp;|&nbsp; ⚠ = само по 1 измерване (по-малко надеждно)</div>
-
-  <div class="kpi-row">
-    <div class="kpi neutral">
-      <div class="val">{total}</div>
-      <div class="lbl">сравнени артикула</div>
-    </div>
-    <div class="kpi up">
-      <div class="val">{avg_sign}{avg_change:.1f}%</div>
-      <div class="lbl" style="color:{avg_color}">средна промяна</div>
-    </div>
-    <div class="kpi up">
-      <div class="val">{increased}</div>
-      <div class="lbl">поскъпнали</div>
-    </div>
-    <div class="kpi dn">
-      <div class="val">{decreased}</div>
-      <div class="lbl">поевтинели</div>
-    </div>
-    <div class="kpi up">
-      <div class="val" title="{top_up["product"]}" style="font-size:14px;color:#d64541">+{top_up["change_pct"]:.1f}%</div>
-      <div class="lbl">най-голямо поскъпване: {self.shorten_product_label(top_up["product"], 22)}</div>
-    </div>
-    <div class="kpi dn">
-      <div class="val" title="{top_dn["product"]}" style="font-size:14px;color:#22c55e">{top_dn["change_pct"]:.1f}%</div>
-      <div class="lbl">най-голямо поевтиняване: {self.shorten_product_label(top_dn["product"], 22)}</div>
-    </div>
-  </div>
-
-  <div class="card">
-    <div class="toggle-row">
-      <button class="active" onclick="showChart('diverging')">% Промяна</button>
-      <button onclick="showChart('grouped')">2025 vs 2026</button>
-      <button id="btnTop" class="active" onclick="toggleTop()">Топ 20</button>
-      <button id="btnAll" onclick="toggleTop()">Всички ({total})</button>
-    </div>
-    <div id="chart"></div>
-  </div>
-
-  <div class="card">
-    <div class="toggle-row">
-      <input id="search" type="text" placeholder="Търси артикул…" oninput="filterTable()">
-      <label style="font-size:12px;color:#64748b;margin-left:8px">
-        <input type="checkbox" id="hideWeak" onchange="filterTable()"> Скрий ниско-надеждни
-      </label>
-      <span id="count" style="margin-left:auto;font-size:12px;color:#94a3b8"></span>
-    </div>
-    <table id="tbl">
-      <thead>
-        <tr>
-          <th onclick="sortTable(0)">#</th>
-          <th onclick="sortTable(1)">Артикул ↕</th>
-          <th onclick="sortTable(2)">Единица</th>
-          <th onclick="sortTable(3)">Ср. 2025 ↕</th>
-          <th onclick="sortTable(4)">Ср. 2026 ↕</th>
-          <th onclick="sortTable(5)">Промяна % ↕</th>
-          <th onclick="sortTable(6)">Изм. 2025</th>
-          <th onclick="sortTable(7)">Изм. 2026</th>
-        </tr>
-      </thead>
-      <tbody id="tbody">{table_rows}</tbody>
-    </table>
-    <div class="note">Промяната е изчислена спрямо средна цена за годината. Продукти с 1 измерване са маркирани ⚠.</div>
-  </div>
-
-  <script>
-    var ALL = {chart_json};
-    var showTop = true;
-    var chartMode = 'diverging';
-
-    var cfg = {{
-        responsive: true, displaylogo: false,
-        toImageButtonOptions: {{ format:'png', filename:'lidl_2025_2026', scale:2 }}
-    }};
-
-    function buildDiverging(data) {{
-        var labels = data.map(r => r.label);
-        var vals   = data.map(r => r.change_pct);
-        var colors = vals.map(v => v > 0 ? (v > 20 ? '#b91c1c' : '#e87070') : (v < -20 ? '#15803d' : '#4ade80'));
-        var custom = data.map(r => [r.product, r.avg_2025, r.avg_2026, r.basis]);
-        return [{{
-            type:'bar', orientation:'h',
-            y: labels, x: vals,
-            marker:{{ color: colors }},
-            customdata: custom,
-            hovertemplate:'<b>%{{customdata[0]}}</b><br>Промяна: <b>%{{x:+.1f}}%</b><br>2025: %{{customdata[1]:.2f}} € &nbsp; 2026: %{{customdata[2]:.2f}} €<br>Единица: %{{customdata[3]}}<extra></extra>'
-        }}];
-    }}
-
-    function buildGrouped(data) {{
-        var labels = data.map(r => r.label);
-        var custom = data.map(r => r.product);
-        return [
-            {{ type:'bar', name:'2025', orientation:'h', y:labels, x:data.map(r=>r.avg_2025),
-               marker:{{color:'#7fb3d3'}}, customdata:custom,
-               hovertemplate:'<b>%{{customdata}}</b><br>2025: € %{{x:.2f}}<extra></extra>' }},
-            {{ type:'bar', name:'2026', orientation:'h', y:labels, x:data.map(r=>r.avg_2026),
-               marker:{{color:'#f0a500'}}, customdata:custom,
-               hovertemplate:'<b>%{{customdata}}</b><br>2026: € %{{x:.2f}}<extra></extra>' }}
-        ];
-    }}
-
-    function drawChart() {{
-        var data = showTop ? ALL.slice(0,20) : ALL;
-        data = data.slice().reverse();   // най-голяма промяна отгоре
-        var traces, layout;
-
-        if (chartMode === 'diverging') {{
-            traces = buildDiverging(data);
-            var maxAbs = Math.max(0.1, ...data.map(r => Math.abs(r.change_pct)));
-            layout = {{
-                title: {{ text: 'Промяна в цената (%) 2025 → 2026', x:0.5, xanchor:'center', font:{{size:15}} }},
-                template:'plotly_white',
-                height: Math.max(380, data.length * 34 + 180),
-                xaxis: {{ title:'% промяна', zeroline:true, zerolinecolor:'#94a3b8', zerolinewidth:2,
-                          gridcolor:'#e2e8f0', range:[-maxAbs*1.25, maxAbs*1.35] }},
-                yaxis: {{ gridcolor:'#e2e8f0', automargin:true, tickfont:{{size:10}} }},
-                margin: {{ l:20, r:60, t:60, b:50 }},
-                bargap: 0.18
-            }};
-        }} else {{
-            traces = buildGrouped(data);
-            layout = {{
-                title: {{ text: 'Средна цена 2025 vs 2026', x:0.5, xanchor:'center', font:{{size:15}} }},
-                template:'plotly_white', barmode:'group',
-                height: Math.max(380, data.length * 48 + 200),
-                xaxis: {{ title:'Цена (€)', zeroline:false, gridcolor:'#e2e8f0' }},
-                yaxis: {{ gridcolor:'#e2e8f0', automargin:true, tickfont:{{size:10}} }},
-                margin: {{ l:20, r:40, t:60, b:50 }},
-                legend: {{ orientation:'h', x:0.5, xanchor:'center', y:1.08 }},
-                bargap: 0.2
-            }};
-        }}
-        Plotly.react('chart', traces, layout, cfg);
-    }}
-
-    function showChart(mode) {{
-        chartMode = mode;
-        document.querySelectorAll('.toggle-row button').forEach(b => {{
-            if (b.textContent.startsWith('% ') || b.textContent.startsWith('2025')) b.classList.remove('active');
-        }});
-        event.target.classList.add('active');
-        drawChart();
-    }}
-
-    function toggleTop() {{
-        showTop = !showTop;
-        document.getElementById('btnTop').classList.toggle('active', showTop);
-        document.getElementById('btnAll').classList.toggle('active', !showTop);
-        drawChart();
-    }}
-
-    drawChart();
-
-    // ── table filter & sort ─────────────────────────────────────────────────
-    var sortDir = {{}};
-    function filterTable() {{
-        var q = document.getElementById('search').value.toLowerCase();
-        var hideWeak = document.getElementById('hideWeak').checked;
-        var rows = document.querySelectorAll('#tbody tr');
-        var vis = 0;
-        rows.forEach(function(tr) {{
-            var txt = tr.cells[1].textContent.toLowerCase();
-            var weak = tr.cells[1].textContent.includes('⚠');
-            var show = txt.includes(q) && !(hideWeak && weak);
-            tr.style.display = show ? '' : 'none';
-            if (show) vis++;
-        }});
-        document.getElementById('count').textContent = vis + ' / ' + rows.length + ' артикула';
-    }}
-    filterTable();
-
-    function sortTable(col) {{
-        var tbody = document.getElementById('tbody');
-        var rows = Array.from(tbody.querySelectorAll('tr'));
-        sortDir[col] = !sortDir[col];
-        rows.sort(function(a, b) {{
-            var va = a.cells[col].textContent.trim();
-            var vb = b.cells[col].textContent.trim();
-            var na = parseFloat(va.replace(/[^\\d.\\-+]/g,''));
-            var nb = parseFloat(vb.replace(/[^\\d.\\-+]/g,''));
-            if (!isNaN(na) && !isNaN(nb)) return sortDir[col] ? na-nb : nb-na;
-            return sortDir[col] ? va.localeCompare(vb,'bg') : vb.localeCompare(va,'bg');
-        }});
-        rows.forEach(r => tbody.appendChild(r));
-    }}
-  </script>
-</body>
-</html>'''
-
-        Path(output_file).write_text(html, encoding="utf-8")
-        self.log(f"Сравнение 2025/2026 запазено: {output_file}")
-
-    def generate_xlsx(self, products_data: dict, source_file: str) -> str:
-        """Генерира XLSX файл с история на цените и връща пътя до него."""
-        import openpyxl
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from openpyxl.utils import get_column_letter
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Price History"
-
-        all_dates = set()
-        for dates_prices in products_data.values():
-            all_dates.update(dates_prices.keys())
-        sorted_dates = sorted(all_dates)
-
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, size=12, color="FFFFFF")
-        thin_border = Border(
-            left=Side(style="thin"), right=Side(style="thin"),
-            top=Side(style="thin"), bottom=Side(style="thin"),
+        YEARS_PAGE.write(
+            output_file,
+            table_rows=YEARS_ROW.render_rows(row_values()),
+            chart_json=chart_json,
+            total=total,
+            increased=increased,
+            decreased=decreased,
+            avg_change=avg_change,
+            avg_color=avg_color,
+            avg_sign=avg_sign,
+            top_up_product=top_up["product"],
+            top_up_change=top_up["change_pct"],
+            top_up_label=self.shorten_product_label(top_up["product"], 22),
+            top_dn_product=top_dn["product"],
+            top_dn_change=top_dn["change_pct"],
+            top_dn_label=self.shorten_product_label(top_dn["product"], 22),
         )
+        self.log(f"Сравнение 2025/2026 запазено: {output_file}")
 
-        ws["A1"] = "Артикул"
-        ws["B1"] = "Единица"
-        for cell in (ws["A1"], ws["B1"]):
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(vertical="center")
-        ws["A1"].alignment = Alignment(horizontal="left", vertical="center")
-        ws["B1"].alignment = Alignment(horizontal="center", vertical="center")
-
-        for idx, date_str in enumerate(sorted_dates, start=3):
-            col_letter = get_column_letter(idx)
-            formatted = datetime.strptime(date_str, "%Y-%m-%d").strftime("%d.%m.%Y")
-            ws[f"{col_letter}1"] = formatted
-            ws[f"{col_letter}1"].font = header_font
-            ws[f"{col_letter}1"].fill = header_fill
-            ws[f"{col_letter}1"].alignment = Alignment(horizontal="center", vertical="center")
-
-        row_idx = 2
-        for product_name in sorted(products_data.keys()):
-            ws[f"A{row_idx}"] = product_name
-            ws[f"B{row_idx}"] = self.products_units.get(product_name, "€")
-            for cell in (ws[f"A{row_idx}"], ws[f"B{row_idx}"]):
-                cell.alignment = Alignment(vertical="center")
-            ws[f"B{row_idx}"].alignment = Alignment(horizontal="center", vertical="center")
-
-            for col_idx, date_str in enumerate(sorted_dates, start=3):
-                if date_str in products_data[product_name]:
-                    col_letter = get_column_letter(col_idx)
-                    cell = ws[f"{col_letter}{row_idx}"]
-                    cell.value = products_data[product_name][date_str]
-                    cell.number_format = "[$€-407] #,##0.00"
-                    cell.alignment = Alignment(horizontal="right", vertical="center")
-
-            for col_idx in range(1, len(sorted_dates) + 3):
-                ws.cell(row=row_idx, column=col_idx).border = thin_border
-            row_idx += 1
-
-        ws.column_dimensions["A"].width = 50
-        ws.column_dimensions["B"].width = 12
-        for col_idx in range(3, len(sorted_dates) + 3):
-            ws.column_dimensions[get_column_letter(col_idx)].width = 15
-
-        for cell in ws[1]:
-            cell.border = thin_border
-
-        ws.freeze_panes = "C2"
+    def generate_xlsx(self, products_data, source_file: str, layout: str = "wide") -> str:
+        """Генерира XLSX файл с история на цените и връща пътя до него.
 
+        products_data е {product: {date: price}} или PriceMatrix; редовете се
+        записват поточно с именувани стилове (виж price_xlsx), а layout="long"
+        дава лист с ред на наблюдение вместо ред на продукт.
+        """
+        matrix = self.build_price_matrix(products_data)
         output_file = Path(source_file).with_name(Path(source_file).stem + "_price_analysis.xlsx")
-        wb.save(output_file)
+        write_price_xlsx(matrix, output_file, layout=layout)
         self.log(f"\nXLSX файлът е създаден успешно: {output_file}")
         return str(output_file)
 
-    def generate_chart(self, xlsx_file: str) -> Optional[str]:
-        """Генерира интерактивна HTML и статична PNG графика от XLSX файла."""
-        from openpyxl import load_workbook
-
-        wb = load_workbook(xlsx_file)
-        ws = wb.active
-
-        dates = []
-        for col in range(3, ws.max_column + 1):
-            date_str = ws.cell(row=1, column=col).value
-            if date_str:
-                try:
-                    dates.append(datetime.strptime(date_str, "%d.%m.%Y"))
-                except (ValueError, TypeError):
-                    continue
+    def generate_reports(
+        self, products_data, base_file: str, output_dir: Optional[str] = None, max_workers: Optional[int] = None,
+        data_format: Optional[str] = None, years_group_by: str = "canonical",
+    ) -> dict:
+        """Генерира всички отчети на анализа паралелно (виж report_pipeline).
+
+        XLSX и интерактивната графика са за продуктите с повече от 1 цена и се
+        записват до base_file; сезонният отчет, сравнението 2025/2026 и
+        началната страница – в output_dir (по подразбиране папката на base_file).
+        data_format изнася данните на графиките в шардове (виж chart_data).
+        Сравнението 2025/2026 е само за продуктите от products_data;
+        years_group_by="cluster" използва вече записаните групи – групирането
+        (cluster_products) е отделно действие и тук не се пуска.
+        Връща пътищата (None за пропуснат или неуспешен отчет), броя на
+        артикулите във всеки отчет и времената на етапите.
+        """
+        matrix = self.build_price_matrix(products_data)
+        filtered = matrix.select(matrix.counts > 1)
+        catalog = self.catalog.get_many(matrix.names)
+        fv_data = matrix.select([catalog[name].category == "fruit_veg" for name in matrix.names])
+
+        stem = Path(base_file).stem
+        out_dir = Path(output_dir) if output_dir else Path(base_file).parent
+        base_name = Path(base_file).with_name(stem + "_price_analysis")
+        seasonal_file = str(out_dir / f"{stem}_seasonal_analysis.html")
+        years_file = str(out_dir / f"{stem}_years_comparison.html")
+        index_file = str(out_dir / f"{stem}_index.html")
+
+        def chart_html(chart_data):
+            return self._write_chart_html(chart_data, base_name, data_format) if chart_data else None
+
+        def seasonal_html():
+            if not fv_data:
+                self.log("Не са намерени плодове/зеленчуци за сезонен анализ")
+                return None
+            self.log(f"Генериране на сезонен анализ за {len(fv_data)} плода/зеленчука...")
+            self.generate_seasonal_html(fv_data, seasonal_file, data_format)
+            return seasonal_file
+
+        def years_rows():
+            return self.compare_years(matrix, group_by=years_group_by)
+
+        def years_html(rows):
+            if not rows:
+                self.log("Няма артикули с данни и за 2025, и за 2026")
+                return None
+            self.log(f"Генериране на сравнение 2025/2026 за {len(rows)} съпоставими артикула...")
+            self.generate_years_html(rows, years_file)
+            return years_file
+
+        def index_html(xlsx, chart, seasonal, years):
+            files_info = {"xlsx": xlsx, "chart": chart, "seasonal": seasonal, "years": years}
+            return self.generate_index_html(index_file, files_info)
+
+        xlsx_file = str(base_name) + ".xlsx"
+        stages = [
+            ReportStage("xlsx", write_price_xlsx, (filtered, xlsx_file), process=True),
+            ReportStage("chart_data", self._chart_products, (filtered,)),
+            ReportStage("chart", chart_html, inputs=("chart_data",)),
+            ReportStage("png", _chart_png_stage, (base_name,), inputs=("chart_data",), process=True),
+            ReportStage("seasonal", seasonal_html),
+            ReportStage("years_rows", years_rows),
+            ReportStage("years", years_html, inputs=("years_rows",)),
+            ReportStage("index", index_html, inputs=("xlsx", "chart", "seasonal", "years")),
+        ]
+        started = time.perf_counter()
+        results = run_stages(stages, max_workers=max_workers)
+        elapsed = time.perf_counter() - started
+
+        self.log(f"Отчетите са готови за {elapsed:.2f} с:")
+        for result in results.values():
+            if result.error is not None:
+                self.log(f"  {result.name}: грешка – {result.error}")
+            else:
+                self.log(f"  {result.name}: {result.seconds:.2f} с")
+
+        rows = results["years_rows"].value or []
+        return {
+            "xlsx": results["xlsx"].value,
+            "chart": results["chart"].value,
+            "png": results["png"].value,
+            "seasonal": results["seasonal"].value,
+            "years": results["years"].value,
+            "index": results["index"].value,
+            "products": len(filtered),
+            "fruit_veg": len(fv_data),
+            "years_rows": len(rows),
+            "timings": {name: result.seconds for name, result in results.items()},
+            "elapsed": elapsed,
+        }
+
+    def generate_chart(self, products_data, source_file: str) -> Optional[str]:
+        """Генерира интерактивна HTML и статична PNG графика направо от данните на анализа.
+
+        products_data е {product: {date: price}} или PriceMatrix (същите данни
+        като за generate_xlsx); файловете се казват като XLSX-а, но без
+        разширението (..._price_analysis_interactive_chart.html / _chart.png).
+        """
+        chart_data = self._chart_products(products_data)
+        if chart_data is None:
+            return None
+        base_name = Path(source_file).with_name(Path(source_file).stem + "_price_analysis")
+        html_file = self._write_chart_html(chart_data, base_name)
+        try:
+            _save_static_png(chart_data[1], base_name)
+            self.log(f"Статична PNG графика запазена: {base_name}_chart.png")
+        except Exception as e:
+            self.log(f"Статичната PNG графика не можа да се генерира: {e}")
+        return html_file
 
-        if not dates:
-            self.log("Не са намерени дати в XLSX файла")
+    def _chart_products(self, products_data) -> Optional[tuple]:
+        """(матрица, [{name, unit, dates, prices}]) на продуктите с повече от 5 цени или None."""
+        matrix = self.build_price_matrix(products_data)
+        if not matrix.nnz:
+            self.log("Няма дати за графиката")
             return None
 
+        chart = matrix.select(matrix.counts > 5)
+        chart.units = [unit or "€" for unit in chart.units]
         products = []
-        for row_idx in range(2, ws.max_row + 1):
-            product_name = ws.cell(row=row_idx, column=1).value
-            if not product_name:
-                continue
-            prices, valid_dates = [], []
-            for col_idx, date in enumerate(dates, start=3):
-                value = ws.cell(row=row_idx, column=col_idx).value
-                if value is not None:
-                    prices.append(float(value))
-                    valid_dates.append(date)
-            if len(prices) > 5:
-                products.append(
-                    {
-                        "name": product_name,
-                        "unit": ws.cell(row=row_idx, column=2).value or "€",
-                        "dates": valid_dates,
-                        "prices": prices,
-                    }
-                )
+        for row, name in enumerate(chart.names):
+            days, prices = chart.row(row)
+            products.append(
+                {
+                    "name": name,
+                    "unit": chart.units[row],
+                    "dates": [datetime.fromordinal(day + UNIX_EPOCH_ORDINAL) for day in days.tolist()],
+                    "prices": prices.tolist(),
+                }
+            )
 
         if not products:
             self.log("Няма продукти с повече от 5 ценови записа")
             return None
 
         self.log(f"Намерени {len(products)} продукта с повече от 5 цени")
+        return chart, products
+
+    def _write_chart_html(self, chart_data: tuple, base_name, data_format: Optional[str] = None) -> str:
+        """Записва интерактивната графика ({base_name}_interactive_chart.html) и връща пътя ѝ.
 
+        С data_format данните на скритите при отваряне серии се изнасят в
+        шардове (виж chart_data).
+        """
+        import plotly.graph_objects as go
+
+        chart, products = chart_data
         palette = [
             "#2563eb", "#16a34a", "#dc2626", "#7c3aed", "#ea580c",
             "#0f766e", "#d97706", "#db2777", "#0891b2", "#65a30d",
@@ -1149,85 +1940,47 @@ class ReceiptAnalyzer:
         )
         fig.update_xaxes(rangeslider_visible=True)
 
-        base_name = Path(xlsx_file).with_name(Path(xlsx_file).stem)
         html_file = f"{base_name}_interactive_chart.html"
 
-        html_content = _build_chart_html(fig, products, self.products_units)
-        Path(html_file).write_text(html_content, encoding="utf-8")
+        plot_json = fig.to_json()
+        plot = json.loads(plot_json)
+        loader = self._prepare_chart(plot["data"], chart.names, html_file, data_format)
+        if loader or any(trace.get("type") == "scattergl" for trace in plot["data"]):
+            plot_json = json.dumps(plot, ensure_ascii=False, separators=(",", ":"))
+        _write_chart_page(html_file, plot_json, chart, loader)
         self.log(f"Интерактивна графика запазена: {html_file}")
-
-        try:
-            self._save_static_png(products, base_name)
-            self.log(f"Статична PNG графика запазена: {base_name}_chart.png")
-        except Exception as e:
-            self.log(f"Статичната PNG графика не можа да се генерира: {e}")
-
         return str(html_file)
 
-    def _save_static_png(self, products: list, base_name: str) -> None:
-        """Запазва статична PNG версия на графиката."""
-        try:
-            plt.style.use("seaborn-v0_8-darkgrid")
-        except OSError:
-            pass
-
-        fig_height = max(8, min(20, 8 + len(products) * 0.3))
-        fig_static, ax = plt.subplots(figsize=(16, fig_height))
-
-        for product in products:
-            short_name = product["name"][:35] + "..." if len(product["name"]) > 35 else product["name"]
-            ax.plot(product["dates"], product["prices"], marker="o", linewidth=2, markersize=5, label=short_name, alpha=0.8)
-
-        ax.set_xlabel("Дата", fontsize=12, weight="bold")
-        ax.set_ylabel("Цена (€)", fontsize=12, weight="bold")
-        ax.set_title(
-            f"Промяна на цените на продуктите във времето (продукти с повече от 5 записа: {len(products)})",
-            fontsize=14, weight="bold", pad=20,
-        )
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d.%m.%Y"))
-        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-        plt.xticks(rotation=45, ha="right")
-
-        if len(products) <= 15:
-            ax.legend(loc="best", fontsize=8, framealpha=0.9)
-        else:
-            ncols = min(3, (len(products) + 9) // 10)
-            ax.legend(loc="upper left", bbox_to_anchor=(1.02, 1), fontsize=7, framealpha=0.9, ncol=ncols)
-
-        ax.grid(True, alpha=0.3)
-        plt.tight_layout()
-        fig_static.savefig(f"{base_name}_chart.png", dpi=200, bbox_inches="tight")
-        plt.close(fig_static)
+    def generate_seasonal_html(self, fv_data, output_file: str, data_format: Optional[str] = None) -> None:
+        """Генерира HTML отчет със сезонно сравнение на цените на плодове/зеленчуци.
 
-    def generate_seasonal_html(self, fv_data: dict, output_file: str) -> None:
-        """Генерира HTML отчет със сезонно сравнение на цените на плодове/зеленчуци."""
+        fv_data е {product: {date: price}} или PriceMatrix; средните цени по сезон
+        се смятат векторно от матрицата. data_format изнася данните на
+        графиката както в generate_local_db_report.
+        """
+        matrix = self.build_price_matrix(fv_data)
+        counts, sums = matrix.seasonal_totals(SUMMER_MONTHS)
+        in_season = np.isin(matrix.column_months(), sorted(SUMMER_MONTHS))
         seasonal_stats = []
 
-        for product_name, dates_prices in sorted(fv_data.items()):
-            summer, off_season = [], []
-            for date_str, price in dates_prices.items():
-                try:
-                    month = int(date_str[5:7])
-                except (ValueError, IndexError):
-                    continue
-                (summer if month in SUMMER_MONTHS else off_season).append((date_str, price))
-
-            if not summer and not off_season:
-                continue
-
-            avg_summer = sum(p for _, p in summer) / len(summer) if summer else None
-            avg_off = sum(p for _, p in off_season) / len(off_season) if off_season else None
+        for row in np.flatnonzero(matrix.counts):
+            start, end = matrix.indptr[row], matrix.indptr[row + 1]
+            all_prices = matrix.row_items(row)
+            summer_mask = in_season[matrix.cols[start:end]]
+            off_n, summer_n = counts[row]
+            avg_summer = float(sums[row, 1]) / summer_n if summer_n else None
+            avg_off = float(sums[row, 0]) / off_n if off_n else None
             diff_pct = ((avg_summer - avg_off) / avg_off) * 100 if avg_summer is not None and avg_off else None
 
             seasonal_stats.append(
                 {
-                    "name": product_name,
-                    "summer_prices": sorted(summer),
-                    "off_season_prices": sorted(off_season),
+                    "name": matrix.names[row],
+                    "summer_prices": [item for item, summer in zip(all_prices, summer_mask) if summer],
+                    "off_season_prices": [item for item, summer in zip(all_prices, summer_mask) if not summer],
                     "avg_summer": avg_summer,
                     "avg_off": avg_off,
                     "diff_pct": diff_pct,
-                    "all_prices": sorted(list(dates_prices.items())),
+                    "all_prices": all_prices,
                 }
             )
 
@@ -1266,7 +2019,8 @@ class ReceiptAnalyzer:
             for yr in range(2024, 2028)
         ]
 
-        traces_json = json.dumps(traces, ensure_ascii=False)
+        loader = self._prepare_chart(traces, [trace["name"] for trace in traces], output_file, data_format)
+        traces_json = json.dumps(traces, ensure_ascii=False, separators=(",", ":") if loader else None)
         shapes_json = json.dumps(shapes_js, ensure_ascii=False)
 
         def fmt_price(p):
@@ -1284,555 +2038,309 @@ class ReceiptAnalyzer:
                 f'<span title="{d}">{round(p, 2):.2f}</span>' for d, p in prices
             ) or "–"
 
-        table_rows = ""
-        for idx, item in enumerate(seasonal_stats, 1):
-            diff_text, diff_color = fmt_diff(item["diff_pct"])
-            row_bg = "#f8f9fa" if idx % 2 == 0 else "white"
-            table_rows += f'''
-            <tr style="background:{row_bg}">
-              <td style="padding:8px;border:1px solid #ddd;text-align:center">{idx}</td>
-              <td style="padding:8px;border:1px solid #ddd">{item["name"]}</td>
-              <td style="padding:8px;border:1px solid #ddd;text-align:center">{len(item["summer_prices"])}</td>
-              <td style="padding:8px;border:1px solid #ddd;text-align:right">{fmt_price(item["avg_summer"])}</td>
-              <td style="padding:8px;border:1px solid #ddd;text-align:center">{len(item["off_season_prices"])}</td>
-              <td style="padding:8px;border:1px solid #ddd;text-align:right">{fmt_price(item["avg_off"])}</td>
-              <td style="padding:8px;border:1px solid #ddd;text-align:center;font-weight:bold;color:{diff_color}">{diff_text}</td>
-              <td style="padding:8px;border:1px solid #ddd;font-size:11px;color:#555">{price_details(item["summer_prices"])}</td>
-              <td style="padding:8px;border:1px solid #ddd;font-size:11px;color:#555">{price_details(item["off_season_prices"])}</td>
-            </tr>'''
-
-        html = f'''<!DOCTYPE html>
-<html lang="bg">
-<head>
-  <meta charset="utf-8">
-  <title>Lidl – Сезонен анализ на плодове и зеленчуци</title>
-  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-  <style>
-    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #f5f5f5; }}
-    h1 {{ color: #2c7a2c; }}
-    h2 {{ color: #333; margin-top: 30px; }}
-    .legend-box {{ display: inline-block; width: 14px; height: 14px;
-                   border-radius: 3px; margin-right: 6px; vertical-align: middle; }}
-    .info-banner {{ background: #fff3cd; border-left: 5px solid #ffc107;
-                    padding: 12px 16px; margin-bottom: 20px; border-radius: 4px; }}
-    table {{ width: 100%; border-collapse: collapse; background: white; font-size: 13px; }}
-    thead tr {{ background: #2c7a2c; color: white; }}
-    th {{ padding: 10px; border: 1px solid #999; }}
-    .controls {{ margin-bottom: 16px; }}
-    input[type=text] {{ padding: 7px; width: 260px; border: 1px solid #ccc;
-                        border-radius: 4px; font-size: 14px; }}
-    button {{ padding: 7px 18px; margin: 4px; border: none; border-radius: 4px;
-              cursor: pointer; font-size: 13px; }}
-    .btn-green {{ background: #2c7a2c; color: white; }}
-    .btn-gray  {{ background: #6c757d; color: white; }}
-  </style>
-</head>
-<body>
-  <h1>🌿 Lidl – Сезонен анализ на плодове и зеленчуци</h1>
-
-  <div class="info-banner">
-    <strong>Легенда:</strong>
-    <span class="legend-box" style="background:#ffc107;opacity:0.5"></span> Летен сезон ({SUMMER_MONTHS_NAMES}) |&nbsp;
-    <span style="color:#e74c3c;font-weight:bold">↑ Скъпи лятото</span> (разлика &gt;5%) |&nbsp;
-    <span style="color:#27ae60;font-weight:bold">↓ По-евтини лятото</span> (разлика &lt;–5%) |&nbsp;
-    <span style="color:#888">≈ Без съществена разлика</span><br>
-    <small>Цените са в EUR. Средната лятна цена се сравнява с извън-сезонната (жълтите ленти = юни – септември).</small>
-  </div>
-
-  <h2>📈 Ценова история</h2>
-  <div class="controls">
-    <input type="text" id="searchInput" placeholder="Търси продукт...">
-    <button class="btn-green" onclick="filterTraces()">Филтрирай</button>
-    <button class="btn-gray" onclick="showAllTraces()">Всички</button>
-    <button class="btn-gray" onclick="hideAllTraces()">Скрий всички</button>
-  </div>
-  <div id="chart"></div>
-
-  <h2>📊 Сравнителна таблица по сезон</h2>
-  <table>
-    <thead>
-      <tr>
-        <th>#</th>
-        <th>Продукт</th>
-        <th>Брой цени<br>(лято)</th>
-        <th>Ср. цена лято<br>({SUMMER_MONTHS_NAMES})</th>
-        <th>Брой цени<br>(извън сезон)</th>
-        <th>Ср. цена извън сезон<br>({OFF_SEASON_MONTHS_NAMES})</th>
-        <th>Разлика</th>
-        <th>Цени лято (€)</th>
-        <th>Цени извън сезон (€)</th>
-      </tr>
-    </thead>
-    <tbody>
-      {table_rows}
-    </tbody>
-  </table>
-
-  <p style="margin-top:20px;color:#666;font-size:12px">
-    Генерирано от Lidl Receipt Downloader • {datetime.now().strftime("%d.%m.%Y %H:%M")}
-  </p>
-
-  <script>
-    var traces = {traces_json};
-    var shapes = {shapes_json};
-    var layout = {{
-      title: 'Цени на плодове и зеленчуци (жълто = летен сезон)',
-      xaxis: {{ title: 'Дата', tickformat: '%d.%m.%Y', rangeslider: {{visible: true}} }},
-      yaxis: {{ title: 'Цена (€/кг)' }},
-      shapes: shapes,
-      hovermode: 'closest',
-      template: 'plotly_white',
-      height: 600,
-      legend: {{ orientation: 'v', x: 1.02, y: 1 }},
-      margin: {{l:60, r:260, t:80, b:60}}
-    }};
-    Plotly.newPlot('chart', traces, layout, {{responsive: true}});
-
-    function filterTraces() {{
-      var q = document.getElementById('searchInput').value.toLowerCase();
-      if (!q) {{ showAllTraces(); return; }}
-      var vis = traces.map(t => t.name.toLowerCase().includes(q));
-      Plotly.restyle('chart', {{visible: vis}});
-    }}
-    function showAllTraces() {{
-      Plotly.restyle('chart', {{visible: traces.map(() => true)}});
-      document.getElementById('searchInput').value = '';
-    }}
-    function hideAllTraces() {{
-      Plotly.restyle('chart', {{visible: traces.map(() => 'legendonly')}});
-    }}
-    document.getElementById('searchInput').addEventListener('keypress', function(e) {{
-      if (e.key === 'Enter') filterTraces();
-    }});
-  </script>
-</body>
-</html>'''
+        def row_values():
+            for idx, item in enumerate(seasonal_stats, 1):
+                diff_text, diff_color = fmt_diff(item["diff_pct"])
+                yield {
+                    "idx": idx,
+                    "row_bg": "#f8f9fa" if idx % 2 == 0 else "white",
+                    "name": item["name"],
+                    "summer_count": len(item["summer_prices"]),
+                    "avg_summer": fmt_price(item["avg_summer"]),
+                    "off_season_count": len(item["off_season_prices"]),
+                    "avg_off": fmt_price(item["avg_off"]),
+                    "diff_text": diff_text,
+                    "diff_color": diff_color,
+                    "summer_prices": price_details(item["summer_prices"]),
+                    "off_season_prices": price_details(item["off_season_prices"]),
+                }
 
-        Path(output_file).write_text(html, encoding="utf-8")
+        SEASONAL_PAGE.write(
+            output_file,
+            table_rows=SEASONAL_ROW.render_rows(row_values()),
+            traces_json=traces_json,
+            shapes_json=shapes_json,
+            loader=loader,
+            summer_months=SUMMER_MONTHS_NAMES,
+            off_season_months=OFF_SEASON_MONTHS_NAMES,
+            generated=datetime.now().strftime("%d.%m.%Y %H:%M"),
+        )
         self.log(f"Сезонен отчет запазен: {output_file}")
 
     def generate_index_html(self, output_file: str, files_info: dict) -> str:
         """Генерира лендинг HTML страница с описание на приложението и линкове към отчетите."""
-        html = f'''<!DOCTYPE html>
-<html lang="bg">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>Lidl Цени Анализ – Начало</title>
-  <style>
-    * {{ box-sizing: border-box; }}
-    body {{
-      font-family: 'Segoe UI', Arial, sans-serif;
-      margin: 0;
-      padding: 20px;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: #333;
-      min-height: 100vh;
-    }}
-    .container {{
-      max-width: 900px;
-      margin: 0 auto;
-      background: white;
-      border-radius: 12px;
-      box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-      overflow: hidden;
-    }}
-    .header {{
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      padding: 40px 30px;
-      text-align: center;
-    }}
-    h1 {{
-      margin: 0 0 10px;
-      font-size: 36px;
-      font-weight: 700;
-    }}
-    .tagline {{
-      font-size: 18px;
-      opacity: 0.95;
-      margin: 0;
-    }}
-    .content {{
-      padding: 40px 30px;
-    }}
-    .section {{
-      margin-bottom: 35px;
-    }}
-    .section h2 {{
-      color: #667eea;
-      font-size: 22px;
-      margin-top: 0;
-      border-bottom: 3px solid #f0f0f0;
-      padding-bottom: 10px;
-    }}
-    .features {{
-      display: grid;
-      grid-template-columns: 1fr 1fr;
-      gap: 20px;
-    }}
-    @media (max-width: 600px) {{
-      .features {{ grid-template-columns: 1fr; }}
-    }}
-    .feature {{
-      background: #f8f9ff;
-      padding: 20px;
-      border-radius: 8px;
-      border-left: 4px solid #667eea;
-    }}
-    .feature h3 {{
-      color: #667eea;
-      margin-top: 0;
-      font-size: 16px;
-    }}
-    .feature p {{
-      margin: 8px 0 0;
-      font-size: 14px;
-      color: #666;
-      line-height: 1.5;
-    }}
-    .reports {{
-      display: grid;
-      grid-template-columns: 1fr;
-      gap: 12px;
-    }}
-    .report-link {{
-      display: block;
-      padding: 16px 20px;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      text-decoration: none;
-      border-radius: 8px;
-      transition: transform 0.2s, box-shadow 0.2s;
-      font-weight: 600;
-    }}
-    .report-link:hover {{
-      transform: translateY(-2px);
-      box-shadow: 0 10px 25px rgba(102, 126, 234, 0.4);
-    }}
-    .report-link:disabled {{
-      opacity: 0.5;
-      cursor: not-allowed;
-      transform: none;
-    }}
-    .report-link small {{
-      display: block;
-      font-size: 12px;
-      opacity: 0.9;
-      margin-top: 4px;
-    }}
-    .report-icon {{
-      margin-right: 10px;
-      font-size: 18px;
-    }}
-    .info-box {{
-      background: #fff3cd;
-      border-left: 4px solid #ffc107;
-      padding: 16px;
-      border-radius: 6px;
-      margin: 20px 0;
-      font-size: 14px;
-      line-height: 1.6;
-    }}
-    .footer {{
-      background: #f8f9fa;
-      padding: 20px 30px;
-      text-align: center;
-      border-top: 1px solid #e0e0e0;
-      font-size: 12px;
-      color: #999;
-    }}
-    .timestamp {{
-      font-size: 12px;
-      color: #999;
-    }}
-  </style>
-</head>
-<body>
-  <div class="container">
-    <div class="header">
-      <h1>🛒 Lidl Цени Анализ</h1>
-      <p class="tagline">Проследявайте промените в цените на продуктите във времето</p>
-    </div>
-
-    <div class="content">
-      <div class="section">
-        <h2>📊 Какво прави приложението?</h2>
-        <p>Приложението анализира касови бележки от Lidl България и:</p>
-        <div class="features">
-          <div class="feature">
-            <h3>📈 История на цените</h3>
-            <p>Отслеждане на цените на продуктите във времето с интерактивни графики</p>
-          </div>
-          <div class="feature">
-            <h3>📋 XLSX експорт</h3>
-            <p>Экспортиране на всички данни в Excel за допълнител анализ</p>
-          </div>
-          <div class="feature">
-            <h3>🌱 Сезонен анализ</h3>
-            <p>Сравнение на цените на плодове и зеленчуци през лятото и извън сезона</p>
-          </div>
-          <div class="feature">
-            <h3>📊 Годишно сравнение</h3>
-            <p>Промяна на цен между 2025 и 2026 година с детайлна таблица</p>
-          </div>
-        </div>
-      </div>
-
-      <div class="section">
-        <h2>📁 Генерирани отчети</h2>
-        <div class="reports">
-'''
-        
-        # Добавяме линкове към отчетите
-        if files_info.get("xlsx"):
-            html += f'''          <a href="{Path(files_info["xlsx"]).name}" class="report-link" title="{files_info["xlsx"]}">
-            <span class="report-icon">📊</span>XLSX – История на цените<small>Excel файл със всички цени по дати</small></a>\n'''
-        
-        if files_info.get("chart"):
-            html += f'''          <a href="{Path(files_info["chart"]).name}" class="report-link" title="{files_info["chart"]}">
-            <span class="report-icon">📈</span>Интерактивна графика<small>Линейни графики с всички продукти</small></a>\n'''
-        
-        if files_info.get("seasonal"):
-            html += f'''          <a href="{Path(files_info["seasonal"]).name}" class="report-link" title="{files_info["seasonal"]}">
-            <span class="report-icon">🌱</span>Сезонен анализ<small>Сравнение на цените на плодове и зеленчуци</small></a>\n'''
-        
-        if files_info.get("years"):
-            html += f'''          <a href="{Path(files_info["years"]).name}" class="report-link" title="{files_info["years"]}">
-            <span class="report-icon">📊</span>Годишно сравнение 2025/2026<small>Промяна на цени между годините</small></a>\n'''
-        
-        if files_info.get("db_report"):
-            html += f'''          <a href="{Path(files_info["db_report"]).name}" class="report-link" title="{files_info["db_report"]}">
-            <span class="report-icon">💾</span>Локална база данни<small>История на цени от локално хранилище</small></a>\n'''
-
-        html += '''        </div>
-      </div>
-
-      <div class="section">
-        <h2>💡 Как да използвам?</h2>
-        <ol style="line-height: 1.8; color: #666;">
-          <li><strong>Изтеглете касова бележка</strong> – Преведете касовата бележка в текстов файл</li>
-          <li><strong>Добавете файла</strong> – Селектирайте файла в приложението</li>
-          <li><strong>Пуснете анализа</strong> – Приложението обработва данните и генерира отчетите</li>
-          <li><strong>Преглеждайте отчетите</strong> – Отворете генерираните HTML и Excel файлове</li>
-        </ol>
-      </div>
-
-      <div class="info-box">
-        <strong>ℹ️ Забележка:</strong> Всеки нов анализ генерира нови файлове в папката <code>Документи</code>. 
-        Проверете времето на промяна на файловете за да видите кои са най-новите.
-      </div>
-    </div>
-
-    <div class="footer">
-      <div class="timestamp">Генерирано: {datetime.now().strftime("%d.%m.%Y %H:%M:%S")}</div>
-      <p style="margin: 10px 0 0;">Lidl Цени Анализ v1.0</p>
-    </div>
-  </div>
-</body>
-</html>'''
-
-        Path(output_file).write_text(html, encoding="utf-8")
+        links = (
+            {
+                "href": Path(files_info[key]).name,
+                "path": files_info[key],
+                "icon": icon,
+                "title": title,
+                "description": description,
+            }
+            for key, icon, title, description in INDEX_REPORTS
+            if files_info.get(key)
+        )
+        INDEX_PAGE.write(
+            output_file,
+            report_links=INDEX_LINK.render_rows(links),
+            generated=datetime.now().strftime("%d.%m.%Y %H:%M:%S"),
+        )
         self.log(f"Лендинг страница запазена: {output_file}")
         return str(output_file)
 
 
-def _build_chart_html(fig, products: list, products_units: dict) -> str:
-    """Изгражда HTML-а на интерактивната графика с филтър и топ-10 таблици."""
-    changes = []
-    for product in products:
-        prices = product["prices"]
-        if len(prices) < 2 or prices[0] <= 0:
+def _file_size(file_path) -> int:
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def _hash_file(file_path) -> str:
+    """SHA-256 на съдържанието на файла, прочетено на блокове."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _receipt_hash(receipt: str, receipt_date: Optional[str], timestamp: Optional[str]) -> str:
+    """Отпечатък на бележката: дата, час и съдържание, без номера/страницата от заглавката.
+
+    Така една и съща бележка от две различни изтегляния има един и същ хеш, а
+    еднаква покупка в различни дни – различен.
+    """
+    body = _receipt_body(receipt)
+    return hashlib.blake2b(f"{receipt_date}\n{timestamp}\n{body}".encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _receipt_body_hash(receipt: str) -> str:
+    """Хешът само на съдържанието – така бяха записани бележките в по-старите бази."""
+    return hashlib.blake2b(_receipt_body(receipt).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _receipt_body(receipt: str) -> str:
+    return receipt.split("=" * 80, 1)[-1].strip().strip("=").strip()
+
+
+def _vacuum(conn) -> None:
+    conn.execute("VACUUM")
+
+
+def _parse_receipt_timestamp(receipt: str) -> Optional[str]:
+    """Извлича дата и час на бележката като 'YYYY-MM-DD HH:MM[:SS]', ако ги има."""
+    dotted = re.search(r"(\d{2})\.(\d{2})\.(\d{4})\s+(\d{2}:\d{2}:\d{2})", receipt)
+    if dotted:
+        day, month, year, clock = dotted.groups()
+        return f"{year}-{month}-{day} {clock}"
+    dotted_year_first = re.search(r"(\d{4})\.(\d{2})\.(\d{2})\s+(\d{2}:\d{2}(?::\d{2})?)", receipt)
+    if dotted_year_first:
+        year, month, day, clock = dotted_year_first.groups()
+        return f"{year}-{month}-{day} {clock}"
+    return None
+
+
+def _parse_file_job(file_path: str) -> list:
+    """Задача за пула от процеси: парсва целия файл с бележки поточно."""
+    return _parse_receipts(iter_receipts(file_path))
+
+
+def _parse_in_chunks(executor, file_path, max_in_flight: int) -> list:
+    """Чете голям файл поточно и праща части от бележки към пула.
+
+    Частите се изпращат още докато файлът се чете, а броят чакащи части е
+    ограничен до max_in_flight, така че в паметта има само малка част от текста.
+    """
+    parsed = []
+    in_flight = deque()
+    receipts = iter_receipts(file_path)
+    start_idx = 1
+    while True:
+        chunk = list(islice(receipts, PARSE_CHUNK_RECEIPTS))
+        if not chunk:
+            break
+        in_flight.append(executor.submit(_parse_receipts, chunk, start_idx))
+        start_idx += len(chunk)
+        if len(in_flight) >= max_in_flight:
+            parsed.extend(in_flight.popleft().result())
+    while in_flight:
+        parsed.extend(in_flight.popleft().result())
+    return parsed
+
+
+def _parse_receipts(receipts: list, start_idx: int = 1) -> list:
+    """Парсва бележки до компактни Receipt обекти, без достъп до базата и без логове."""
+    return [
+        _parse_receipt(receipt, receipt_idx)
+        for receipt_idx, receipt in enumerate(receipts, start_idx)
+    ]
+
+
+def _parse_receipt(receipt: str, receipt_idx: int) -> Receipt:
+    receipt_date_str = ReceiptAnalyzer._parse_receipt_date(receipt)
+    timestamp = _parse_receipt_timestamp(receipt)
+    receipt_hash = _receipt_hash(receipt, receipt_date_str, timestamp)
+    if receipt_date_str is None:
+        return Receipt(receipt_idx, receipt_hash, None, "no_date")
+
+    try:
+        receipt_date = datetime.strptime(receipt_date_str, "%Y-%m-%d")
+    except ValueError:
+        return Receipt(receipt_idx, receipt_hash, receipt_date_str, "bad_date")
+
+    is_bgn = "BGN" in receipt or "# лв" in receipt or "лв  #" in receipt
+
+    if receipt_date < EUR_INTRODUCTION_DATE:
+        conversion_rate = EUR_PER_BGN
+    else:
+        conversion_rate = EUR_PER_BGN if is_bgn else 1.0
+
+    items = []
+    lines = receipt.split("\n")
+
+    for i, line in enumerate(lines):
+        if any(marker in line for marker in SKIP_LINE_MARKERS):
+            if items and any(marker in line for marker in ITEM_DISCOUNT_MARKERS):
+                discount = re.match(DISCOUNT_PATTERN, line.strip())
+                if discount:
+                    items[-1].discount += float(discount.group(2).replace(",", ".")) / conversion_rate
             continue
-        min_i, max_i = prices.index(min(prices)), prices.index(max(prices))
-        changes.append(
-            {
-                "name": product["name"],
-                "unit": product.get("unit") or products_units.get(product["name"], "€"),
-                "change_percent": ((prices[-1] - prices[0]) / prices[0]) * 100,
-                "min_price": min(prices),
-                "max_price": max(prices),
-                "min_price_date": product["dates"][min_i].strftime("%d.%m.%Y"),
-                "max_price_date": product["dates"][max_i].strftime("%d.%m.%Y"),
-            }
+
+        match = re.match(PRICE_PATTERN, line.strip())
+        if not match:
+            continue
+
+        product_name = match.group(1).strip()
+        price_str = match.group(2).replace(",", ".")
+
+        try:
+            price = float(price_str)
+        except ValueError:
+            continue
+
+        if any(keyword in product_name.upper() for keyword in SKIP_KEYWORDS):
+            continue
+        if len(product_name) < 3:
+            continue
+        if "x" in product_name.lower() or "х" in product_name.lower():
+            continue
+
+        final_price = price / conversion_rate
+        amount = final_price
+        unit = None
+        quantity = unit_price = None
+
+        if i > 0:
+            unit_match = re.search(UNIT_PRICE_PATTERN, lines[i - 1].strip())
+            if unit_match:
+                quantity = float(unit_match.group(1).replace(",", "."))
+                unit_price = float(unit_match.group(2).replace(",", ".")) / conversion_rate
+                final_price = unit_price
+                unit = "€/кг"
+            else:
+                weight_kg, unit_label = ReceiptAnalyzer.extract_weight_from_name(product_name)
+                if weight_kg and weight_kg > 0:
+                    if unit_label == "€/100г":
+                        final_price = final_price / (weight_kg * 10)
+                    else:
+                        final_price = final_price / weight_kg
+                    unit = unit_label
+                else:
+                    unit = "€"
+
+        items.append(LineItem(product_name, final_price, unit, quantity, unit_price, amount))
+
+    total = TOTAL_PATTERN.search(receipt)
+    store = STORE_PATTERN.search(receipt)
+    return Receipt(
+        receipt_idx,
+        receipt_hash,
+        receipt_date_str,
+        timestamp=timestamp,
+        store=store.group(1) if store else None,
+        total=float(total.group(1).replace(",", ".")) / conversion_rate if total else None,
+        currency="BGN" if conversion_rate != 1.0 else "EUR",
+        body_hash=_receipt_body_hash(receipt),
+        items=items,
+    )
+
+
+def _chart_png_stage(chart_data: Optional[tuple], base_name) -> Optional[str]:
+    """Етап на report_pipeline: статичната PNG графика в отделен процес."""
+    return _save_static_png(chart_data[1], base_name) if chart_data else None
+
+
+def _save_static_png(products: list, base_name) -> str:
+    """Запазва статична PNG версия на графиката ({base_name}_chart.png) и връща пътя ѝ.
+
+    Ползва Figure без pyplot, за да не зависи от графичния backend (Tk) и да
+    може да работи в отделна нишка или процес.
+    """
+    import matplotlib.dates as mdates
+    from matplotlib import style
+    from matplotlib.figure import Figure
+
+    # Старите версии на matplotlib нямат seaborn-v0_8-* стилове
+    styles = [name for name in ("seaborn-v0_8-darkgrid",) if name in style.available]
+    png_file = f"{base_name}_chart.png"
+    with style.context(styles):
+        fig_height = max(8, min(20, 8 + len(products) * 0.3))
+        fig_static = Figure(figsize=(16, fig_height))
+        ax = fig_static.subplots()
+
+        for product in products:
+            short_name = product["name"][:35] + "..." if len(product["name"]) > 35 else product["name"]
+            ax.plot(product["dates"], product["prices"], marker="o", linewidth=2, markersize=5, label=short_name, alpha=0.8)
+
+        ax.set_xlabel("Дата", fontsize=12, weight="bold")
+        ax.set_ylabel("Цена (€)", fontsize=12, weight="bold")
+        ax.set_title(
+            f"Промяна на цените на продуктите във времето (продукти с повече от 5 записа: {len(products)})",
+            fontsize=14, weight="bold", pad=20,
         )
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d.%m.%Y"))
+        ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment("right")
+
+        if len(products) <= 15:
+            ax.legend(loc="best", fontsize=8, framealpha=0.9)
+        else:
+            ncols = min(3, (len(products) + 9) // 10)
+            ax.legend(loc="upper left", bbox_to_anchor=(1.02, 1), fontsize=7, framealpha=0.9, ncol=ncols)
+
+        ax.grid(True, alpha=0.3)
+        fig_static.tight_layout()
+        fig_static.savefig(png_file, dpi=200, bbox_inches="tight")
+    return png_file
 
-    changes.sort(key=lambda x: abs(x["change_percent"]), reverse=True)
-    top_up = changes[:10]
-    top_down = sorted([c for c in changes if c["change_percent"] < 0], key=lambda x: x["change_percent"])[:10]
+
+def _write_chart_page(output_file, plot_json: str, matrix: PriceMatrix, loader: str = "") -> None:
+    """Записва HTML-а на интерактивната графика с филтър и топ-10 таблици (от PriceMatrix).
+
+    plot_json е JSON-ът на фигурата; loader е <script>-ът на chart_data ('' без такъв).
+    """
+    top_up, top_down = matrix.top_movers(10)
 
     def table_block(items, title, header_color):
-        rows = ""
-        for idx, item in enumerate(items, 1):
-            row_bg = "#f8f9fa" if idx % 2 == 0 else "white"
-            color = "#dc3545" if item["change_percent"] > 0 else "#28a745"
-            arrow = "↑" if item["change_percent"] > 0 else "↓"
-            rows += f'''
-            <tr style="background-color: {row_bg};">
-                <td style="padding: 10px; border: 1px solid #ddd; text-align: center; font-weight: bold;">{idx}</td>
-                <td style="padding: 10px; border: 1px solid #ddd;">{item["name"]} <small style="color:#888">({item["unit"]})</small></td>
-                <td style="padding: 10px; border: 1px solid #ddd; text-align: center; font-weight: bold; color: {color};">{arrow} {item["change_percent"]:+.2f}%</td>
-                <td style="padding: 10px; border: 1px solid #ddd; text-align: right;">{item["min_price"]:.2f}<br><small style="color: #666;">({item["min_price_date"]})</small></td>
-                <td style="padding: 10px; border: 1px solid #ddd; text-align: right;">{item["max_price"]:.2f}<br><small style="color: #666;">({item["max_price_date"]})</small></td>
-            </tr>'''
-        return f'''
-            <div class="table-container" style="margin-top: 30px; padding: 20px; background-color: white; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
-                <h2 style="color: #333; margin-bottom: 20px;">{title}</h2>
-                <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
-                    <thead>
-                        <tr style="background-color: {header_color}; color: white;">
-                            <th style="padding: 12px; text-align: left; border: 1px solid #ddd;">#</th>
-                            <th style="padding: 12px; text-align: left; border: 1px solid #ddd;">Продукт</th>
-                            <th style="padding: 12px; text-align: center; border: 1px solid #ddd;">Промяна (%)</th>
-                            <th style="padding: 12px; text-align: right; border: 1px solid #ddd;">Мин. цена (€)</th>
-                            <th style="padding: 12px; text-align: right; border: 1px solid #ddd;">Макс. цена (€)</th>
-                        </tr>
-                    </thead>
-                    <tbody>{rows}</tbody>
-                </table>
-            </div>'''
-
-    top_up_html = table_block(top_up, "📊 Топ 10 продукти с най-голяма ценова промяна", "#007bff")
-    top_down_html = table_block(top_down, "📉 Топ 10 продукти с най-голямо понижение на цените", "#28a745") if top_down else ""
-
-    return f'''<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <title>Lidl - Интерактивна графика на цените</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
-    <style>
-        body {{
-            font-family: Arial, sans-serif;
-            margin: 0;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        .container {{
-            max-width: 100%;
-            margin: 0 auto;
-            background-color: white;
-            padding: 20px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        .controls {{ margin-bottom: 20px; padding: 15px; background-color: #f8f9fa; border-radius: 5px; }}
-        .control-group {{ margin-bottom: 15px; }}
-        label {{ font-weight: bold; margin-right: 10px; display: inline-block; width: 150px; }}
-        input[type="text"] {{ padding: 8px; width: 300px; border: 1px solid #ddd; border-radius: 4px; }}
-        button {{ padding: 8px 20px; margin: 5px; border: none; border-radius: 4px; cursor: pointer; font-size: 14px; }}
-        .btn-primary {{ background-color: #007bff; color: white; }}
-        .btn-primary:hover {{ background-color: #0056b3; }}
-        .btn-secondary {{ background-color: #6c757d; color: white; }}
-        .btn-secondary:hover {{ background-color: #545b62; }}
-        .btn-success {{ background-color: #28a745; color: white; }}
-        .btn-success:hover {{ background-color: #218838; }}
-        .info {{ margin-top: 10px; padding: 10px; background-color: #d1ecf1; border-left: 4px solid #0c5460; color: #0c5460; }}
-        #chart {{ margin-top: 20px; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🛒 Lidl - Интерактивна графика на цените</h1>
-
-        <div class="controls">
-            <div class="control-group">
-                <label>🔍 Търси продукт:</label>
-                <input type="text" id="searchInput" placeholder="Въведете име на продукт...">
-                <button class="btn-primary" onclick="filterProducts()">Филтрирай</button>
-                <button class="btn-success" onclick="showTopProducts()">Покажи първите 12</button>
-            </div>
-
-            <div class="control-group">
-                <button class="btn-success" onclick="showAll()">Покажи всички</button>
-                <button class="btn-secondary" onclick="hideAll()">Скрий всички</button>
-                <button class="btn-secondary" onclick="resetView()">Възстанови изглед</button>
-            </div>
-
-            <div class="info">
-                <strong>💡 Съвети:</strong>
-                <ul style="margin: 5px 0;">
-                    <li>По подразбиране показваме първите 12 продукта, за да не се губите при голям брой линии</li>
-                    <li>Кликнете на продукт в легендата за да го покажете/скриете</li>
-                    <li>Използвайте мишката за приближаване (scroll) и местене (drag)</li>
-                    <li>Използвайте филтъра за търсене на конкретни продукти</li>
-                    <li>Двоен клик на легендата изолира един продукт</li>
-                </ul>
-            </div>
-        </div>
-
-        <div id="chart"></div>
-
-        {top_up_html}
-
-        {top_down_html}
-    </div>
-
-    <script>
-        var plotData = {fig.to_json()};
-        var layout = plotData.layout;
-        var data = plotData.data;
-        var config = {{
-            responsive: true,
-            displayModeBar: true,
-            modeBarButtonsToAdd: ['drawopenpath', 'eraseshape'],
-            toImageButtonOptions: {{
-                format: 'png',
-                filename: 'lidl_prices_chart',
-                height: 1080,
-                width: 1920,
-                scale: 2
-            }}
-        }};
-
-        var originalVisibility = data.map(trace => trace.visible);
-        var defaultVisibleCount = Math.min(12, data.length);
-        var initialVisibility = data.map((trace, index) => index < defaultVisibleCount);
-
-        if (!layout.legend) {{
-            layout.legend = {{}};
-        }}
-        layout.legend.title = {{text: 'Продукти'}};
-        layout.legend.font = {{size: 10}};
-        layout.legend.tracegroupgap = 8;
-
-        Plotly.newPlot('chart', data, layout, config);
-        Plotly.restyle('chart', {{visible: initialVisibility}});
-
-        function filterProducts() {{
-            var searchText = document.getElementById('searchInput').value.toLowerCase();
-            if (!searchText) {{ showTopProducts(); return; }}
-            Plotly.restyle('chart', {{
-                visible: data.map(function(trace) {{
-                    return trace.name.toLowerCase().includes(searchText);
-                }})
-            }});
-        }}
-
-        function showTopProducts() {{
-            Plotly.restyle('chart', {{visible: data.map((trace, index) => index < defaultVisibleCount)}});
-            document.getElementById('searchInput').value = '';
-        }}
-
-        function showAll() {{
-            Plotly.restyle('chart', {{visible: data.map(() => true)}});
-            document.getElementById('searchInput').value = '';
-        }}
-
-        function hideAll() {{
-            Plotly.restyle('chart', {{visible: data.map(() => 'legendonly')}});
-        }}
-
-        function resetView() {{
-            Plotly.relayout('chart', {{
-                'xaxis.autorange': true,
-                'yaxis.autorange': true
-            }});
-        }}
-
-        document.getElementById('searchInput').addEventListener('keypress', function(e) {{
-            if (e.key === 'Enter') {{ filterProducts(); }}
-        }});
-    </script>
-</body>
-</html>'''
\ No newline at end of file
+        rows = (
+            dict(
+                item,
+                idx=idx,
+                row_bg="#f8f9fa" if idx % 2 == 0 else "white",
+                color="#dc3545" if item["change_percent"] > 0 else "#28a745",
+                arrow="↑" if item["change_percent"] > 0 else "↓",
+            )
+            for idx, item in enumerate(items, 1)
+        )
+        return CHART_TOP_TABLE.chunks({"title": title, "header_color": header_color, "rows": CHART_TOP_ROW.render_rows(rows)})
+
+    CHART_PAGE.write(
+        output_file,
+        plot_json=plot_json,
+        loader=loader,
+        top_up_html=table_block(top_up, "📊 Топ 10 продукти с най-голяма ценова промяна", "#007bff"),
+        top_down_html=table_block(top_down, "📉 Топ 10 продукти с най-голямо понижение на цените", "#28a745") if top_down else "",
+    )
@@ -0,0 +1,103 @@
+"""Компактен модел на парснати касови бележки.
+
+Класовете използват __slots__ (без __dict__ за всеки обект), защото при
+анализ на години бележки в паметта има стотици хиляди редове. Обектите се
+връщат от процесите за парсинг и се записват в таблиците receipts/line_items.
+"""
+
+from typing import List, Optional
+
+
+class LineItem:
+    """Един артикул от бележка.
+
+    price е нормализираната цена (€/кг, €/100г или за пакет), а amount е
+    сумата на реда в евро. unit е "€/кг" или "€/100г" (задава единицата на
+    продукта), "€" (само ако няма друга) или None (единицата не се променя).
+    """
+
+    __slots__ = ("product_name", "price", "unit", "quantity", "unit_price", "amount", "discount")
+
+    def __init__(
+        self,
+        product_name: str,
+        price: float,
+        unit: Optional[str] = None,
+        quantity: Optional[float] = None,
+        unit_price: Optional[float] = None,
+        amount: Optional[float] = None,
+        discount: float = 0.0,
+    ):
+        self.product_name = product_name
+        self.price = price
+        self.unit = unit
+        self.quantity = quantity
+        self.unit_price = unit_price
+        self.amount = price if amount is None else amount
+        self.discount = discount
+
+    def to_row(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row) -> "LineItem":
+        return cls(*row)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, LineItem) and self.to_row() == other.to_row()
+
+    def __repr__(self) -> str:
+        return f"LineItem({self.product_name!r}, {self.price:.4f}, {self.unit!r})"
+
+
+class Receipt:
+    """Парсната бележка. error е None, "no_date" или "bad_date".
+
+    receipt_hash покрива датата, часа и тялото на бележката; body_hash е само
+    на тялото – така бяха хеширани бележките в по-старите бази.
+    """
+
+    __slots__ = (
+        "index", "receipt_hash", "date", "error", "timestamp", "store", "total", "currency", "body_hash", "items",
+    )
+
+    def __init__(
+        self,
+        index: int,
+        receipt_hash: str,
+        date: Optional[str],
+        error: Optional[str] = None,
+        timestamp: Optional[str] = None,
+        store: Optional[str] = None,
+        total: Optional[float] = None,
+        currency: Optional[str] = None,
+        body_hash: Optional[str] = None,
+        items: Optional[List[LineItem]] = None,
+    ):
+        self.index = index
+        self.receipt_hash = receipt_hash
+        self.date = date
+        self.error = error
+        self.timestamp = timestamp
+        self.store = store
+        self.total = total
+        self.currency = currency
+        self.body_hash = body_hash
+        self.items = items if items is not None else []
+
+    def to_row(self) -> list:
+        """Бележката като списък от прости стойности (напр. за сравнение или JSON)."""
+        row = [getattr(self, name) for name in self.__slots__[:-1]]
+        row.append([item.to_row() for item in self.items])
+        return row
+
+    @classmethod
+    def from_row(cls, row) -> "Receipt":
+        *fields, items = row
+        return cls(*fields, items=[LineItem.from_row(item) for item in items])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Receipt) and self.to_row() == other.to_row()
+
+    def __repr__(self) -> str:
+        return f"Receipt(#{self.index}, {self.date!r}, {len(self.items)} артикула)"
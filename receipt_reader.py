@@ -0,0 +1,61 @@
+"""Поточно четене на файлове с касови бележки.
+
+Файлът се отваря чрез mmap (или се чете на блокове, ако mmap не е възможен)
+и се разделя по RECEIPT_SEPARATOR, без целият текст да се зарежда в паметта:
+във всеки момент се декодира само текущата бележка. Краищата на редовете
+се нормализират до \n (\r\n и \r от Windows/стар Mac), както при четене
+в текстов режим.
+"""
+
+import mmap
+from typing import Iterator
+
+RECEIPT_SEPARATOR = "БЕЛЕЖКА #"
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def iter_receipts(file_path, separator: str = RECEIPT_SEPARATOR) -> Iterator[str]:
+    """Връща бележките от файла една по една – текстът след всеки разделител.
+
+    Заглавната част преди първия разделител се пропуска, както при
+    content.split(separator)[1:].
+    """
+    sep = separator.encode("utf-8")
+    with open(file_path, "rb") as handle:
+        try:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Празен файл – mmap не приема дължина 0
+            return
+        except OSError:
+            yield from _iter_receipts_buffered(handle, sep)
+            return
+
+        with buffer:
+            pos = buffer.find(sep)
+            while pos != -1:
+                start = pos + len(sep)
+                pos = buffer.find(sep, start)
+                end = pos if pos != -1 else len(buffer)
+                yield _decode(buffer[start:end])
+
+
+def _iter_receipts_buffered(handle, sep: bytes) -> Iterator[str]:
+    """Резервен вариант без mmap: чете на блокове от READ_BLOCK_SIZE байта."""
+    pending = b""
+    started = False
+    while True:
+        block = handle.read(READ_BLOCK_SIZE)
+        parts = (pending + block).split(sep)
+        # Последната част може да продължава (или да съдържа начало на разделител) в следващия блок
+        pending = parts.pop() if block else b""
+        for part in parts:
+            if started:
+                yield _decode(part)
+            started = True
+        if not block:
+            return
+
+
+def _decode(raw: bytes) -> str:
+    return raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
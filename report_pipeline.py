@@ -0,0 +1,133 @@
+"""Паралелно генериране на отчетите след анализа.
+
+Всеки отчет е ReportStage: име, функция, допълнителни аргументи и имената на
+етапите, чиито резултати ползва (inputs – подават се първи, в същия ред).
+run_stages пуска всеки етап веднага щом входовете му са готови. Етапите с
+process=True (XLSX, matplotlib PNG) отиват в пул от процеси и не делят GIL-а
+с интерфейса, а останалите – в пул от нишки. Така общото време клони към
+най-бавния отчет, а не към сумата на всички.
+
+Грешка в етап не спира останалите; зависимите от него етапи се пропускат със
+същата грешка. За всеки етап се връща времето, измерено там, където е работил.
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+# Пуловете от процеси се стартират от процес с работещи нишки (писателя на
+# базата, Tk, нишката на анализа); fork копира и заетите им ключалки и
+# дъщерният процес може да блокира завинаги, затова – spawn.
+PROCESS_START_METHOD = "spawn"
+
+
+class ReportStage(NamedTuple):
+    name: str
+    func: Callable
+    args: tuple = ()
+    inputs: Tuple[str, ...] = ()
+    # В отделен процес: func и аргументите трябва да могат да се pickle-нат
+    process: bool = False
+
+
+class StageResult(NamedTuple):
+    name: str
+    value: Any
+    seconds: float
+    error: Optional[BaseException] = None
+
+
+def _timed(func: Callable, *args) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - started
+
+
+def _check_stages(stages: Sequence[ReportStage]) -> None:
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError("Повтарящи се имена на етапи")
+    for stage in stages:
+        unknown = [name for name in stage.inputs if name not in names]
+        if unknown:
+            raise ValueError(f"Етапът {stage.name} зависи от непознати етапи: {', '.join(unknown)}")
+
+
+def run_stages(stages: Sequence[ReportStage], max_workers: Optional[int] = None) -> Dict[str, StageResult]:
+    """Изпълнява етапите според зависимостите им; връща {име: StageResult} в реда на stages.
+
+    max_workers=1 изпълнява всичко последователно в текущата нишка; по
+    подразбиране е броят на ядрата (на едно ядро паралелизмът само добавя
+    разходи).
+    """
+    _check_stages(stages)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    pending = {stage.name: stage for stage in stages}
+    results: Dict[str, StageResult] = {}
+    running: Dict[Any, str] = {}
+    threads: Optional[Executor] = None
+    processes: Optional[Executor] = None
+
+    def start_ready() -> None:
+        progress = True
+        while progress:
+            progress = False
+            for name, stage in list(pending.items()):
+                if any(dep not in results for dep in stage.inputs):
+                    continue
+                del pending[name]
+                progress = True
+                failed = next((results[dep] for dep in stage.inputs if results[dep].error is not None), None)
+                if failed is not None:
+                    results[name] = StageResult(name, None, 0.0, failed.error)
+                    continue
+                args = tuple(results[dep].value for dep in stage.inputs) + tuple(stage.args)
+                if threads is None:
+                    results[name] = _run_inline(stage, args)
+                else:
+                    pool = processes if stage.process and processes is not None else threads
+                    running[pool.submit(_timed, stage.func, *args)] = name
+
+    try:
+        if max_workers != 1:
+            threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+            process_stages = sum(1 for stage in stages if stage.process)
+            if process_stages:
+                try:
+                    processes = ProcessPoolExecutor(
+                        max_workers=min(max_workers, process_stages),
+                        mp_context=multiprocessing.get_context(PROCESS_START_METHOD),
+                    )
+                except (OSError, NotImplementedError, ValueError):
+                    # Без пул от процеси тези етапи работят в нишки
+                    processes = None
+        start_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    value, seconds = future.result()
+                    results[name] = StageResult(name, value, seconds)
+                except Exception as exc:
+                    results[name] = StageResult(name, None, 0.0, exc)
+            start_ready()
+    finally:
+        for pool in (threads, processes):
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+    if pending:
+        raise ValueError(f"Циклични зависимости между етапите: {', '.join(pending)}")
+    return {stage.name: results[stage.name] for stage in stages}
+
+
+def _run_inline(stage: ReportStage, args: tuple) -> StageResult:
+    try:
+        value, seconds = _timed(stage.func, *args)
+    except Exception as exc:
+        return StageResult(stage.name, None, 0.0, exc)
+    return StageResult(stage.name, value, seconds)
@@ -0,0 +1,751 @@
+"""HTML шаблоните на отчетите в receipt_analysis (виж html_template).
+
+Компилират се веднъж при импорт на модула. Редовете на таблиците са отделни
+шаблони, които се рендират с render_rows() и се подават като стойност на
+полето за тялото на таблицата.
+"""
+
+from html_template import Template
+
+# Ред на таблицата в generate_years_html
+YEARS_ROW = Template('''
+            <tr style="background:{row_bg};{opacity}">
+              <td style="text-align:center">{idx}</td>
+              <td>{product}{conf_badge}</td>
+              <td style="text-align:center;color:#666">{basis}</td>
+              <td style="text-align:right">{avg_2025:.2f} €</td>
+              <td style="text-align:right">{avg_2026:.2f} €</td>
+              <td style="text-align:center;font-weight:bold;color:{diff_color}">{diff_text}</td>
+              <td style="text-align:center;color:#999">{measurements_2025}</td>
+              <td style="text-align:center;color:#999">{measurements_2026}</td>
+            </tr>''')
+
+# Годишното сравнение; table_rows е YEARS_ROW.render_rows(...)
+YEARS_PAGE = Template('''<!DOCTYPE html>
+<html lang="bg">
+<head>
+  <meta charset="utf-8">
+  <title>Lidl – Сравнение 2025/2026</title>
+  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+  <style>
+    *{{ box-sizing:border-box; }}
+    body{{ font-family:'Segoe UI',Arial,sans-serif; margin:0; padding:16px 20px; background:#f4f6f9; color:#1e293b; }}
+    h1{{ margin:0 0 4px; font-size:20px; color:#1e3a5f; }}
+    .sub{{ color:#64748b; font-size:13px; margin-bottom:14px; }}
+    .kpi-row{{ display:flex; gap:12px; flex-wrap:wrap; margin-bottom:16px; }}
+    .kpi{{ background:white; border-radius:10px; padding:12px 18px; flex:1; min-width:140px;
+            box-shadow:0 1px 4px rgba(0,0,0,.08); border-left:4px solid #cbd5e1; }}
+    .kpi.up{{ border-color:#d64541; }}
+    .kpi.dn{{ border-color:#22c55e; }}
+    .kpi.neutral{{ border-color:#3b82f6; }}
+    .kpi .val{{ font-size:22px; font-weight:700; line-height:1.1; }}
+    .kpi .lbl{{ font-size:11px; color:#64748b; margin-top:2px; }}
+    .card{{ background:white; border-radius:10px; padding:16px; box-shadow:0 1px 4px rgba(0,0,0,.08); margin-bottom:16px; }}
+    .toggle-row{{ display:flex; gap:8px; align-items:center; margin-bottom:10px; flex-wrap:wrap; }}
+    button{{ padding:6px 14px; border:1px solid #cbd5e1; border-radius:6px; cursor:pointer;
+             background:white; color:#334155; font-size:12px; transition:all .15s; }}
+    button.active, button:hover{{ background:#1e3a5f; color:white; border-color:#1e3a5f; }}
+    input#search{{ padding:6px 12px; border:1px solid #cbd5e1; border-radius:6px;
+                   font-size:12px; width:220px; outline:none; }}
+    table{{ width:100%; border-collapse:collapse; font-size:12px; }}
+    thead tr{{ background:#1e3a5f; color:white; }}
+    th{{ padding:9px 8px; border:1px solid #2d5080; cursor:pointer; user-select:none; white-space:nowrap; }}
+    th:hover{{ background:#2b5aa0; }}
+    td{{ border:1px solid #e2e8f0; padding:7px 8px; }}
+    .note{{ font-size:11px; color:#94a3b8; margin-top:8px; }}
+  </style>
+</head>
+<body>
+  <h1>Сравнение на цени Lidl: 2025 → 2026</h1>
+  <div class="sub">Сортирано по абсолютна промяна &nbsp;|&nbsp; ⚠ = само по 1 измерване (по-малко надеждно)</div>
+
+  <div class="kpi-row">
+    <div class="kpi neutral">
+      <div class="val">{total}</div>
+      <div class="lbl">сравнени артикула</div>
+    </div>
+    <div class="kpi up">
+      <div class="val">{avg_sign}{avg_change:.1f}%</div>
+      <div class="lbl" style="color:{avg_color}">средна промяна</div>
+    </div>
+    <div class="kpi up">
+      <div class="val">{increased}</div>
+      <div class="lbl">поскъпнали</div>
+    </div>
+    <div class="kpi dn">
+      <div class="val">{decreased}</div>
+      <div class="lbl">поевтинели</div>
+    </div>
+    <div class="kpi up">
+      <div class="val" title="{top_up_product}" style="font-size:14px;color:#d64541">+{top_up_change:.1f}%</div>
+      <div class="lbl">най-голямо поскъпване: {top_up_label}</div>
+    </div>
+    <div class="kpi dn">
+      <div class="val" title="{top_dn_product}" style="font-size:14px;color:#22c55e">{top_dn_change:.1f}%</div>
+      <div class="lbl">най-голямо поевтиняване: {top_dn_label}</div>
+    </div>
+  </div>
+
+  <div class="card">
+    <div class="toggle-row">
+      <button class="active" onclick="showChart('diverging')">% Промяна</button>
+      <button onclick="showChart('grouped')">2025 vs 2026</button>
+      <button id="btnTop" class="active" onclick="toggleTop()">Топ 20</button>
+      <button id="btnAll" onclick="toggleTop()">Всички ({total})</button>
+    </div>
+    <div id="chart"></div>
+  </div>
+
+  <div class="card">
+    <div class="toggle-row">
+      <input id="search" type="text" placeholder="Търси артикул…" oninput="filterTable()">
+      <label style="font-size:12px;color:#64748b;margin-left:8px">
+        <input type="checkbox" id="hideWeak" onchange="filterTable()"> Скрий ниско-надеждни
+      </label>
+      <span id="count" style="margin-left:auto;font-size:12px;color:#94a3b8"></span>
+    </div>
+    <table id="tbl">
+      <thead>
+        <tr>
+          <th onclick="sortTable(0)">#</th>
+          <th onclick="sortTable(1)">Артикул ↕</th>
+          <th onclick="sortTable(2)">Единица</th>
+          <th onclick="sortTable(3)">Ср. 2025 ↕</th>
+          <th onclick="sortTable(4)">Ср. 2026 ↕</th>
+          <th onclick="sortTable(5)">Промяна % ↕</th>
+          <th onclick="sortTable(6)">Изм. 2025</th>
+          <th onclick="sortTable(7)">Изм. 2026</th>
+        </tr>
+      </thead>
+      <tbody id="tbody">{table_rows}</tbody>
+    </table>
+    <div class="note">Промяната е изчислена спрямо средна цена за годината. Продукти с 1 измерване са маркирани ⚠.</div>
+  </div>
+
+  <script>
+    var ALL = {chart_json};
+    var showTop = true;
+    var chartMode = 'diverging';
+
+    var cfg = {{
+        responsive: true, displaylogo: false,
+        toImageButtonOptions: {{ format:'png', filename:'lidl_2025_2026', scale:2 }}
+    }};
+
+    function buildDiverging(data) {{
+        var labels = data.map(r => r.label);
+        var vals   = data.map(r => r.change_pct);
+        var colors = vals.map(v => v > 0 ? (v > 20 ? '#b91c1c' : '#e87070') : (v < -20 ? '#15803d' : '#4ade80'));
+        var custom = data.map(r => [r.product, r.avg_2025, r.avg_2026, r.basis]);
+        return [{{
+            type:'bar', orientation:'h',
+            y: labels, x: vals,
+            marker:{{ color: colors }},
+            customdata: custom,
+            hovertemplate:'<b>%{{customdata[0]}}</b><br>Промяна: <b>%{{x:+.1f}}%</b><br>2025: %{{customdata[1]:.2f}} € &nbsp; 2026: %{{customdata[2]:.2f}} €<br>Единица: %{{customdata[3]}}<extra></extra>'
+        }}];
+    }}
+
+    function buildGrouped(data) {{
+        var labels = data.map(r => r.label);
+        var custom = data.map(r => r.product);
+        return [
+            {{ type:'bar', name:'2025', orientation:'h', y:labels, x:data.map(r=>r.avg_2025),
+               marker:{{color:'#7fb3d3'}}, customdata:custom,
+               hovertemplate:'<b>%{{customdata}}</b><br>2025: € %{{x:.2f}}<extra></extra>' }},
+            {{ type:'bar', name:'2026', orientation:'h', y:labels, x:data.map(r=>r.avg_2026),
+               marker:{{color:'#f0a500'}}, customdata:custom,
+               hovertemplate:'<b>%{{customdata}}</b><br>2026: € %{{x:.2f}}<extra></extra>' }}
+        ];
+    }}
+
+    function drawChart() {{
+        var data = showTop ? ALL.slice(0,20) : ALL;
+        data = data.slice().reverse();   // най-голяма промяна отгоре
+        var traces, layout;
+
+        if (chartMode === 'diverging') {{
+            traces = buildDiverging(data);
+            var maxAbs = Math.max(0.1, ...data.map(r => Math.abs(r.change_pct)));
+            layout = {{
+                title: {{ text: 'Промяна в цената (%) 2025 → 2026', x:0.5, xanchor:'center', font:{{size:15}} }},
+                template:'plotly_white',
+                height: Math.max(380, data.length * 34 + 180),
+                xaxis: {{ title:'% промяна', zeroline:true, zerolinecolor:'#94a3b8', zerolinewidth:2,
+                          gridcolor:'#e2e8f0', range:[-maxAbs*1.25, maxAbs*1.35] }},
+                yaxis: {{ gridcolor:'#e2e8f0', automargin:true, tickfont:{{size:10}} }},
+                margin: {{ l:20, r:60, t:60, b:50 }},
+                bargap: 0.18
+            }};
+        }} else {{
+            traces = buildGrouped(data);
+            layout = {{
+                title: {{ text: 'Средна цена 2025 vs 2026', x:0.5, xanchor:'center', font:{{size:15}} }},
+                template:'plotly_white', barmode:'group',
+                height: Math.max(380, data.length * 48 + 200),
+                xaxis: {{ title:'Цена (€)', zeroline:false, gridcolor:'#e2e8f0' }},
+                yaxis: {{ gridcolor:'#e2e8f0', automargin:true, tickfont:{{size:10}} }},
+                margin: {{ l:20, r:40, t:60, b:50 }},
+                legend: {{ orientation:'h', x:0.5, xanchor:'center', y:1.08 }},
+                bargap: 0.2
+            }};
+        }}
+        Plotly.react('chart', traces, layout, cfg);
+    }}
+
+    function showChart(mode) {{
+        chartMode = mode;
+        document.querySelectorAll('.toggle-row button').forEach(b => {{
+            if (b.textContent.startsWith('% ') || b.textContent.startsWith('2025')) b.classList.remove('active');
+        }});
+        event.target.classList.add('active');
+        drawChart();
+    }}
+
+    function toggleTop() {{
+        showTop = !showTop;
+        document.getElementById('btnTop').classList.toggle('active', showTop);
+        document.getElementById('btnAll').classList.toggle('active', !showTop);
+        drawChart();
+    }}
+
+    drawChart();
+
+    // ── table filter & sort ─────────────────────────────────────────────────
+    var sortDir = {{}};
+    function filterTable() {{
+        var q = document.getElementById('search').value.toLowerCase();
+        var hideWeak = document.getElementById('hideWeak').checked;
+        var rows = document.querySelectorAll('#tbody tr');
+        var vis = 0;
+        rows.forEach(function(tr) {{
+            var txt = tr.cells[1].textContent.toLowerCase();
+            var weak = tr.cells[1].textContent.includes('⚠');
+            var show = txt.includes(q) && !(hideWeak && weak);
+            tr.style.display = show ? '' : 'none';
+            if (show) vis++;
+        }});
+        document.getElementById('count').textContent = vis + ' / ' + rows.length + ' артикула';
+    }}
+    filterTable();
+
+    function sortTable(col) {{
+        var tbody = document.getElementById('tbody');
+        var rows = Array.from(tbody.querySelectorAll('tr'));
+        sortDir[col] = !sortDir[col];
+        rows.sort(function(a, b) {{
+            var va = a.cells[col].textContent.trim();
+            var vb = b.cells[col].textContent.trim();
+            var na = parseFloat(va.replace(/[^\\d.\\-+]/g,''));
+            var nb = parseFloat(vb.replace(/[^\\d.\\-+]/g,''));
+            if (!isNaN(na) && !isNaN(nb)) return sortDir[col] ? na-nb : nb-na;
+            return sortDir[col] ? va.localeCompare(vb,'bg') : vb.localeCompare(va,'bg');
+        }});
+        rows.forEach(r => tbody.appendChild(r));
+    }}
+  </script>
+</body>
+</html>''')
+
+# Ред на таблицата в generate_seasonal_html
+SEASONAL_ROW = Template('''
+            <tr style="background:{row_bg}">
+              <td style="padding:8px;border:1px solid #ddd;text-align:center">{idx}</td>
+              <td style="padding:8px;border:1px solid #ddd">{name}</td>
+              <td style="padding:8px;border:1px solid #ddd;text-align:center">{summer_count}</td>
+              <td style="padding:8px;border:1px solid #ddd;text-align:right">{avg_summer}</td>
+              <td style="padding:8px;border:1px solid #ddd;text-align:center">{off_season_count}</td>
+              <td style="padding:8px;border:1px solid #ddd;text-align:right">{avg_off}</td>
+              <td style="padding:8px;border:1px solid #ddd;text-align:center;font-weight:bold;color:{diff_color}">{diff_text}</td>
+              <td style="padding:8px;border:1px solid #ddd;font-size:11px;color:#555">{summer_prices}</td>
+              <td style="padding:8px;border:1px solid #ddd;font-size:11px;color:#555">{off_season_prices}</td>
+            </tr>''')
+
+# Сезонният отчет; table_rows е SEASONAL_ROW.render_rows(...)
+SEASONAL_PAGE = Template('''<!DOCTYPE html>
+<html lang="bg">
+<head>
+  <meta charset="utf-8">
+  <title>Lidl – Сезонен анализ на плодове и зеленчуци</title>
+  <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+  <style>
+    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background: #f5f5f5; }}
+    h1 {{ color: #2c7a2c; }}
+    h2 {{ color: #333; margin-top: 30px; }}
+    .legend-box {{ display: inline-block; width: 14px; height: 14px;
+                   border-radius: 3px; margin-right: 6px; vertical-align: middle; }}
+    .info-banner {{ background: #fff3cd; border-left: 5px solid #ffc107;
+                    padding: 12px 16px; margin-bottom: 20px; border-radius: 4px; }}
+    table {{ width: 100%; border-collapse: collapse; background: white; font-size: 13px; }}
+    thead tr {{ background: #2c7a2c; color: white; }}
+    th {{ padding: 10px; border: 1px solid #999; }}
+    .controls {{ margin-bottom: 16px; }}
+    input[type=text] {{ padding: 7px; width: 260px; border: 1px solid #ccc;
+                        border-radius: 4px; font-size: 14px; }}
+    button {{ padding: 7px 18px; margin: 4px; border: none; border-radius: 4px;
+              cursor: pointer; font-size: 13px; }}
+    .btn-green {{ background: #2c7a2c; color: white; }}
+    .btn-gray  {{ background: #6c757d; color: white; }}
+  </style>
+</head>
+<body>
+  <h1>🌿 Lidl – Сезонен анализ на плодове и зеленчуци</h1>
+
+  <div class="info-banner">
+    <strong>Легенда:</strong>
+    <span class="legend-box" style="background:#ffc107;opacity:0.5"></span> Летен сезон ({summer_months}) |&nbsp;
+    <span style="color:#e74c3c;font-weight:bold">↑ Скъпи лятото</span> (разлика &gt;5%) |&nbsp;
+    <span style="color:#27ae60;font-weight:bold">↓ По-евтини лятото</span> (разлика &lt;–5%) |&nbsp;
+    <span style="color:#888">≈ Без съществена разлика</span><br>
+    <small>Цените са в EUR. Средната лятна цена се сравнява с извън-сезонната (жълтите ленти = юни – септември).</small>
+  </div>
+
+  <h2>📈 Ценова история</h2>
+  <div class="controls">
+    <input type="text" id="searchInput" placeholder="Търси продукт...">
+    <button class="btn-green" onclick="filterTraces()">Филтрирай</button>
+    <button class="btn-gray" onclick="showAllTraces()">Всички</button>
+    <button class="btn-gray" onclick="hideAllTraces()">Скрий всички</button>
+  </div>
+  <div id="chart"></div>
+
+  <h2>📊 Сравнителна таблица по сезон</h2>
+  <table>
+    <thead>
+      <tr>
+        <th>#</th>
+        <th>Продукт</th>
+        <th>Брой цени<br>(лято)</th>
+        <th>Ср. цена лято<br>({summer_months})</th>
+        <th>Брой цени<br>(извън сезон)</th>
+        <th>Ср. цена извън сезон<br>({off_season_months})</th>
+        <th>Разлика</th>
+        <th>Цени лято (€)</th>
+        <th>Цени извън сезон (€)</th>
+      </tr>
+    </thead>
+    <tbody>
+      {table_rows}
+    </tbody>
+  </table>
+
+  <p style="margin-top:20px;color:#666;font-size:12px">
+    Генерирано от Lidl Receipt Downloader • {generated}
+  </p>
+
+  <script>
+    var traces = {traces_json};
+    var shapes = {shapes_json};
+    var layout = {{
+      title: 'Цени на плодове и зеленчуци (жълто = летен сезон)',
+      xaxis: {{ title: 'Дата', tickformat: '%d.%m.%Y', rangeslider: {{visible: true}} }},
+      yaxis: {{ title: 'Цена (€/кг)' }},
+      shapes: shapes,
+      hovermode: 'closest',
+      template: 'plotly_white',
+      height: 600,
+      legend: {{ orientation: 'v', x: 1.02, y: 1 }},
+      margin: {{l:60, r:260, t:80, b:60}}
+    }};
+    Plotly.newPlot('chart', traces, layout, {{responsive: true}});
+
+    function filterTraces() {{
+      var q = document.getElementById('searchInput').value.toLowerCase();
+      if (!q) {{ showAllTraces(); return; }}
+      var vis = traces.map(t => t.name.toLowerCase().includes(q));
+      Plotly.restyle('chart', {{visible: vis}});
+    }}
+    function showAllTraces() {{
+      Plotly.restyle('chart', {{visible: traces.map(() => true)}});
+      document.getElementById('searchInput').value = '';
+    }}
+    function hideAllTraces() {{
+      Plotly.restyle('chart', {{visible: traces.map(() => 'legendonly')}});
+    }}
+    document.getElementById('searchInput').addEventListener('keypress', function(e) {{
+      if (e.key === 'Enter') filterTraces();
+    }});
+  </script>{loader}
+</body>
+</html>''')
+
+# Ред от топ-10 таблиците на интерактивната графика (полетата на PriceMatrix.top_movers)
+CHART_TOP_ROW = Template('''
+            <tr style="background-color: {row_bg};">
+                <td style="padding: 10px; border: 1px solid #ddd; text-align: center; font-weight: bold;">{idx}</td>
+                <td style="padding: 10px; border: 1px solid #ddd;">{name} <small style="color:#888">({unit})</small></td>
+                <td style="padding: 10px; border: 1px solid #ddd; text-align: center; font-weight: bold; color: {color};">{arrow} {change_percent:+.2f}%</td>
+                <td style="padding: 10px; border: 1px solid #ddd; text-align: right;">{min_price:.2f}<br><small style="color: #666;">({min_price_date})</small></td>
+                <td style="padding: 10px; border: 1px solid #ddd; text-align: right;">{max_price:.2f}<br><small style="color: #666;">({max_price_date})</small></td>
+            </tr>''')
+
+# Топ-10 таблица; rows е CHART_TOP_ROW.render_rows(...)
+CHART_TOP_TABLE = Template('''
+            <div class="table-container" style="margin-top: 30px; padding: 20px; background-color: white; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1);">
+                <h2 style="color: #333; margin-bottom: 20px;">{title}</h2>
+                <table style="width: 100%; border-collapse: collapse; font-size: 14px;">
+                    <thead>
+                        <tr style="background-color: {header_color}; color: white;">
+                            <th style="padding: 12px; text-align: left; border: 1px solid #ddd;">#</th>
+                            <th style="padding: 12px; text-align: left; border: 1px solid #ddd;">Продукт</th>
+                            <th style="padding: 12px; text-align: center; border: 1px solid #ddd;">Промяна (%)</th>
+                            <th style="padding: 12px; text-align: right; border: 1px solid #ddd;">Мин. цена (€)</th>
+                            <th style="padding: 12px; text-align: right; border: 1px solid #ddd;">Макс. цена (€)</th>
+                        </tr>
+                    </thead>
+                    <tbody>{rows}</tbody>
+                </table>
+            </div>''')
+
+# Интерактивната графика; top_up_html/top_down_html са CHART_TOP_TABLE
+CHART_PAGE = Template('''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Lidl - Интерактивна графика на цените</title>
+    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }}
+        .container {{
+            max-width: 100%;
+            margin: 0 auto;
+            background-color: white;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }}
+        .controls {{ margin-bottom: 20px; padding: 15px; background-color: #f8f9fa; border-radius: 5px; }}
+        .control-group {{ margin-bottom: 15px; }}
+        label {{ font-weight: bold; margin-right: 10px; display: inline-block; width: 150px; }}
+        input[type="text"] {{ padding: 8px; width: 300px; border: 1px solid #ddd; border-radius: 4px; }}
+        button {{ padding: 8px 20px; margin: 5px; border: none; border-radius: 4px; cursor: pointer; font-size: 14px; }}
+        .btn-primary {{ background-color: #007bff; color: white; }}
+        .btn-primary:hover {{ background-color: #0056b3; }}
+        .btn-secondary {{ background-color: #6c757d; color: white; }}
+        .btn-secondary:hover {{ background-color: #545b62; }}
+        .btn-success {{ background-color: #28a745; color: white; }}
+        .btn-success:hover {{ background-color: #218838; }}
+        .info {{ margin-top: 10px; padding: 10px; background-color: #d1ecf1; border-left: 4px solid #0c5460; color: #0c5460; }}
+        #chart {{ margin-top: 20px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>🛒 Lidl - Интерактивна графика на цените</h1>
+
+        <div class="controls">
+            <div class="control-group">
+                <label>🔍 Търси продукт:</label>
+                <input type="text" id="searchInput" placeholder="Въведете име на продукт...">
+                <button class="btn-primary" onclick="filterProducts()">Филтрирай</button>
+                <button class="btn-success" onclick="showTopProducts()">Покажи първите 12</button>
+            </div>
+
+            <div class="control-group">
+                <button class="btn-success" onclick="showAll()">Покажи всички</button>
+                <button class="btn-secondary" onclick="hideAll()">Скрий всички</button>
+                <button class="btn-secondary" onclick="resetView()">Възстанови изглед</button>
+            </div>
+
+            <div class="info">
+                <strong>💡 Съвети:</strong>
+                <ul style="margin: 5px 0;">
+                    <li>По подразбиране показваме първите 12 продукта, за да не се губите при голям брой линии</li>
+                    <li>Кликнете на продукт в легендата за да го покажете/скриете</li>
+                    <li>Използвайте мишката за приближаване (scroll) и местене (drag)</li>
+                    <li>Използвайте филтъра за търсене на конкретни продукти</li>
+                    <li>Двоен клик на легендата изолира един продукт</li>
+                </ul>
+            </div>
+        </div>
+
+        <div id="chart"></div>
+
+        {top_up_html}
+
+        {top_down_html}
+    </div>
+
+    <script>
+        var plotData = {plot_json};
+        var layout = plotData.layout;
+        var data = plotData.data;
+        var config = {{
+            responsive: true,
+            displayModeBar: true,
+            modeBarButtonsToAdd: ['drawopenpath', 'eraseshape'],
+            toImageButtonOptions: {{
+                format: 'png',
+                filename: 'lidl_prices_chart',
+                height: 1080,
+                width: 1920,
+                scale: 2
+            }}
+        }};
+
+        var originalVisibility = data.map(trace => trace.visible);
+        var defaultVisibleCount = Math.min(12, data.length);
+        var initialVisibility = data.map((trace, index) => index < defaultVisibleCount);
+
+        if (!layout.legend) {{
+            layout.legend = {{}};
+        }}
+        layout.legend.title = {{text: 'Продукти'}};
+        layout.legend.font = {{size: 10}};
+        layout.legend.tracegroupgap = 8;
+
+        Plotly.newPlot('chart', data, layout, config);
+        Plotly.restyle('chart', {{visible: initialVisibility}});
+
+        function filterProducts() {{
+            var searchText = document.getElementById('searchInput').value.toLowerCase();
+            if (!searchText) {{ showTopProducts(); return; }}
+            Plotly.restyle('chart', {{
+                visible: data.map(function(trace) {{
+                    return trace.name.toLowerCase().includes(searchText);
+                }})
+            }});
+        }}
+
+        function showTopProducts() {{
+            Plotly.restyle('chart', {{visible: data.map((trace, index) => index < defaultVisibleCount)}});
+            document.getElementById('searchInput').value = '';
+        }}
+
+        function showAll() {{
+            Plotly.restyle('chart', {{visible: data.map(() => true)}});
+            document.getElementById('searchInput').value = '';
+        }}
+
+        function hideAll() {{
+            Plotly.restyle('chart', {{visible: data.map(() => 'legendonly')}});
+        }}
+
+        function resetView() {{
+            Plotly.relayout('chart', {{
+                'xaxis.autorange': true,
+                'yaxis.autorange': true
+            }});
+        }}
+
+        document.getElementById('searchInput').addEventListener('keypress', function(e) {{
+            if (e.key === 'Enter') {{ filterProducts(); }}
+        }});
+    </script>{loader}
+</body>
+</html>''')
+
+# Отчетите на лендинг страницата: (ключ във files_info, икона, заглавие, описание)
+INDEX_REPORTS = (
+    ("xlsx", "📊", "XLSX – История на цените", "Excel файл със всички цени по дати"),
+    ("chart", "📈", "Интерактивна графика", "Линейни графики с всички продукти"),
+    ("seasonal", "🌱", "Сезонен анализ", "Сравнение на цените на плодове и зеленчуци"),
+    ("years", "📊", "Годишно сравнение 2025/2026", "Промяна на цени между годините"),
+    ("db_report", "💾", "Локална база данни", "История на цени от локално хранилище"),
+)
+
+INDEX_LINK = Template('''          <a href="{href}" class="report-link" title="{path}">
+            <span class="report-icon">{icon}</span>{title}<small>{description}</small></a>
+''')
+
+# Лендинг страницата; report_links е INDEX_LINK.render_rows(...)
+INDEX_PAGE = Template('''<!DOCTYPE html>
+<html lang="bg">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>Lidl Цени Анализ – Начало</title>
+  <style>
+    * {{ box-sizing: border-box; }}
+    body {{
+      font-family: 'Segoe UI', Arial, sans-serif;
+      margin: 0;
+      padding: 20px;
+      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+      color: #333;
+      min-height: 100vh;
+    }}
+    .container {{
+      max-width: 900px;
+      margin: 0 auto;
+      background: white;
+      border-radius: 12px;
+      box-shadow: 0 20px 60px rgba(0,0,0,0.3);
+      overflow: hidden;
+    }}
+    .header {{
+      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+      color: white;
+      padding: 40px 30px;
+      text-align: center;
+    }}
+    h1 {{
+      margin: 0 0 10px;
+      font-size: 36px;
+      font-weight: 700;
+    }}
+    .tagline {{
+      font-size: 18px;
+      opacity: 0.95;
+      margin: 0;
+    }}
+    .content {{
+      padding: 40px 30px;
+    }}
+    .section {{
+      margin-bottom: 35px;
+    }}
+    .section h2 {{
+      color: #667eea;
+      font-size: 22px;
+      margin-top: 0;
+      border-bottom: 3px solid #f0f0f0;
+      padding-bottom: 10px;
+    }}
+    .features {{
+      display: grid;
+      grid-template-columns: 1fr 1fr;
+      gap: 20px;
+    }}
+    @media (max-width: 600px) {{
+      .features {{ grid-template-columns: 1fr; }}
+    }}
+    .feature {{
+      background: #f8f9ff;
+      padding: 20px;
+      border-radius: 8px;
+      border-left: 4px solid #667eea;
+    }}
+    .feature h3 {{
+      color: #667eea;
+      margin-top: 0;
+      font-size: 16px;
+    }}
+    .feature p {{
+      margin: 8px 0 0;
+      font-size: 14px;
+      color: #666;
+      line-height: 1.5;
+    }}
+    .reports {{
+      display: grid;
+      grid-template-columns: 1fr;
+      gap: 12px;
+    }}
+    .report-link {{
+      display: block;
+      padding: 16px 20px;
+      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+      color: white;
+      text-decoration: none;
+      border-radius: 8px;
+      transition: transform 0.2s, box-shadow 0.2s;
+      font-weight: 600;
+    }}
+    .report-link:hover {{
+      transform: translateY(-2px);
+      box-shadow: 0 10px 25px rgba(102, 126, 234, 0.4);
+    }}
+    .report-link:disabled {{
+      opacity: 0.5;
+      cursor: not-allowed;
+      transform: none;
+    }}
+    .report-link small {{
+      display: block;
+      font-size: 12px;
+      opacity: 0.9;
+      margin-top: 4px;
+    }}
+    .report-icon {{
+      margin-right: 10px;
+      font-size: 18px;
+    }}
+    .info-box {{
+      background: #fff3cd;
+      border-left: 4px solid #ffc107;
+      padding: 16px;
+      border-radius: 6px;
+      margin: 20px 0;
+      font-size: 14px;
+      line-height: 1.6;
+    }}
+    .footer {{
+      background: #f8f9fa;
+      padding: 20px 30px;
+      text-align: center;
+      border-top: 1px solid #e0e0e0;
+      font-size: 12px;
+      color: #999;
+    }}
+    .timestamp {{
+      font-size: 12px;
+      color: #999;
+    }}
+  </style>
+</head>
+<body>
+  <div class="container">
+    <div class="header">
+      <h1>🛒 Lidl Цени Анализ</h1>
+      <p class="tagline">Проследявайте промените в цените на продуктите във времето</p>
+    </div>
+
+    <div class="content">
+      <div class="section">
+        <h2>📊 Какво прави приложението?</h2>
+        <p>Приложението анализира касови бележки от Lidl България и:</p>
+        <div class="features">
+          <div class="feature">
+            <h3>📈 История на цените</h3>
+            <p>Отслеждане на цените на продуктите във времето с интерактивни графики</p>
+          </div>
+          <div class="feature">
+            <h3>📋 XLSX експорт</h3>
+            <p>Экспортиране на всички данни в Excel за допълнител анализ</p>
+          </div>
+          <div class="feature">
+            <h3>🌱 Сезонен анализ</h3>
+            <p>Сравнение на цените на плодове и зеленчуци през лятото и извън сезона</p>
+          </div>
+          <div class="feature">
+            <h3>📊 Годишно сравнение</h3>
+            <p>Промяна на цен между 2025 и 2026 година с детайлна таблица</p>
+          </div>
+        </div>
+      </div>
+
+      <div class="section">
+        <h2>📁 Генерирани отчети</h2>
+        <div class="reports">
+{report_links}        </div>
+      </div>
+
+      <div class="section">
+        <h2>💡 Как да използвам?</h2>
+        <ol style="line-height: 1.8; color: #666;">
+          <li><strong>Изтеглете касова бележка</strong> – Преведете касовата бележка в текстов файл</li>
+          <li><strong>Добавете файла</strong> – Селектирайте файла в приложението</li>
+          <li><strong>Пуснете анализа</strong> – Приложението обработва данните и генерира отчетите</li>
+          <li><strong>Преглеждайте отчетите</strong> – Отворете генерираните HTML и Excel файлове</li>
+        </ol>
+      </div>
+
+      <div class="info-box">
+        <strong>ℹ️ Забележка:</strong> Всеки нов анализ генерира нови файлове в папката <code>Документи</code>. 
+        Проверете времето на промяна на файловете за да видите кои са най-новите.
+      </div>
+    </div>
+
+    <div class="footer">
+      <div class="timestamp">Генерирано: {generated}</div>
+      <p style="margin: 10px 0 0;">Lidl Цени Анализ v1.0</p>
+    </div>
+  </div>
+</body>
+</html>''')
@@ -0,0 +1,85 @@
+import gzip
+import json
+import tempfile
+import unittest
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from chart_data import DECIMATE_POINTS, SHARD_MAX_TRACES, data_dir_for, externalize_traces, lttb_indices, prepare_traces
+from price_db import UNIX_EPOCH_ORDINAL
+from receipt_analysis import ReceiptAnalyzer
+
+
+class ChartDataTests(unittest.TestCase):
+    def test_hidden_traces_are_sharded_per_group_in_compact_form(self):
+        traces = [{"name": "видима", "x": ["2025-01-01"], "y": [1.0]}] + [
+            {"name": f"скрита {i}", "visible": "legendonly", "x": ["2025-01-01T00:00:00", "2025-01-04"], "y": [1.23456, 2]}
+            for i in range(SHARD_MAX_TRACES + 1)
+        ]
+        groups = [None] + ["fruit_veg"] * SHARD_MAX_TRACES + [None]
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "report.html"
+            manifest = externalize_traces(traces, groups, output_file, "json.gz")
+
+            self.assertEqual(manifest["files"], [
+                "report_data/fruit_veg-0.json.gz", "report_data/other-0.json.gz",
+            ])
+            self.assertEqual(manifest["shardOf"][:2], [None, 0])
+            self.assertEqual(manifest["shardOf"][-1], 1)
+            self.assertEqual(traces[0]["x"], ["2025-01-01"])
+            self.assertNotIn("x", traces[1])
+
+            payload = json.loads(gzip.decompress((data_dir_for(output_file) / "other-0.json.gz").read_bytes()))
+            self.assertEqual(payload["traces"], [SHARD_MAX_TRACES + 1])
+            self.assertEqual(payload["series"], [{"d": [20089, 3], "y": [1.2346, 2.0]}])
+
+    def test_local_report_embeds_only_the_first_traces(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            (f"ПРОДУКТ {i:02d}", f"2025-0{month}-01", 1.0 + i + month / 10, "€/кг", "receipt", None)
+            for i in range(20) for month in (1, 2, 3)
+        ])
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "local.html"
+            analyzer.generate_local_db_report(str(output_file), data_format="js")
+
+            html = output_file.read_text(encoding="utf-8")
+            self.assertIn("lidlLazyChart('chart'", html)
+            traces = json.loads(html.split("var traces = ", 1)[1].split(";\n", 1)[0])
+            self.assertEqual([("x" in trace, trace.get("visible", True)) for trace in traces],
+                             [(True, True)] * 12 + [(False, "legendonly")] * 8)
+            shard = (data_dir_for(output_file) / "other-0.js").read_text(encoding="utf-8")
+            self.assertTrue(shard.startswith("lidlChartShard({"))
+            self.assertEqual(len(json.loads(shard[len("lidlChartShard("):-2])["traces"]), 8)
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        x = np.arange(10_000, dtype=np.float64)
+        y = np.sin(x / 500)
+        y[4321] = 10.0
+        selected = lttb_indices(x, y, 200)
+
+        self.assertEqual(len(selected), 200)
+        self.assertEqual((selected[0], selected[-1]), (0, 9999))
+        self.assertIn(4321, selected)
+        self.assertTrue(np.all(np.diff(selected) > 0))
+
+    def test_long_series_are_decimated_with_full_data_kept_for_zoom(self):
+        days = [(date(2015, 1, 1) + timedelta(days=i)).isoformat() for i in range(3000)]
+        traces = [{"name": f"продукт {i}", "x": days, "y": [1.0 + i] * 3000} for i in range(50)]
+        traces.append({"name": "кратка", "x": days[:3], "y": [1.0, 2.0, 3.0]})
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "report.html"
+            loader = prepare_traces(traces, [None] * len(traces), output_file, "json")
+            manifest = json.loads(loader.split("lidlLazyChart('chart', ", 1)[1].split(");\n", 1)[0])
+            full = json.loads((data_dir_for(output_file) / "full-0.json").read_text(encoding="utf-8"))
+
+        self.assertEqual([len(trace["x"]) for trace in traces], [DECIMATE_POINTS] * 50 + [3])
+        self.assertEqual({trace["type"] for trace in traces}, {"scattergl"})
+        self.assertEqual(manifest["full"], {"traces": list(range(50)), "files": ["report_data/full-0.json"]})
+        self.assertEqual(full["series"][0]["d"], [date(2015, 1, 1).toordinal() - UNIX_EPOCH_ORDINAL] + [1] * 2999)
+
+
+if __name__ == "__main__":
+    unittest.main()
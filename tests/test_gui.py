@@ -0,0 +1,81 @@
+import importlib.util
+import queue
+import threading
+import unittest
+import unittest.mock
+
+
+@unittest.skipUnless(importlib.util.find_spec("tkcalendar"), "tkcalendar не е инсталиран")
+class GuiTests(unittest.TestCase):
+    def make_gui(self):
+        from lidl_scraper_gui import LidlGUI
+
+        gui = LidlGUI.__new__(LidlGUI)
+        gui.root = unittest.mock.Mock()
+        gui.log_text = unittest.mock.Mock()
+        gui.status_label = unittest.mock.Mock()
+        gui.analyze_button = unittest.mock.Mock()
+        gui.current_page = 0
+        gui._ui_queue = queue.Queue()
+        return gui
+
+    def test_worker_threads_log_through_the_queue_without_root_after(self):
+        gui = self.make_gui()
+
+        worker = threading.Thread(target=lambda: (gui.log_message("от нишка"), gui.update_status("Анализ...")))
+        worker.start()
+        worker.join(timeout=5)
+        self.assertFalse(worker.is_alive())
+        gui.root.after.assert_not_called()
+        gui.log_text.insert.assert_not_called()
+
+        gui._drain_ui_queue()
+        gui.log_text.insert.assert_called_once_with(unittest.mock.ANY, "от нишка\n")
+        gui.status_label.config.assert_called_once_with(text="Анализ...", foreground="black")
+
+    def test_analysis_runs_off_the_tk_thread_and_reports_back_through_the_queue(self):
+        gui = self.make_gui()
+        gui.analysis_files = [__file__]
+        analyzer = unittest.mock.Mock()
+        parse_threads = []
+        analyzer.parse_files.side_effect = lambda files: parse_threads.append(threading.current_thread()) or {"x": []}
+        analyzer.build_price_matrix.side_effect = RuntimeError("грешка")
+        gui._analyzer = lambda: analyzer
+
+        started, thread_class = [], threading.Thread
+
+        def thread(*args, **kwargs):
+            started.append(thread_class(*args, **kwargs))
+            return started[-1]
+
+        with unittest.mock.patch("lidl_scraper_gui.messagebox") as messagebox, \
+                unittest.mock.patch("lidl_scraper_gui.threading.Thread", side_effect=thread):
+            gui.analyze_receipts()
+            gui.analyze_button.config.assert_called_once_with(state="disabled")
+            started[0].join(timeout=5)
+            messagebox.showerror.assert_not_called()
+            gui._drain_ui_queue()
+
+        self.assertEqual(len(parse_threads), 1)
+        self.assertIsNot(parse_threads[0], threading.main_thread())
+        messagebox.showerror.assert_called_once_with("Грешка", "Грешка при анализ:\n\nгрешка")
+        gui.analyze_button.config.assert_called_with(state="normal")
+
+    def test_export_reports_csv_when_pyarrow_is_missing(self):
+        gui = self.make_gui()
+        gui.output_dir = "."
+        analyzer = unittest.mock.MagicMock()
+        analyzer.__enter__.return_value.export_database.return_value = ["prices.csv", "products.csv"]
+        gui._analyzer = lambda: analyzer
+
+        with unittest.mock.patch("price_export.pyarrow_available", return_value=False), \
+                unittest.mock.patch("lidl_scraper_gui.messagebox") as messagebox:
+            gui.export_local_db()
+
+        analyzer.__enter__.return_value.export_database.assert_called_once_with(unittest.mock.ANY, "csv")
+        messagebox.showinfo.assert_not_called()
+        self.assertIn("CSV вместо Parquet", messagebox.showwarning.call_args[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from html_template import Template
+from receipt_analysis import ReceiptAnalyzer
+
+
+class HtmlTemplateTests(unittest.TestCase):
+    def test_rows_are_streamed_into_the_page(self):
+        row = Template('<tr><td>{idx}</td><td>{price:.2f} €</td></tr>')
+        page = Template('<style>td {{ color: red; }}</style><table>{rows}</table>\\n{total}')
+        rows = [{"idx": i, "price": i / 3} for i in range(1, 4)]
+        expected = (
+            "<style>td { color: red; }</style><table><tr><td>1</td><td>0.33 €</td></tr>"
+            "<tr><td>2</td><td>0.67 €</td></tr><tr><td>3</td><td>1.00 €</td></tr></table>\\n3"
+        )
+
+        self.assertEqual(page.render(rows=row.render_rows(rows), total=3), expected)
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "page.html"
+            page.write(output_file, rows=row.render_rows(iter(rows)), total=3)
+            self.assertEqual(output_file.read_text(encoding="utf-8"), expected)
+        with self.assertRaises(ValueError):
+            Template("{row[name]}")
+
+    def test_index_lists_only_generated_reports_with_a_timestamp(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = Path(tmp) / "index.html"
+            analyzer.generate_index_html(str(output_file), {"chart": "/out/c_interactive_chart.html", "xlsx": None})
+            html = output_file.read_text(encoding="utf-8")
+
+        self.assertEqual(html.count('class="report-link"'), 1)
+        self.assertIn('<a href="c_interactive_chart.html" class="report-link" title="/out/c_interactive_chart.html">', html)
+        self.assertNotIn("datetime.now", html)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import random
+import unittest
+
+from keyword_classifier import CategoryClassifier, KeywordAutomaton
+from receipt_analysis import ReceiptAnalyzer
+
+
+class KeywordAutomatonTests(unittest.TestCase):
+    def test_labels_match_naive_substring_search(self):
+        words = ["НАР", "НАРЯЗАН", "ЯР", "АР", "ЗАН", "ЛУК", "ЛУКАНК", "А"]
+        automaton = KeywordAutomaton((word, word) for word in words)
+        rng = random.Random(7)
+        for _ in range(500):
+            text = "".join(rng.choice("НАРЯЗЛУКНС ") for _ in range(rng.randint(0, 15)))
+            self.assertEqual(automaton.labels(text), {word for word in words if word in text}, text)
+
+    def test_classifier_applies_exclusions_and_priority(self):
+        classifier = CategoryClassifier([
+            ("fruit_veg", ["ЛУК", "ЯГОД"], ["ЛУКАНК"]),
+            ("meat", ["ЛУКАНК", "СВИН"], []),
+            ("dairy", ["МЛЯК"], []),
+        ])
+
+        self.assertEqual(classifier.classify("Лук червен"), "fruit_veg")
+        self.assertEqual(classifier.classify("ЛУКАНКА ЕЛЕНА"), "meat")
+        self.assertEqual(classifier.classify("ЯГОДОВО МЛЯКО"), "fruit_veg")
+        self.assertEqual(classifier.categories_of("ЯГОДОВО МЛЯКО"), ["fruit_veg", "dairy"])
+        self.assertIsNone(classifier.classify("ИГРАЧКА"))
+
+
+class CategorySummaryTests(unittest.TestCase):
+    def test_category_summary_groups_price_history_by_catalog_category(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("КИСЕЛО МЛЯКО", "2026-01-02", 1.20, "€", "receipt", None),
+            ("КИСЕЛО МЛЯКО", "2026-01-09", 1.25, "€", "receipt", None),
+            ("ДОМАТИ", "2026-01-09", 3.10, "€/кг", "receipt", None),
+            ("ИГРАЧКА", "2026-01-09", 9.99, "€", "receipt", None),
+        ])
+
+        summary = {row["category"]: row for row in analyzer.get_category_summary()}
+
+        self.assertEqual(summary["dairy"]["observations"], 2)
+        self.assertEqual(summary["fruit_veg"]["label"], "Плодове и зеленчуци")
+        self.assertEqual(summary[None]["products"], 1)
+        self.assertEqual(summary["dairy"]["last_date"], "2026-01-09")
+
+
+if __name__ == "__main__":
+    unittest.main()
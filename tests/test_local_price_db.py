@@ -1,5 +1,11 @@
+import sqlite3
+import tempfile
+import threading
 import unittest
+import unittest.mock
+from pathlib import Path
 
+from db_migrations import SCHEMA_VERSION
 from receipt_analysis import ReceiptAnalyzer
 
 
@@ -15,6 +21,40 @@ class LocalPriceDatabaseTests(unittest.TestCase):
         self.assertAlmostEqual(history[0]["price"], 2.5)
         self.assertEqual(history[0]["unit"], "€/л")
 
+    def test_record_prices_matches_sequential_record_price(self):
+        sequential = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        bulk = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        observations = [
+            ("Мляко", "2025-07-10", 2.40, "€/л", "receipt", "a.txt"),
+            ("Мляко", "2025-07-10", 2.60, "€/л", "receipt", "a.txt"),
+            ("Мляко", "2025-07-10", 3.10, "€/л", "receipt", "b.txt"),
+            ("Мляко", "2025-07-11", 2.50, "€/л", "receipt", "b.txt"),
+            ("", "2025-07-11", 2.50, "€/л", "receipt", "b.txt"),
+        ]
+
+        for product_name, date_str, price, unit, source, receipt_file in observations:
+            sequential.record_price(product_name, date_str, price, unit, source, receipt_file)
+        written = bulk.record_prices(observations)
+
+        self.assertEqual(written, 4)
+        self.assertEqual(bulk.get_price_history("Мляко"), sequential.get_price_history("Мляко"))
+        self.assertAlmostEqual(bulk.get_price_history("Мляко")[0]["price"], (2.40 + 2.60 + 3.10) / 3)
+
+    def test_invalid_dates_are_logged_on_the_calling_thread(self):
+        logged = []
+        analyzer = ReceiptAnalyzer(
+            log=lambda msg: logged.append((threading.current_thread(), msg)), db_path=":memory:",
+        )
+        logged.clear()
+
+        written = analyzer.record_prices([
+            ("Мляко", "2025-07-10", 2.40, "€/л", "receipt", None),
+            ("Мляко", "10.07.2025", 2.60, "€/л", "receipt", None),
+        ])
+
+        self.assertEqual(written, 1)
+        self.assertEqual(logged, [(threading.current_thread(), "Пропусната цена с невалидна дата: Мляко (10.07.2025)")])
+
     def test_compare_years_merges_product_variants_with_brand_and_weight(self):
         analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
         products_data = {
@@ -34,6 +74,235 @@ class LocalPriceDatabaseTests(unittest.TestCase):
         self.assertEqual(rows[0]["product"], "КАШКАВАЛ")
         self.assertEqual(rows[0]["basis"], "€/кг")
 
+    def test_product_catalog_is_persisted_and_reused(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "prices.db")
+            analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=db_path)
+            analyzer.record_price("Кашкавал Вианга 250г", "2025-01-10", 2.60, "€/100г")
+
+            info = analyzer.catalog.get("Кашкавал Вианга 250г")
+            self.assertEqual(info.canonical_name, "КАШКАВАЛ")
+            self.assertAlmostEqual(info.weight_kg, 0.25)
+            self.assertEqual(info.unit_basis, "€/100г")
+            self.assertEqual(analyzer.catalog.get("Домати розови").category, "fruit_veg")
+
+            reopened = ReceiptAnalyzer(log=lambda msg: None, db_path=db_path)
+            reopened.catalog._describe = unittest.mock.Mock(side_effect=AssertionError("recomputed"))
+            self.assertEqual(reopened.catalog.get("Кашкавал Вианга 250г")[1:], info[1:])
+
+    def test_search_products_ranks_partial_matches_with_latest_price(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("КАШКАВАЛ ВИАНГА", "2025-01-10", 6.50, "€/кг", "receipt", None),
+            ("КАШКАВАЛ ВИАНГА", "2025-03-10", 7.10, "€/кг", "receipt", None),
+            ("КРАВЕ СИРЕНЕ", "2025-02-01", 8.20, "€/кг", "receipt", None),
+        ])
+
+        results = analyzer.search_products("кашкав")
+
+        self.assertEqual([row["product_name"] for row in results], ["КАШКАВАЛ ВИАНГА"])
+        self.assertEqual(results[0]["last_date"], "2025-03-10")
+        self.assertAlmostEqual(results[0]["last_price"], 7.10)
+        self.assertEqual(results[0]["observations"], 2)
+        self.assertEqual([row["product_name"] for row in analyzer.search_products("СИРЕНЕ КРАВЕ")], ["КРАВЕ СИРЕНЕ"])
+        # Къса заявка (под 3 символа) минава през LIKE
+        self.assertEqual([row["product_name"] for row in analyzer.search_products("ВЕ")], ["КРАВЕ СИРЕНЕ"])
+
+        analyzer.db.write(lambda conn: conn.execute("DELETE FROM products WHERE raw_name = 'КРАВЕ СИРЕНЕ'"))
+        self.assertEqual(analyzer.search_products("сирене"), [])
+
+    def test_legacy_price_history_is_migrated_to_compact_schema(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "legacy.db")
+            legacy = sqlite3.connect(db_path)
+            legacy.execute(
+                """
+                CREATE TABLE price_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    product_name TEXT NOT NULL,
+                    normalized_name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    unit TEXT NOT NULL,
+                    source TEXT DEFAULT 'receipt',
+                    receipt_file TEXT,
+                    sample_count INTEGER DEFAULT 1,
+                    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE(product_name, date, unit)
+                )
+                """
+            )
+            legacy.executemany(
+                "INSERT INTO price_history (product_name, normalized_name, date, price, unit, receipt_file, sample_count) "
+                "VALUES (?, ?, ?, ?, ?, 'receipts.txt', ?)",
+                [
+                    ("КАШКАВАЛ ВИАНГА", "КАШКАВАЛ", "2025-01-10", 6.5, "€/кг", 2),
+                    ("КАШКАВАЛ ВИАНГА", "КАШКАВАЛ", "2025-02-10", 6.9, "€/кг", 1),
+                    ("МЛЯКО", "МЛЯКО", "2025-01-10", 2.4, "€", 1),
+                ],
+            )
+            legacy.commit()
+            legacy.close()
+
+            analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=db_path)
+            analyzer.record_price("МЛЯКО", "2025-01-10", 2.6, "€", receipt_file="receipts.txt")
+
+            conn = analyzer._conn
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            self.assertEqual(
+                conn.execute("SELECT type FROM sqlite_master WHERE name = 'price_history'").fetchone()[0], "view"
+            )
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0], 3)
+            self.assertEqual(
+                [tuple(row) for row in conn.execute(
+                    "SELECT product_name, normalized_name, date, price, unit, receipt_file, sample_count "
+                    "FROM price_history ORDER BY product_name, date"
+                )],
+                [
+                    ("КАШКАВАЛ ВИАНГА", "КАШКАВАЛ", "2025-01-10", 6.5, "€/кг", "receipts.txt", 2),
+                    ("КАШКАВАЛ ВИАНГА", "КАШКАВАЛ", "2025-02-10", 6.9, "€/кг", "receipts.txt", 1),
+                    ("МЛЯКО", "МЛЯКО", "2025-01-10", 2.5, "€", "receipts.txt", 2),
+                ],
+            )
+            analyzer.close()
+
+            reopened = ReceiptAnalyzer(log=lambda msg: None, db_path=db_path)
+            self.assertEqual(len(reopened.get_price_history("КАШКАВАЛ")), 2)
+            reopened.close()
+
+    def test_failed_vacuum_after_migration_is_logged_and_reclassification_still_runs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = str(Path(tmp) / "legacy.db")
+            legacy = sqlite3.connect(db_path)
+            legacy.execute(
+                "CREATE TABLE price_history (id INTEGER PRIMARY KEY AUTOINCREMENT, product_name TEXT NOT NULL, "
+                "normalized_name TEXT NOT NULL, date TEXT NOT NULL, price REAL NOT NULL, unit TEXT NOT NULL, "
+                "source TEXT DEFAULT 'receipt', receipt_file TEXT, sample_count INTEGER DEFAULT 1, "
+                "UNIQUE(product_name, date, unit))"
+            )
+            legacy.commit()
+            legacy.close()
+
+            logs = []
+            with unittest.mock.patch(
+                "receipt_analysis._vacuum", side_effect=sqlite3.OperationalError("database is locked")
+            ):
+                analyzer = ReceiptAnalyzer(log=logs.append, db_path=db_path)
+
+            self.assertIn("Базата не беше компактирана (VACUUM): database is locked", logs)
+            self.assertFalse(any("инициализация" in message for message in logs))
+            conn = analyzer._conn
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+            self.assertIsNotNone(
+                conn.execute("SELECT value FROM catalog_meta WHERE key = 'classifier_version'").fetchone()
+            )
+            analyzer.close()
+
+    def test_period_aggregates_follow_upserts_and_feed_compare_years(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("КАШКАВАЛ 400Г", "2025-03-01", 2.40, "€", "receipt", None),
+            ("КАШКАВАЛ 400Г", "2025-03-01", 2.80, "€", "receipt", None),
+            ("КАШКАВАЛ 400Г", "2025-04-02", 2.00, "€", "receipt", None),
+            ("КАШКАВАЛ 400Г", "2026-03-05", 3.00, "€", "receipt", None),
+        ])
+
+        monthly = {row["period"]: row for row in analyzer.get_period_stats("month")}
+        self.assertEqual(sorted(monthly), [202503, 202504, 202603])
+        self.assertEqual(monthly[202503]["count"], 1)
+        self.assertAlmostEqual(monthly[202503]["avg"], 2.60)
+        yearly = {row["period"]: row for row in analyzer.get_period_stats("year")}
+        self.assertEqual(yearly[2025]["count"], 2)
+        self.assertAlmostEqual(yearly[2025]["min"], 2.00)
+        self.assertAlmostEqual(yearly[2025]["max"], 2.60)
+        self.assertAlmostEqual(yearly[2025]["stddev"], 0.30)
+
+        rows = analyzer.compare_years()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["basis"], "€/кг")
+        self.assertAlmostEqual(rows[0]["avg_2025"], 2.30 / 0.4)
+        self.assertAlmostEqual(rows[0]["avg_2026"], 3.00 / 0.4)
+        self.assertAlmostEqual(analyzer.get_top_movers(2025, 2026)[0]["change_pct"], (3.00 - 2.30) / 2.30 * 100)
+
+    def test_db_summary_streams_by_product_and_columns_follow_primary_key(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("ЯБЪЛКИ", "2025-03-02", 1.80, "€/кг", "receipt", None),
+            ("БАНАНИ", "2025-03-05", 2.10, "€/кг", "receipt", None),
+            ("ЯБЪЛКИ", "2025-03-01", 1.60, "€/кг", "receipt", None),
+        ])
+
+        self.assertEqual(list(analyzer.iter_db_summary()), [
+            ("БАНАНИ", [("2025-03-05", 2.10, "€/кг")]),
+            ("ЯБЪЛКИ", [("2025-03-01", 1.60, "€/кг"), ("2025-03-02", 1.80, "€/кг")]),
+        ])
+        self.assertEqual(analyzer.get_db_summary()["ЯБЪЛКИ"], {"2025-03-01": 1.60, "2025-03-02": 1.80})
+
+        columns = analyzer.get_db_columns()
+        names = [columns.product_names[product_id] for product_id in columns.product_ids]
+        self.assertEqual(names, ["ЯБЪЛКИ", "ЯБЪЛКИ", "БАНАНИ"])
+        self.assertEqual(columns.days.tolist(), [20148, 20149, 20152])
+        self.assertEqual(columns.prices.tolist(), [1.60, 1.80, 2.10])
+        self.assertEqual({columns.unit_names[unit_id] for unit_id in columns.unit_ids}, {"€/кг"})
+
+    def test_price_segments_and_changes_follow_ingestion(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("МЛЯКО", "2025-03-01", 2.40, "€", "receipt", None),
+            ("МЛЯКО", "2025-03-08", 2.40, "€", "receipt", None),
+            ("МЛЯКО", "2025-03-20", 2.40, "€", "receipt", None),
+            ("МЛЯКО", "2025-04-02", 2.60, "€", "receipt", None),
+        ])
+        segments = [(s["start"], s["end"], s["price"], s["observations"]) for s in analyzer.get_price_segments("МЛЯКО")]
+        self.assertEqual(segments, [("2025-03-01", "2025-03-20", 2.40, 3), ("2025-04-02", "2025-04-02", 2.60, 1)])
+
+        # Промоция в средата на отрязъка го разделя на три и добавя две промени
+        analyzer.record_price("МЛЯКО", "2025-03-10", 1.99, "€")
+        segments = [(s["start"], s["end"], s["price"]) for s in analyzer.get_price_segments("МЛЯКО")]
+        self.assertEqual(segments, [
+            ("2025-03-01", "2025-03-08", 2.40),
+            ("2025-03-10", "2025-03-10", 1.99),
+            ("2025-03-20", "2025-03-20", 2.40),
+            ("2025-04-02", "2025-04-02", 2.60),
+        ])
+        changes = [(c["date"], c["old_price"], c["new_price"]) for c in analyzer.get_price_changes("2025-03-15")]
+        self.assertEqual(changes, [("2025-04-02", 2.40, 2.60), ("2025-03-20", 1.99, 2.40)])
+
+    def test_price_histories_batch_query_with_window_and_pages(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.record_prices([
+            ("КАШКАВАЛ ВИАНГА 250Г", "2025-01-10", 6.50, "€/кг", "receipt", None),
+            ("КАШКАВАЛ ВИАНГА 250Г", "2025-02-10", 6.90, "€/кг", "receipt", None),
+            ("КАШКАВАЛ ВИАНГА 250Г", "2025-03-10", 7.10, "€/кг", "receipt", None),
+            ("МЛЯКО", "2025-02-01", 2.40, "€", "receipt", None),
+            ("ХЛЯБ", "2025-02-01", 1.20, "€", "receipt", None),
+        ])
+        milk_id = analyzer.catalog.get("МЛЯКО").product_id
+
+        window = analyzer.get_price_histories(
+            ["Кашкавал", milk_id, "НЯМА ТАКЪВ"], start_date="2025-02-01", end_date="2025-02-28",
+        )
+        self.assertEqual(window["next"], None)
+        self.assertEqual(
+            {name: [row["date"] for row in rows] for name, rows in window["histories"].items()},
+            {"КАШКАВАЛ ВИАНГА 250Г": ["2025-02-10"], "МЛЯКО": ["2025-02-01"]},
+        )
+
+        pages, after = [], None
+        while True:
+            page = analyzer.get_price_histories(["КАШКАВАЛ ВИАНГА 250Г", "МЛЯКО"], page_size=2, after=after)
+            pages.append(page["histories"])
+            after = page["next"]
+            if after is None:
+                break
+        merged = {}
+        for histories in pages:
+            for name, rows in histories.items():
+                merged.setdefault(name, []).extend(rows)
+        self.assertEqual(merged, analyzer.get_price_histories(["КАШКАВАЛ ВИАНГА 250Г", "МЛЯКО"])["histories"])
+        self.assertEqual([len(rows) for rows in merged.values()], [3, 1])
+
 
 if __name__ == "__main__":
     unittest.main()
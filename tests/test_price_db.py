@@ -0,0 +1,102 @@
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from price_db import PriceDatabase
+from product_catalog import ProductCatalog
+
+
+def create_table(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS prices (id INTEGER PRIMARY KEY, thread INTEGER, value REAL)")
+
+
+class PriceDatabaseTests(unittest.TestCase):
+    def test_concurrent_writers_and_readers_use_wal_without_lock_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = PriceDatabase(str(Path(tmp) / "prices.db"))
+            db.write(create_table)
+            errors = []
+
+            def write_rows(thread_no):
+                try:
+                    for i in range(50):
+                        db.write(lambda conn: conn.execute(
+                            "INSERT INTO prices (thread, value) VALUES (?, ?)", (thread_no, i)
+                        ))
+                except Exception as exc:
+                    errors.append(exc)
+
+            def read_rows():
+                try:
+                    for _ in range(50):
+                        db.reader().execute("SELECT COUNT(*), SUM(value) FROM prices").fetchone()
+                except Exception as exc:
+                    errors.append(exc)
+
+            threads = [threading.Thread(target=write_rows, args=(n,)) for n in range(4)]
+            threads += [threading.Thread(target=read_rows) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(db.reader().execute("SELECT COUNT(*) FROM prices").fetchone()[0], 200)
+            self.assertEqual(db.reader().execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            with self.assertRaises(sqlite3.OperationalError):
+                db.reader().execute("DELETE FROM prices")
+            db.close()
+
+    def test_failed_write_rolls_back_and_nested_write_joins_transaction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = PriceDatabase(str(Path(tmp) / "prices.db"))
+            db.write(create_table)
+
+            def insert_then_fail(conn):
+                db.write(lambda nested: nested.execute("INSERT INTO prices (thread, value) VALUES (1, 1)"))
+                self.assertEqual(db.reader().execute("SELECT COUNT(*) FROM prices").fetchone()[0], 1)
+                raise ValueError("boom")
+
+            with self.assertRaises(ValueError):
+                db.write(insert_then_fail)
+            self.assertEqual(db.reader().execute("SELECT COUNT(*) FROM prices").fetchone()[0], 0)
+            db.close()
+
+    def test_in_memory_database_and_catalog_cache_are_shared_safely_between_threads(self):
+        db = PriceDatabase(":memory:")
+        db.write(create_table)
+        db.write(ProductCatalog.create_schema)
+        catalog = ProductCatalog(db, lambda name: (name, None, "€", None), cache_size=8)
+        names = [f"ПРОДУКТ {i}" for i in range(40)]
+        errors = []
+
+        def work(thread_no):
+            try:
+                for i in range(50):
+                    db.write(lambda conn: conn.execute(
+                        "INSERT INTO prices (thread, value) VALUES (?, ?)", (thread_no, i)
+                    ))
+                    cursor = db.reader().cursor()
+                    cursor.execute("SELECT thread, value FROM prices WHERE thread = ?", (thread_no,))
+                    self.assertEqual(len(cursor.fetchall()), i + 1)
+                    batch = names[(i + thread_no) % 30:][:10]
+                    self.assertEqual(set(catalog.get_many(batch)), set(batch))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(db.reader().execute("SELECT COUNT(*) FROM prices").fetchone()[0], 300)
+        self.assertLessEqual(len(catalog._cache), 8)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import csv
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import price_export
+from price_export import export_database, pyarrow_available
+from receipt_analysis import ReceiptAnalyzer
+
+
+def make_analyzer():
+    analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+    analyzer.record_price("Мляко", "2024-12-30", 2.40, "€/л")
+    analyzer.record_price("Мляко", "2025-01-02", 2.50, "€/л")
+    analyzer.record_price("Хляб", "2025-03-01", 1.20, "€/бр")
+    return analyzer
+
+
+class PriceExportTests(unittest.TestCase):
+    @unittest.skipUnless(pyarrow_available(), "pyarrow не е инсталиран")
+    def test_parquet_export_is_partitioned_by_year(self):
+        import pyarrow.dataset as ds
+
+        analyzer = make_analyzer()
+        with tempfile.TemporaryDirectory() as tmp:
+            fmt, paths = export_database(analyzer._conn, tmp, "parquet", batch_rows=2)
+            self.assertEqual(fmt, "parquet")
+            self.assertIn(str(Path(tmp) / "prices" / "year=2024" / "part-0.parquet"), paths)
+            self.assertIn(str(Path(tmp) / "prices" / "year=2025" / "part-0.parquet"), paths)
+
+            table = ds.dataset(str(Path(tmp) / "prices"), format="parquet", partitioning="hive").to_table()
+            rows = sorted(zip(table.column("product_name").to_pylist(), map(str, table.column("date").to_pylist())))
+            self.assertEqual(rows, [("Мляко", "2024-12-30"), ("Мляко", "2025-01-02"), ("Хляб", "2025-03-01")])
+
+    def test_csv_fallback_without_pyarrow_writes_iso_dates(self):
+        analyzer = make_analyzer()
+        with tempfile.TemporaryDirectory() as tmp, \
+                unittest.mock.patch.object(price_export, "_load_pyarrow", return_value=None):
+            fmt, paths = export_database(analyzer._conn, tmp, "parquet", tables=["prices"])
+            self.assertEqual(fmt, "csv")
+            self.assertEqual(paths, [str(Path(tmp) / "prices.csv")])
+            with open(paths[0], encoding="utf-8", newline="") as handle:
+                rows = list(csv.DictReader(handle))
+        self.assertEqual([(row["product_name"], row["date"], row["unit"]) for row in rows], [
+            ("Мляко", "2024-12-30", "€/л"),
+            ("Мляко", "2025-01-02", "€/л"),
+            ("Хляб", "2025-03-01", "€/бр"),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+from price_matrix import PriceMatrix
+
+
+def random_products(seed=7, products=40):
+    rng = random.Random(seed)
+    dates = [f"{year}-{month:02d}-{day:02d}" for year in (2024, 2025, 2026) for month in range(1, 13) for day in (3, 17)]
+    return {
+        f"ПРОДУКТ {i:02d}": {d: round(rng.uniform(0.5, 9.0), 2) for d in rng.sample(dates, rng.randint(0, 12))}
+        for i in range(products)
+    }
+
+
+class PriceMatrixTests(unittest.TestCase):
+    def test_vectorised_totals_match_python_loops(self):
+        data = random_products()
+        matrix = PriceMatrix.from_dict(data)
+        self.assertEqual(matrix.nnz, sum(len(prices) for prices in data.values()))
+
+        years, counts, sums = matrix.yearly_totals()
+        season_counts, season_sums = matrix.seasonal_totals({6, 7, 8, 9})
+        for row, name in enumerate(matrix.names):
+            self.assertEqual(matrix.row_items(row), sorted(data[name].items()))
+            for column, year in enumerate(years):
+                prices = [p for d, p in data[name].items() if d.startswith(str(year))]
+                self.assertEqual(counts[row, column], len(prices))
+                self.assertAlmostEqual(sums[row, column], sum(prices))
+            summer = [p for d, p in data[name].items() if int(d[5:7]) in (6, 7, 8, 9)]
+            self.assertEqual(season_counts[row, 1], len(summer))
+            self.assertAlmostEqual(season_sums[row, 1], sum(summer))
+            self.assertEqual(season_counts[row, 0], len(data[name]) - len(summer))
+
+    def test_top_movers_and_select_match_python_loops(self):
+        data = random_products(seed=11)
+        data["ПРОДУКТ 99"] = {"2025-01-03": 2.0, "2025-02-03": 1.0, "2025-03-03": 1.0, "2025-04-03": 3.0}
+        matrix = PriceMatrix.from_dict(data)
+
+        expected = []
+        for name in sorted(data):
+            items = sorted(data[name].items())
+            prices = [p for _, p in items]
+            if len(prices) < 2 or prices[0] <= 0:
+                continue
+            expected.append((name, (prices[-1] - prices[0]) / prices[0] * 100,
+                             items[prices.index(min(prices))][0], items[prices.index(max(prices))][0]))
+        expected.sort(key=lambda item: abs(item[1]), reverse=True)
+
+        top, falling = matrix.top_movers(10)
+        self.assertEqual([row["name"] for row in top], [item[0] for item in expected[:10]])
+        self.assertEqual(
+            [row["name"] for row in falling],
+            [item[0] for item in sorted((i for i in expected if i[1] < 0), key=lambda i: i[1])[:10]],
+        )
+        movers = {row["name"]: row for row in matrix.top_movers(len(data))[0]}
+        self.assertEqual(movers["ПРОДУКТ 99"]["min_price_date"], "03.02.2025")
+        self.assertEqual(movers["ПРОДУКТ 99"]["max_price_date"], "03.04.2025")
+
+        subset = matrix.select(matrix.counts > 1)
+        self.assertEqual(subset.names, [name for name in sorted(data) if len(data[name]) > 1])
+        for row, name in enumerate(subset.names):
+            self.assertEqual(subset.row_items(row), sorted(data[name].items()))
+        self.assertEqual(len(matrix.select([])), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from receipt_analysis import ReceiptAnalyzer
+
+
+def quiet_analyzer(path):
+    return ReceiptAnalyzer(log=lambda msg: None, db_path=str(path))
+
+
+class PriceMergeTests(unittest.TestCase):
+    def test_merge_weights_by_sample_count_and_is_idempotent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "other.db"
+            with quiet_analyzer(source) as other:
+                other.record_prices([
+                    ("Мляко", "2025-07-10", 3.00, "€/л", "receipt", None),
+                    ("Мляко", "2025-07-10", 3.00, "€/л", "receipt", None),
+                    ("Хляб", "2025-07-11", 1.10, "€/бр", "receipt", None),
+                ])
+
+            with quiet_analyzer(Path(tmp) / "main.db") as analyzer:
+                analyzer.record_price("Мляко", "2025-07-10", 2.40, "€/л")
+
+                results = analyzer.merge_databases([source])
+                self.assertEqual([(r.status, r.rows) for r in results], [("merged", 2)])
+                self.assertEqual([r.status for r in analyzer.merge_databases([source])], ["unchanged"])
+
+                row = analyzer._conn.execute(
+                    "SELECT price, sample_count FROM price_history WHERE product_name = 'Мляко'"
+                ).fetchone()
+                self.assertAlmostEqual(row[0], (2.40 + 2 * 3.00) / 3)
+                self.assertEqual(row[1], 3)
+                self.assertEqual([h["price"] for h in analyzer.get_price_history("Хляб")], [1.10])
+                monthly = analyzer._conn.execute(
+                    "SELECT n, total FROM monthly_prices m JOIN products p ON p.id = m.product_id "
+                    "WHERE p.raw_name = 'Мляко'"
+                ).fetchone()
+                self.assertEqual(monthly[0], 1)
+                self.assertAlmostEqual(monthly[1], row[0])
+
+    def test_remerging_a_grown_source_replaces_its_previous_contribution(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "other.db"
+            with quiet_analyzer(source) as other:
+                other.record_price("Мляко", "2025-07-10", 3.00, "€/л")
+
+            with quiet_analyzer(Path(tmp) / "main.db") as analyzer:
+                analyzer.merge_databases([source])
+                with quiet_analyzer(source) as other:
+                    other.record_price("Мляко", "2025-07-10", 2.00, "€/л")
+                    other.record_price("Мляко", "2025-07-11", 2.20, "€/л")
+                results = analyzer.merge_databases([source])
+
+                self.assertEqual([r.status for r in results], ["merged"])
+                rows = analyzer._conn.execute(
+                    "SELECT date, price, sample_count FROM price_history ORDER BY date"
+                ).fetchall()
+                self.assertEqual([(r[0], r[2]) for r in rows], [("2025-07-10", 2), ("2025-07-11", 1)])
+                self.assertAlmostEqual(rows[0][1], 2.50)
+                # Копие на целевата база не се слива сама в себе си
+                self.assertEqual([r.status for r in analyzer.merge_databases([Path(tmp) / "main.db"])], ["self"])
+
+    def test_outdated_source_is_merged_from_a_migrated_copy_and_left_untouched(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = Path(tmp) / "legacy.db"
+            legacy = sqlite3.connect(source)
+            legacy.execute(
+                "CREATE TABLE price_history (id INTEGER PRIMARY KEY AUTOINCREMENT, product_name TEXT NOT NULL, "
+                "normalized_name TEXT NOT NULL, date TEXT NOT NULL, price REAL NOT NULL, unit TEXT NOT NULL, "
+                "source TEXT DEFAULT 'receipt', receipt_file TEXT, sample_count INTEGER DEFAULT 1, "
+                "UNIQUE(product_name, date, unit))"
+            )
+            legacy.execute(
+                "INSERT INTO price_history (product_name, normalized_name, date, price, unit) "
+                "VALUES ('МЛЯКО', 'МЛЯКО', '2025-07-10', 3.0, '€/л')"
+            )
+            legacy.commit()
+            legacy.close()
+            original = source.read_bytes()
+
+            with quiet_analyzer(Path(tmp) / "main.db") as analyzer:
+                results = analyzer.merge_databases([source])
+                self.assertEqual([(r.path, r.status, r.rows) for r in results], [(str(source), "merged", 1)])
+                # Без постоянен database_id копието щеше да се слее като нова база
+                self.assertEqual([r.status for r in analyzer.merge_databases([source])], ["unchanged"])
+                self.assertEqual([h["price"] for h in analyzer.get_price_history("МЛЯКО")], [3.0])
+
+            self.assertEqual(source.read_bytes(), original)
+            self.assertEqual(sorted(path.name for path in Path(tmp).iterdir() if "legacy" in path.name), ["legacy.db"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import tempfile
+import unittest
+import unittest.mock
+from datetime import date
+from pathlib import Path
+
+import openpyxl
+
+from price_matrix import PriceMatrix
+from price_xlsx import write_price_xlsx
+from receipt_analysis import ReceiptAnalyzer
+
+
+class PriceOutputsTests(unittest.TestCase):
+    def test_reports_are_built_from_memory_in_parallel_stages(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        products_data = {
+            "КАФЕ 500Г": {f"2025-0{month}-01": 5.0 + month / 10 for month in range(1, 8)},
+            "МЛЯКО": {"2025-01-01": 2.4, "2025-02-01": 2.5, "2026-01-01": 2.6},
+        }
+        # Цени от друго домакинство в същата база не влизат в отчетите на този анализ
+        analyzer.record_prices([("АЙРЯН", "2025-01-01", 1.0, "€"), ("АЙРЯН", "2026-01-01", 1.2, "€")])
+        with tempfile.TemporaryDirectory() as tmp, \
+                unittest.mock.patch.object(openpyxl, "load_workbook", side_effect=AssertionError("round-trip")):
+            source = str(Path(tmp) / "receipts.txt")
+            reports = analyzer.generate_reports(products_data, source)
+
+            self.assertEqual(Path(reports["xlsx"]).name, "receipts_price_analysis.xlsx")
+            self.assertEqual(Path(reports["chart"]).name, "receipts_price_analysis_interactive_chart.html")
+            self.assertEqual(Path(reports["png"]).name, "receipts_price_analysis_chart.png")
+            self.assertTrue(Path(reports["png"]).exists())
+            self.assertTrue(Path(reports["index"]).exists())
+            self.assertIsNone(reports["seasonal"])
+            self.assertEqual(reports["products"], 2)
+            self.assertEqual(set(reports["timings"]), {
+                "xlsx", "chart_data", "chart", "png", "seasonal", "years_rows", "years", "index",
+            })
+            html = Path(reports["chart"]).read_text(encoding="utf-8")
+            # Само продуктите с повече от 5 цени влизат в графиката и в топ-10 таблиците
+            self.assertIn("КАФЕ 500Г", html)
+            self.assertNotIn("МЛЯКО", html)
+            self.assertIn("+11.76%", html)
+
+            self.assertEqual(reports["years_rows"], 1)
+            years_html = Path(reports["years"]).read_text(encoding="utf-8")
+            self.assertIn("МЛЯКО", years_html)
+            self.assertNotIn("АЙРЯН", years_html)
+            # Групирането на сходни имена е отделно действие, не страничен ефект на отчетите
+            clustered = analyzer._conn.execute("SELECT COUNT(*) FROM products WHERE cluster_id IS NOT NULL")
+            self.assertEqual(clustered.fetchone()[0], 0)
+
+    def test_streamed_xlsx_uses_named_styles_in_both_layouts(self):
+        matrix = PriceMatrix.from_dict(
+            {"КАФЕ": {"2025-01-01": 5.1, "2025-03-01": 5.3}, "МЛЯКО": {"2025-02-01": 2.4}},
+            units={"МЛЯКО": "€/л"},
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            wide = openpyxl.load_workbook(write_price_xlsx(matrix, Path(tmp) / "wide.xlsx")).active
+            self.assertEqual(
+                list(wide.iter_rows(values_only=True)),
+                [
+                    ("Артикул", "Единица", "01.01.2025", "01.02.2025", "01.03.2025"),
+                    ("КАФЕ", "€", 5.1, None, 5.3),
+                    ("МЛЯКО", "€/л", None, 2.4, None),
+                ],
+            )
+            self.assertEqual(
+                (wide["A1"].style, wide["C2"].style, wide["D2"].style), ("price_header", "price_value", "price_empty")
+            )
+            self.assertEqual(wide["D2"].border.left.style, "thin")
+            self.assertEqual(wide.freeze_panes, "C2")
+
+            long = openpyxl.load_workbook(write_price_xlsx(matrix, Path(tmp) / "long.xlsx", layout="long")).active
+            rows = list(long.iter_rows(values_only=True))
+            self.assertEqual(rows[0], ("Артикул", "Единица", "Дата", "Цена"))
+            self.assertEqual([(r[0], r[2].date(), r[3]) for r in rows[1:]], [
+                ("КАФЕ", date(2025, 1, 1), 5.1), ("КАФЕ", date(2025, 3, 1), 5.3), ("МЛЯКО", date(2025, 2, 1), 2.4),
+            ])
+            with self.assertRaises(ValueError):
+                write_price_xlsx(matrix, Path(tmp) / "x.xlsx", layout="pivot")
+
+
+if __name__ == "__main__":
+    unittest.main()
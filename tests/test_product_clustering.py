@@ -0,0 +1,43 @@
+import unittest
+
+from product_clustering import cluster_names
+from receipt_analysis import ReceiptAnalyzer
+
+
+class ProductClusteringTests(unittest.TestCase):
+    def test_cluster_names_groups_spelling_variants_only(self):
+        names = {
+            1: "ШОКОЛАД МЛЕЧЕН С ЛЕШНИЦИ",
+            2: "ШОКОЛАД МЛЕЧЕН ЛЕШНИЦИ",
+            3: "КАШУ СУРОВО",
+            4: "СУРОВО КАШУ",
+            5: "ДОМАТИ ЧЕРИ",
+            6: "КРАСТАВИЦИ",
+            7: "кашу  сурово",
+        }
+
+        clusters = cluster_names(names)
+
+        self.assertEqual(clusters[2], 1)
+        self.assertEqual({clusters[3], clusters[4], clusters[7]}, {3})
+        self.assertEqual(clusters[5], 5)
+        self.assertEqual(clusters[6], 6)
+
+    def test_compare_years_can_group_by_cluster(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        products_data = {
+            "ШОКОЛАД МЛЕЧЕН С ЛЕШНИЦИ": {"2025-03-01": 2.00},
+            "ШОКОЛАД МЛЕЧЕН ЛЕШНИЦИ": {"2026-03-01": 2.50},
+        }
+        analyzer.catalog.get_many(products_data)
+
+        self.assertEqual(analyzer.compare_years(products_data), [])
+        self.assertEqual(analyzer.cluster_products(), 1)
+        rows = analyzer.compare_years(products_data, group_by="cluster")
+
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(rows[0]["change_pct"], 25.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
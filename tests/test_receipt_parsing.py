@@ -0,0 +1,202 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import receipt_analysis
+from receipt_analysis import ReceiptAnalyzer
+
+
+def make_receipt(idx: int, date_str: str, lines: list) -> str:
+    body = "\n".join(lines)
+    return (
+        f"{'=' * 80}\nБЕЛЕЖКА #{idx}\nСтраница: 1\nДата: {date_str}\n{'=' * 80}\n\n"
+        f"ЛИДЛ БЪЛГАРИЯ ЕООД ЕНД КО КД\n{body}\nОБЩА СУМА               9,99\n"
+    )
+
+
+def make_file(directory: str, name: str, receipts: list) -> str:
+    header = f"{'=' * 80}\nКАСОВИ БЕЛЕЖКИ ОТ LIDL.BG\nОбщо бележки: {len(receipts)}\n{'=' * 80}\n\n"
+    path = Path(directory) / name
+    path.write_text(header + "\n".join(receipts), encoding="utf-8")
+    return str(path)
+
+
+class ReceiptParsingTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _files(self):
+        first = make_file(self.tmp.name, "a.txt", [
+            make_receipt(1, "2026-03-01", [
+                "0,500 x 3,20",
+                "ДОМАТИ                   1,60 B",
+                "МЛЯКО 1Л                 2,40 B",
+            ]),
+            make_receipt(2, "2026-03-08", [
+                "МЛЯКО 1Л                 2,60 B",
+                "КАШКАВАЛ 250Г            4,00 B",
+            ]),
+        ])
+        second = make_file(self.tmp.name, "b.txt", [
+            make_receipt(1, "2025-06-10", ["БАНИЦА СЪС СИРЕНЕ       1,95 B"]),
+            make_receipt(2, "2026-03-08", ["МЛЯКО 1Л                 3,00 B"]),
+        ])
+        return [first, second]
+
+    def test_parse_file_extracts_unit_prices(self):
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+
+        data = analyzer.parse_file(self._files()[0])
+
+        self.assertAlmostEqual(data["ДОМАТИ"]["2026-03-01"], 3.20)
+        self.assertEqual(analyzer.products_units["ДОМАТИ"], "€/кг")
+        self.assertAlmostEqual(data["КАШКАВАЛ 250Г"]["2026-03-08"], 1.60)
+        self.assertEqual(analyzer.products_units["КАШКАВАЛ 250Г"], "€/100г")
+
+    def test_parallel_parse_matches_serial_parse(self):
+        files = self._files()
+        serial = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        parallel = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+
+        pool_class = receipt_analysis.ProcessPoolExecutor
+        with unittest.mock.patch("receipt_analysis.PARALLEL_PARSE_MIN_BYTES", 0), \
+                unittest.mock.patch("receipt_analysis.PARSE_CHUNK_RECEIPTS", 1), \
+                unittest.mock.patch("receipt_analysis.ProcessPoolExecutor", side_effect=pool_class) as pool:
+            parallel_data = parallel.parse_files(files, max_workers=2)
+        # Без fork: процесът вече има нишки (писателя на базата)
+        self.assertEqual(pool.call_args.kwargs["mp_context"].get_start_method(), "spawn")
+        serial_data = serial.parse_files(files, max_workers=1)
+
+        self.assertEqual(dict(parallel_data), dict(serial_data))
+        self.assertEqual(parallel.products_units, serial.products_units)
+        self.assertAlmostEqual(serial_data["МЛЯКО 1Л"]["2026-03-08"], 2.80)
+        self.assertAlmostEqual(serial_data["БАНИЦА СЪС СИРЕНЕ"]["2025-06-10"], 1.95 / 1.95583)
+        self.assertEqual(
+            [dict(row) for row in serial.get_price_history("МЛЯКО 1Л")],
+            [dict(row) for row in parallel.get_price_history("МЛЯКО 1Л")],
+        )
+
+    def test_reanalysing_unchanged_files_does_not_touch_the_db(self):
+        files = self._files()
+        db_path = str(Path(self.tmp.name) / "prices.db")
+        first = ReceiptAnalyzer(log=lambda msg: None, db_path=db_path)
+        first_data = first.parse_files(files, max_workers=1)
+        history = first.get_price_history("МЛЯКО 1Л")
+
+        logs = []
+        second = ReceiptAnalyzer(log=logs.append, db_path=db_path)
+        with unittest.mock.patch("receipt_analysis._parse_file_job") as parse_job:
+            second_data = second.parse_files(files, max_workers=1)
+
+        parse_job.assert_not_called()
+        self.assertEqual(dict(second_data), dict(first_data))
+        self.assertEqual(second.products_units, first.products_units)
+        self.assertEqual(second.get_price_history("МЛЯКО 1Л"), history)
+        self.assertTrue(any("не е променян" in message for message in logs))
+
+    def test_unchanged_file_is_rebuilt_from_stored_receipts_including_shared_ones(self):
+        files = self._files()
+        # Второ изтегляне: една бележка вече е записана от a.txt
+        overlap = make_file(self.tmp.name, "c.txt", [
+            make_receipt(5, "2026-03-08", ["МЛЯКО 1Л                 2,60 B", "КАШКАВАЛ 250Г            4,00 B"]),
+            make_receipt(6, "2026-03-15", ["МЛЯКО 1Л                 2,20 B"]),
+        ])
+        db_path = str(Path(self.tmp.name) / "prices.db")
+        with ReceiptAnalyzer(log=lambda msg: None, db_path=db_path) as first:
+            first.parse_files(files, max_workers=1)
+            expected = first.parse_file(overlap)
+
+        with ReceiptAnalyzer(log=lambda msg: None, db_path=db_path) as second:
+            with unittest.mock.patch("receipt_analysis._parse_file_job") as parse_job:
+                rebuilt = second.parse_file(overlap)
+            parse_job.assert_not_called()
+            self.assertEqual(dict(rebuilt), dict(expected))
+            self.assertEqual(rebuilt["МЛЯКО 1Л"], {"2026-03-08": 2.60, "2026-03-15": 2.20})
+            self.assertEqual(second.products_units["КАШКАВАЛ 250Г"], "€/100г")
+            columns = [row[1] for row in second._conn.execute("PRAGMA table_info(ingested_files)")]
+            self.assertNotIn("parsed", columns)
+
+    def test_touched_or_extended_file_only_ingests_new_receipts(self):
+        files = self._files()
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.parse_files(files, max_workers=1)
+
+        stat = os.stat(files[0])
+        os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10_000_000_000))
+        analyzer.parse_file(files[0])
+
+        # Второ изтегляне със същата бележка (друг номер) и една нова бележка
+        third = make_file(self.tmp.name, "c.txt", [
+            make_receipt(7, "2026-03-08", ["МЛЯКО 1Л                 3,00 B"]),
+            make_receipt(8, "2026-03-15", ["МЛЯКО 1Л                 2,20 B"]),
+        ])
+        analyzer.parse_file(third)
+
+        rows = analyzer._conn.execute(
+            "SELECT date, price, sample_count FROM price_history WHERE product_name = ? ORDER BY date",
+            ("МЛЯКО 1Л",),
+        ).fetchall()
+        self.assertEqual([tuple(row) for row in rows], [
+            ("2026-03-01", 2.40, 1),
+            ("2026-03-08", (2.60 + 3.00) / 2, 2),
+            ("2026-03-15", 2.20, 1),
+        ])
+
+    def test_ingestion_fills_receipts_and_line_items(self):
+        path = make_file(self.tmp.name, "d.txt", [
+            make_receipt(1, "2026-04-02", [
+                "гр. София, ул. Витоша 1",
+                "02.04.2026 18:45:10",
+                "1,250 x 2,00",
+                "ДОМАТИ                   2,50 B",
+                "МЛЯКО 1Л                 2,40 B",
+                "#Lidl Plus купон        -0,40",
+            ]),
+        ])
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        analyzer.parse_file(path)
+
+        receipt = analyzer._conn.execute(
+            "SELECT date, timestamp, store, total, currency, item_count FROM receipts"
+        ).fetchone()
+        self.assertEqual(
+            tuple(receipt),
+            ("2026-04-02", "2026-04-02 18:45:10", "гр. София, ул. Витоша 1", 9.99, "EUR", 2),
+        )
+        items = analyzer._conn.execute(
+            """
+            SELECT li.product_name, li.quantity, li.unit_price, li.amount, li.discount, ph.price, ph.unit
+            FROM line_items li
+            JOIN receipts r ON r.id = li.receipt_id
+            JOIN price_history ph ON ph.product_name = li.product_name AND ph.date = r.date AND ph.unit = li.unit
+            ORDER BY li.line_no
+            """
+        ).fetchall()
+        self.assertEqual([tuple(row) for row in items], [
+            ("ДОМАТИ", 1.25, 2.00, 2.50, 0.0, 2.00, "€/кг"),
+            ("МЛЯКО 1Л", None, None, 2.40, 0.40, 2.40, "€/кг"),
+        ])
+
+    def test_same_basket_on_different_days_is_not_a_duplicate(self):
+        lines = ["МЛЯКО 1Л                 2,40 B", "ХЛЯБ                     1,20 B"]
+        legacy = make_receipt(3, "2026-04-16", lines)
+        path = make_file(self.tmp.name, "weekly.txt", [
+            make_receipt(1, "2026-04-02", lines), make_receipt(2, "2026-04-09", lines), legacy,
+        ])
+        analyzer = ReceiptAnalyzer(log=lambda msg: None, db_path=":memory:")
+        # Бележка от по-стара база: хешът е само на тялото
+        analyzer._conn.execute(
+            "INSERT INTO receipts (receipt_hash, receipt_file, date) VALUES (?, 'old.txt', '2026-04-16')",
+            (receipt_analysis._receipt_body_hash(legacy.split("БЕЛЕЖКА #", 1)[1]),),
+        )
+        analyzer.parse_file(path)
+
+        dates = [row[0] for row in analyzer._conn.execute("SELECT date FROM receipts ORDER BY date")]
+        self.assertEqual(dates, ["2026-04-02", "2026-04-09", "2026-04-16"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import io
+import tempfile
+import unittest
+import unittest.mock
+from pathlib import Path
+
+import receipt_reader
+from receipt_reader import RECEIPT_SEPARATOR, iter_receipts
+
+
+CONTENT = "ЗАГЛАВИЕ\n" + "".join(
+    f"{RECEIPT_SEPARATOR}{idx}\nДата: 2026-01-0{idx % 9 + 1}\nМЛЯКО 1Л   2,40 B\n" for idx in range(1, 30)
+)
+
+
+class ReceiptReaderTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "receipts.txt"
+        self.path.write_text(CONTENT, encoding="utf-8")
+
+    def test_iter_receipts_matches_split(self):
+        self.assertEqual(list(iter_receipts(self.path)), CONTENT.split(RECEIPT_SEPARATOR)[1:])
+
+    def test_buffered_reader_handles_separator_across_blocks(self):
+        expected = CONTENT.split(RECEIPT_SEPARATOR)[1:]
+        for block_size in (1, 5, 17, 4096):
+            with unittest.mock.patch.object(receipt_reader, "READ_BLOCK_SIZE", block_size):
+                handle = io.BytesIO(CONTENT.encode("utf-8"))
+                received = list(receipt_reader._iter_receipts_buffered(handle, RECEIPT_SEPARATOR.encode("utf-8")))
+            self.assertEqual(received, expected, block_size)
+
+    def test_windows_line_endings_are_normalised(self):
+        self.path.write_bytes(CONTENT.replace("\n", "\r\n").encode("utf-8"))
+        expected = CONTENT.split(RECEIPT_SEPARATOR)[1:]
+        self.assertEqual(list(iter_receipts(self.path)), expected)
+        with open(self.path, "rb") as handle:
+            received = list(receipt_reader._iter_receipts_buffered(handle, RECEIPT_SEPARATOR.encode("utf-8")))
+        self.assertEqual(received, expected)
+
+    def test_empty_file_yields_nothing(self):
+        self.path.write_bytes(b"")
+        self.assertEqual(list(iter_receipts(self.path)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import unittest
+
+from report_pipeline import ReportStage, run_stages
+
+
+def _double(value):
+    return value * 2
+
+
+# Задава се само в родителския процес: при fork детето го наследява, при spawn – не
+_PARENT_STATE = {"set_in_parent": False}
+
+
+def _sees_parent_state():
+    return _PARENT_STATE["set_in_parent"]
+
+
+class ReportPipelineTests(unittest.TestCase):
+    def test_independent_stages_run_concurrently_and_inputs_are_passed_in_order(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def waiting(value):
+            # И двата етапа трябва да стигнат тук едновременно, иначе бариерата изтича
+            barrier.wait()
+            return value
+
+        results = run_stages([
+            ReportStage("sum", lambda a, b, c: (a, b, c), (3,), inputs=("left", "doubled")),
+            ReportStage("left", waiting, (1,)),
+            ReportStage("right", waiting, (2,)),
+            ReportStage("doubled", _double, inputs=("right",), process=True),
+        ], max_workers=4)
+
+        self.assertEqual(list(results), ["sum", "left", "right", "doubled"])
+        self.assertEqual(results["sum"].value, (1, 4, 3))
+        self.assertTrue(all(result.error is None for result in results.values()))
+
+    def test_failed_stage_skips_its_dependents_only(self):
+        def broken():
+            raise RuntimeError("boom")
+
+        for workers in (1, 4):
+            results = run_stages([
+                ReportStage("broken", broken),
+                ReportStage("after", _double, inputs=("broken",)),
+                ReportStage("other", _double, (5,)),
+            ], max_workers=workers)
+            self.assertIsInstance(results["broken"].error, RuntimeError)
+            self.assertIs(results["after"].error, results["broken"].error)
+            self.assertEqual(results["other"].value, 10)
+
+        with self.assertRaises(ValueError):
+            run_stages([ReportStage("a", _double, inputs=("b",)), ReportStage("b", _double, inputs=("a",))])
+
+    def test_process_stages_do_not_fork_the_threaded_parent(self):
+        _PARENT_STATE["set_in_parent"] = True
+        self.addCleanup(_PARENT_STATE.update, set_in_parent=False)
+
+        results = run_stages([ReportStage("child", _sees_parent_state, process=True)], max_workers=2)
+
+        self.assertIs(results["child"].value, False)
+
+
+if __name__ == "__main__":
+    unittest.main()
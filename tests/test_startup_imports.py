@@ -0,0 +1,32 @@
+import importlib.util
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("matplotlib", "plotly", "openpyxl", "playwright", "pyarrow")
+
+
+def loaded_heavy_modules(*modules):
+    script = (
+        f"import sys\nimport {', '.join(modules)}\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+class StartupImportTests(unittest.TestCase):
+    def test_analysis_and_scraper_modules_load_plotting_and_playwright_lazily(self):
+        self.assertEqual(loaded_heavy_modules("receipt_analysis", "lidl_scraper", "price_xlsx", "price_export"), [])
+
+    @unittest.skipUnless(importlib.util.find_spec("tkcalendar"), "tkcalendar не е инсталиран")
+    def test_gui_module_does_not_import_analysis_stack(self):
+        self.assertEqual(loaded_heavy_modules("lidl_scraper_gui"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()